@@ -6,7 +6,7 @@
 # =========================================================
 
 from datetime import datetime
-from main import mark_attendance
+from main import mark_attendance, new_tracker, TRACKING_ENABLED, PRESENCE_GAP_TOLERANCE
 from flask import jsonify
 import time
 from firebase_config import get_firebase_manager
@@ -23,13 +23,88 @@ _sessions_by_class structure:
   class_id: {
     "is_active": bool,
     "session_name": str,
-    "attendance_records": { name: frames_count },
+    "presence_intervals": { name: [[first_seen, last_seen], ...] },  # epoch seconds
+    "last_frame_at": float | None,   # epoch seconds of the last processed frame
+    "frame_interval": float | None,  # smoothed seconds between processed frames
     "start_time": datetime,
+    "tracker": FaceTracker | None,   # None while a frame is being recognized
+    "tracking_stats": dict,          # embedding calls computed vs. reused
   }
 }
 """
 
 
+def _new_session_state(is_active=False, session_name=None):
+    return {
+        "is_active": is_active,
+        "session_name": session_name,
+        "presence_intervals": {},
+        "last_frame_at": None,
+        "frame_interval": None,
+        "start_time": datetime.now() if is_active else None,
+        "tracker": new_tracker() if is_active and TRACKING_ENABLED else None,
+        "tracking_stats": {},
+    }
+
+
+# ---------------------------------------------------------
+# Presence accounting
+# ---------------------------------------------------------
+def _gap_tolerance(sess) -> float:
+    """
+    Sightings closer than this are one continuous presence. Never smaller than
+    a few frame intervals, so sparse sampling does not split presence apart.
+    """
+    interval = sess.get("frame_interval") or 0.0
+    return max(PRESENCE_GAP_TOLERANCE, 2.5 * interval)
+
+
+def _add_sighting(intervals, timestamp: float, tolerance: float):
+    """Merge one sighting into a sorted list of [start, end] intervals."""
+    if intervals:
+        last = intervals[-1]
+        if timestamp >= last[0] - tolerance and timestamp <= last[1] + tolerance:
+            last[0] = min(last[0], timestamp)
+            last[1] = max(last[1], timestamp)
+            return
+    intervals.append([timestamp, timestamp])
+    if len(intervals) > 1 and timestamp < intervals[-2][0]:
+        # Out-of-order frame: re-sort and merge neighbours
+        intervals.sort()
+        merged = [intervals[0]]
+        for start, end in intervals[1:]:
+            if start <= merged[-1][1] + tolerance:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        intervals[:] = merged
+
+
+def _presence_seconds(sess) -> dict:
+    """
+    {name: seconds present}, summed over each student's merged intervals.
+    Each interval also covers the sampling period of its last sighting, and
+    no total exceeds the time elapsed since the session started.
+    """
+    interval = sess.get("frame_interval") or 0.0
+    start_time = sess.get("start_time")
+    elapsed = (time.time() - start_time.timestamp()) if start_time else float("inf")
+    return {
+        name: round(min(elapsed, sum(end - start + interval for start, end in intervals)), 2)
+        for name, intervals in sess.get("presence_intervals", {}).items()
+    }
+
+
+def _relative_intervals(sess) -> dict:
+    """Presence intervals as [start, end] seconds since the session started."""
+    start_time = sess.get("start_time")
+    origin = start_time.timestamp() if start_time else 0.0
+    return {
+        name: [[round(start - origin, 2), round(end - origin, 2)] for start, end in intervals]
+        for name, intervals in sess.get("presence_intervals", {}).items()
+    }
+
+
 def start_session(class_id: str, session_name: str = None):
     """Start a new manual session for a specific class (concurrent-safe)."""
     if not class_id:
@@ -38,12 +113,7 @@ def start_session(class_id: str, session_name: str = None):
         sess = _sessions_by_class.get(class_id)
         if sess and sess.get("is_active"):
             return jsonify({"status": "already_active", "class_id": class_id}), 409
-        _sessions_by_class[class_id] = {
-            "is_active": True,
-            "session_name": session_name or f"{class_id}_session",
-            "attendance_records": {},
-            "start_time": datetime.now(),
-        }
+        _sessions_by_class[class_id] = _new_session_state(True, session_name or f"{class_id}_session")
         s = _sessions_by_class[class_id]
         return jsonify({
             "status": "started",
@@ -64,23 +134,19 @@ def stop_session(class_id: str):
         end_time = datetime.now()
         start_time = sess.get("start_time")
         duration_seconds = int((end_time - start_time).total_seconds()) if start_time else 0
-        attendance_records = dict(sess.get("attendance_records", {}))
         summary = {
             "session_active": False,
             "session_name": sess.get("session_name"),
             "class_id": class_id,
-            "attendance_records": attendance_records,
+            "attendance_records": _presence_seconds(sess),
+            "presence_intervals": _relative_intervals(sess),
             "start_time": start_time.isoformat() if start_time else None,
             "end_time": end_time.isoformat(),
             "duration_seconds": duration_seconds,
+            "tracking_stats": dict(sess.get("tracking_stats", {})),
         }
         # clear
-        _sessions_by_class[class_id] = {
-            "is_active": False,
-            "session_name": None,
-            "attendance_records": {},
-            "start_time": None,
-        }
+        _sessions_by_class[class_id] = _new_session_state()
         return jsonify(summary)
 
 
@@ -123,19 +189,75 @@ def record_recognition_results(recognized_names):
     return jsonify({"status": "error", "message": "class_id required"}), 400
 
 
-def record_recognition_results_for_class(recognized_names, class_id: str):
-    """Update attendance for a specific class session."""
-    if not class_id:
-        return jsonify({"status": "error", "message": "class_id is required"}), 400
+def add_recognized_names(class_id: str, recognized_names, timestamp: float = None):
+    """
+    Add one processed frame's recognized names to a class session as
+    timestamped sightings (call it for frames without names too, so the
+    frame cadence is known). Presence is the merged sighting intervals, so it
+    does not depend on how many frames per second the client sends.
+    Returns {name: presence seconds}, or None if no session is active.
+    """
+    timestamp = time.time() if timestamp is None else timestamp
     with _sessions_lock:
         sess = _sessions_by_class.get(class_id)
         if not sess or not sess.get("is_active"):
-            return jsonify({"status": "inactive", "message": "No active session."}), 403
-        records = sess.setdefault("attendance_records", {})
-        for name in recognized_names:
+            return None
+
+        last = sess.get("last_frame_at")
+        if last is not None and timestamp > last:
+            gap = timestamp - last
+            prev = sess.get("frame_interval")
+            sess["frame_interval"] = gap if prev is None else 0.8 * prev + 0.2 * gap
+        if last is None or timestamp > last:
+            sess["last_frame_at"] = timestamp
+
+        tolerance = _gap_tolerance(sess)
+        presence = sess.setdefault("presence_intervals", {})
+        for name in set(recognized_names):
             if name != "Unknown":
-                records[name] = records.get(name, 0) + 1
-        return jsonify({"status": "recorded", "updated": records})
+                _add_sighting(presence.setdefault(name, []), timestamp, tolerance)
+        return _presence_seconds(sess)
+
+
+def checkout_tracker(class_id: str):
+    """
+    Take the session's face tracker for the duration of one frame.
+    Returns (tracker, session_token); tracker is None if the class has no
+    active session, tracking is disabled, or another frame holds the tracker.
+    """
+    with _sessions_lock:
+        sess = _sessions_by_class.get(class_id)
+        if not sess or not sess.get("is_active"):
+            return None, None
+        tracker = sess.get("tracker")
+        sess["tracker"] = None
+        return tracker, sess.get("start_time")
+
+
+def return_tracker(class_id: str, tracker, session_token):
+    """Give a tracker back to its session unless that session ended meanwhile."""
+    with _sessions_lock:
+        sess = _sessions_by_class.get(class_id)
+        if not sess or not sess.get("is_active") or sess.get("start_time") != session_token:
+            return
+        sess["tracker"] = tracker
+        sess["tracking_stats"] = tracker.stats()
+
+
+def is_session_active(class_id: str) -> bool:
+    """Return True while the class has an active session."""
+    with _sessions_lock:
+        return bool((_sessions_by_class.get(class_id) or {}).get("is_active"))
+
+
+def record_recognition_results_for_class(recognized_names, class_id: str):
+    """Update attendance for a specific class session."""
+    if not class_id:
+        return jsonify({"status": "error", "message": "class_id is required"}), 400
+    records = add_recognized_names(class_id, recognized_names)
+    if records is None:
+        return jsonify({"status": "inactive", "message": "No active session."}), 403
+    return jsonify({"status": "recorded", "updated": records})
 
 def get_current_session_data(class_id: str):
     """Get session data for a specific class."""
@@ -149,7 +271,7 @@ def get_current_session_data(class_id: str):
             "session_active": bool(sess.get("is_active")),
             "session_name": sess.get("session_name"),
             "class_id": class_id,
-            "attendance_records": dict(sess.get("attendance_records", {})),
+            "attendance_records": _presence_seconds(sess),
             "start_time": sess.get("start_time"),
         }
 
@@ -157,11 +279,6 @@ def clear_session_data(class_id: str = None):
     """Clear session data for a class or all."""
     with _sessions_lock:
         if class_id:
-            _sessions_by_class[class_id] = {
-                "is_active": False,
-                "session_name": None,
-                "attendance_records": {},
-                "start_time": None,
-            }
+            _sessions_by_class[class_id] = _new_session_state()
         else:
             _sessions_by_class.clear()
@@ -7,10 +7,12 @@ from flask import jsonify, request
 STUDENTS_DIR = "Smart Attendance System/Images"
 
 
-def add_student_from_api(student_name, image_data_list):
+def add_student_from_api(student_name, image_data_list, saved_images=None):
     """
     Create a student folder and save received base64 images.
     Used when images are captured from frontend (browser camera).
+    If `saved_images` (a dict) is given, it receives {file name: image bytes}
+    of the saved photos, so they can be embedded without reading them back.
     """
 
     student_name = student_name.strip().replace(" ", "_")
@@ -42,6 +44,8 @@ def add_student_from_api(student_name, image_data_list):
             with open(filename, "wb") as f:
                 f.write(img_bytes)
             saved_count += 1
+            if saved_images is not None:
+                saved_images[os.path.basename(filename)] = img_bytes
         except Exception as e:
             return jsonify({
                 "status": "error",
@@ -9,12 +9,17 @@ import os
 import io
 import json
 import base64
-import tempfile
+import shutil
+import zipfile
+import struct
 import traceback
 import subprocess
 import sys
+import atexit
+import threading
+import multiprocessing
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, request, jsonify, send_file
 from flask_cors import CORS
 
 
@@ -25,78 +30,68 @@ from firebase_config import get_firebase_manager, initialize_firebase
 import main  
 import Run as scheduler_module  
 import Student_Manage as student_manage  
+import live_stream
+from recognition_scheduler import RecognitionScheduler, QueueFullError
+from embeddings_store import EmbeddingStore, is_pickle_path
+from startup import Warmup
+from jobs import JobQueue
 
 
-# We need to safely import manage_embeddings from EncodeGenerator 
-import ast
-
-
-def safe_load_manage_embeddings(module_path="EncodeGenerator.py"):
-    """
-    Read the source of module_path, parse it, extract the manage_embeddings
-    function object without executing top-level calls (like manage_embeddings()).
-    Returns the function object or raises.
-    """
-    if not os.path.exists(module_path):
-        raise FileNotFoundError(f"{module_path} not found")
-
-
-    source = open(module_path, "r", encoding="utf-8").read()
-    parsed = ast.parse(source, filename=module_path)
-
-
-    # Build a new AST that contains only the function def for manage_embeddings
-    new_body = []
-    for node in parsed.body:
-        # Keep function def named 'manage_embeddings' and necessary imports
-        if isinstance(node, ast.Import) or isinstance(node, ast.ImportFrom):
-            new_body.append(node)
-        elif isinstance(node, ast.FunctionDef) and node.name == "manage_embeddings":
-            new_body.append(node)
-
-
-    new_module = ast.Module(body=new_body, type_ignores=[])
-    ast.fix_missing_locations(new_module)
-
+# WebSocket streaming is optional (pip install flask-sock)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
-    # Compile and exec in a fresh namespace
-    namespace = {}
-    compiled = compile(new_module, module_path, "exec")
-    exec(compiled, namespace)
-    if "manage_embeddings" not in namespace:
-        raise RuntimeError("manage_embeddings function not found in module")
-    return namespace["manage_embeddings"]
 
+class InMemoryRequest(Request):
+    """Keep multipart file uploads in memory instead of spooling large ones to a temp file."""
 
-# Try to load manage_embeddings safely
-try:
-    manage_embeddings = safe_load_manage_embeddings("EncodeGenerator.py")
-except Exception as e:
-    manage_embeddings = None
-    print("⚠️ Warning: could not load manage_embeddings safely:", str(e))
-    print(traceback.format_exc())
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 
 # Flask app setup
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 CORS(app)
 
 
-# Initialize Firebase (with error handling)
+# Firebase is connected on first use (or by the warm-up), not at import
 firebase_manager = None
-try:
-    firebase_manager = initialize_firebase()
-    print("✅ Firebase initialized successfully")
-except Exception as e:
-    print(f"⚠️ Firebase initialization failed (will use CSV fallback): {e}")
-    firebase_manager = None
+_firebase_checked = False
+_firebase_lock = threading.Lock()
+
+
+def get_firebase():
+    """Return the Firebase manager, connecting once on first call; None means CSV fallback."""
+    global firebase_manager, _firebase_checked
+    if not _firebase_checked:
+        with _firebase_lock:
+            if not _firebase_checked:
+                try:
+                    firebase_manager = initialize_firebase()
+                    print("✅ Firebase initialized successfully")
+                except Exception as e:
+                    print(f"⚠️ Firebase initialization failed (will use CSV fallback): {e}")
+                    firebase_manager = None
+                _firebase_checked = True
+    return firebase_manager
+
+
+def firebase_status():
+    """Connection state for status responses, without connecting."""
+    if not _firebase_checked:
+        return "connecting"
+    return "connected" if firebase_manager else "disconnected (using CSV fallback)"
 
 
 # Configuration (paths used across modules)
 BASE_DIR = "Smart Attendance System"
 STUDENTS_DIR = os.path.join(BASE_DIR, "Images")
-EMBEDDINGS_PATH = getattr(main, "EMBEDDINGS_PATH", "embeddings.pkl")
+EMBEDDINGS_PATH = getattr(main, "EMBEDDINGS_PATH", "embeddings")
 ATTENDANCE_PREFIX = "attendance_"  # main.save_attendance produces attendance_{session}.csv
+FRAME_STREAM_MIMETYPE = "application/x-frame-stream"  # length-prefixed multi-frame upload
 
 
 # Ensure directories exist
@@ -104,6 +99,62 @@ os.makedirs(STUDENTS_DIR, exist_ok=True)
 os.makedirs(BASE_DIR, exist_ok=True)
 
 
+# Optional recognition worker pool (main.RECOGNITION_WORKERS > 0); never started inside a worker
+recognition_scheduler = None
+if main.RECOGNITION_WORKERS > 0 and multiprocessing.parent_process() is None:
+    recognition_scheduler = RecognitionScheduler(workers=main.RECOGNITION_WORKERS)
+    atexit.register(recognition_scheduler.shutdown)
+    print(f"✅ Recognition scheduler started with {main.RECOGNITION_WORKERS} worker processes")
+
+
+# ------------------------------
+# Warm-up
+# ------------------------------
+def migrate_legacy_embeddings():
+    """One-time conversion of a legacy embeddings.pkl into the memory-mapped store."""
+    if is_pickle_path(EMBEDDINGS_PATH) or EmbeddingStore(EMBEDDINGS_PATH).exists() \
+            or not os.path.exists(main.LEGACY_EMBEDDINGS_PATH):
+        return None
+    from migrate_embeddings import migrate_pickle
+    return f"migrated to {migrate_pickle(main.LEGACY_EMBEDDINGS_PATH, EMBEDDINGS_PATH, main.MODEL_NAME)}"
+
+
+def warm_gallery():
+    """Load the embeddings gallery once; main.GALLERY_CACHE refreshes it when the store changes."""
+    if not os.path.exists(main.GALLERY_CACHE.watch_path):
+        return "no embeddings yet"
+    return f"{main.GALLERY_CACHE.load().num_people} people"
+
+
+def warm_model():
+    main.EMBEDDER.warm_up()
+    return main.EMBEDDER.backend
+
+
+def warm_recognition_workers():
+    return f"{len(recognition_scheduler.warm_up())} workers"
+
+
+def firebase_step():
+    return "connected" if get_firebase() else "CSV fallback"
+
+
+# With a worker pool, the model is loaded in the workers instead of this process
+warmup_steps = [
+    ("migrate_embeddings", migrate_legacy_embeddings),
+    ("gallery", warm_gallery),
+    ("model", warm_model) if recognition_scheduler is None else ("recognition_workers", warm_recognition_workers),
+    ("firebase", firebase_step),
+]
+WARMUP = Warmup(warmup_steps, required=[name for name, _ in warmup_steps if name != "firebase"])
+
+
+# Worker processes import this module too; the debug reloader's parent only watches files
+if multiprocessing.parent_process() is None and not (
+        __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"):
+    WARMUP.start(background=main.LAZY_STARTUP)
+
+
 # ------------------------------
 # Helpers
 # ------------------------------
@@ -114,18 +165,57 @@ def decode_base64_image(data_b64):
     return base64.b64decode(data_b64)
 
 
-def save_temp_image_bytes(bytes_data, suffix=".jpg"):
-    """Save bytes to a temp file path and return the path (caller should remove)."""
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    tmp.write(bytes_data)
-    tmp.flush()
-    tmp.close()
-    return tmp.name
+def read_upload_bytes(file_storage):
+    """Return the bytes of an uploaded file as a memoryview, without touching disk."""
+    stream = file_storage.stream
+    if not isinstance(stream, io.BytesIO):
+        buffer = io.BytesIO()
+        shutil.copyfileobj(stream, buffer)
+        stream = buffer
+    return stream.getbuffer()
+
+
+def recognize_frame(img_bytes, class_id):
+    """
+    Recognize one frame on this thread, or via the per-class fair worker pool if enabled.
+    During an active session the class's face tracker is used so that already
+    identified students are not re-embedded on every frame.
+    """
+    tracker, session_token = scheduler_module.checkout_tracker(class_id) if class_id else (None, None)
+    try:
+        if recognition_scheduler is None:
+            return main.recognize_faces(img_bytes, tracker=tracker, class_id=class_id)
+        future = recognition_scheduler.submit(class_id or "default", img_bytes, tracker)
+        result, tracker = future.result(timeout=main.RECOGNITION_TIMEOUT)
+        return result
+    finally:
+        if tracker is not None:
+            scheduler_module.return_tracker(class_id, tracker, session_token)
+
+
+def split_frame_stream(body):
+    """
+    Split an application/x-frame-stream body into per-frame memoryviews.
+    Each frame is a 4-byte big-endian length followed by that many image bytes.
+    """
+    view = memoryview(body)
+    frames = []
+    offset = 0
+    while offset < len(view):
+        if offset + 4 > len(view):
+            raise ValueError("Truncated frame length prefix")
+        (length,) = struct.unpack_from(">I", view, offset)
+        offset += 4
+        if offset + length > len(view):
+            raise ValueError("Truncated frame body")
+        frames.append(view[offset:offset + length])
+        offset += length
+    return frames
 
 
 def parse_recognize_response(flask_response):
     """
-    Given a Flask Response returned by main.recognize_faces_from_image (which uses jsonify),
+    Given a Flask Response built with jsonify (e.g. by the scheduler module),
     parse and return the JSON object.
     """
     try:
@@ -143,16 +233,23 @@ def home():
     return jsonify({
         "status": "running",
         "message": "Smart Attendance System API with Firebase",
-        "firebase_status": "connected" if firebase_manager else "disconnected (using CSV fallback)",
+        "firebase_status": firebase_status(),
+        "ready": WARMUP.ready(),
         "endpoints": {
-            "POST /recognize_image": "Upload image (base64 or file) for recognition",
-            "POST /add_student": "Add student with list of base64 images",
+            "POST /recognize_image": "Upload image (base64, file, raw image/jpeg body or length-prefixed frame stream) for recognition",
+            "POST /add_student": "Add student with list of base64 images (embedded and matchable at once)",
             "DELETE /remove_student/<name>": "Remove student",
-            "POST /update_embeddings": "Rebuild/update embeddings (calls manage_embeddings)",
+            "POST /update_embeddings": "Queue an embeddings update in the background; returns a job id",
+            "GET /update_embeddings/<job_id>": "Status and progress of an embeddings update job",
+            "GET /ready": "503 until the model, gallery and workers are warmed up (per-step timings)",
+            "GET /gallery_stats": "Embeddings gallery cache, per-class shards and detector pool counters",
+            "POST /refresh_class_gallery": "Re-read class rosters after an enrollment change (optional classId)",
+            "GET /recognition_stats": "Recognition worker queue depth and per-class latency",
             "GET /session_status": "Get current session status",
             "GET /list_students": "List registered students",
             "GET /attendance_files": "List attendance CSV files",
             "POST /start_session": "Start attendance session",
+            "WS /stream/<class_id>": "Stream frames over a WebSocket during an active session",
             "POST /stop_session": "Stop attendance session and save to Firebase",
             "GET /attendance/<class_id>": "Get attendance records for a class"
         }
@@ -204,6 +301,7 @@ def stop_session():
             return jsonify({"error": "No active session found"}), 400
         
         # Save attendance records to Firebase (with error handling)
+        firebase_manager = get_firebase()
         attendance_records = session_data.get('attendance_records', {})
         success_count = 0
         
@@ -254,6 +352,7 @@ def stop_session():
             "records_saved": success_count,
             "total_students": len(attendance_records),
             "session_id": session_id,
+            "tracking_stats": session_data.get("tracking_stats", {}),
             "firebase_status": "connected" if firebase_manager else "disconnected (CSV saved)"
         })
         
@@ -266,6 +365,7 @@ def stop_session():
 def get_attendance_for_class(class_id):
     """Get attendance records for a specific class."""
     try:
+        firebase_manager = get_firebase()
         if not firebase_manager:
             return jsonify({
                 "error": "Firebase not available",
@@ -302,81 +402,201 @@ def recognize_image_route():
     """
     Accept either:
     - JSON with {"image": "data:image/jpeg;base64,...."} OR
-    - multipart/form-data with file input named 'image'
-    Process using main.recognize_faces_from_image (which expects an image path).
+    - multipart/form-data with file input named 'image' OR
+    - a raw image body (Content-Type: image/jpeg, image/png, ...) OR
+    - several frames in one body (Content-Type: application/x-frame-stream),
+      each prefixed with its length as a 4-byte big-endian integer
+    For non-JSON bodies classId comes from the ?classId= query parameter or
+    the X-Class-Id header.
+    The image is decoded in memory and passed to main.recognize_faces.
     If a session is active, record recognized names into scheduler attendance.
     """
     try:
-        # Get image bytes either from JSON base64 or file upload
+        data = None
+        is_frame_stream = request.mimetype == FRAME_STREAM_MIMETYPE
+
+        # Get image bytes from JSON base64, a raw body, a frame stream or a file upload
         if request.is_json:
             data = request.get_json()
             image_b64 = data.get("image")
             if not image_b64:
                 return jsonify({"status": "error", "message": "No image field in JSON"}), 400
-            img_bytes = decode_base64_image(image_b64)
-            tmp_path = save_temp_image_bytes(img_bytes, suffix=".jpg")
+            frames = [decode_base64_image(image_b64)]
+        elif request.mimetype.startswith("image/"):
+            frames = [request.get_data()]
+        elif is_frame_stream:
+            try:
+                frames = split_frame_stream(request.get_data())
+            except ValueError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
         else:
             # multipart/form-data
             if "image" not in request.files:
                 return jsonify({"status": "error", "message": "No image file provided"}), 400
-            file = request.files["image"]
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            file.save(tmp.name)
-            tmp_path = tmp.name
-
+            frames = [read_upload_bytes(request.files["image"])]
 
-        # Call the recognition function from main.py
-        resp = main.recognize_faces_from_image(tmp_path)
-        result_json = parse_recognize_response(resp)
+        if not frames or not frames[0]:
+            return jsonify({"status": "error", "message": "Empty image body"}), 400
 
 
         # Determine classId for routing recognition to the correct session
         class_id = None
-        if request.is_json:
+        if data is not None:
             try:
                 class_id = data.get("classId")
             except Exception:
                 class_id = None
         if not class_id:
-            class_id = request.args.get("classId")
+            class_id = request.args.get("classId") or request.headers.get("X-Class-Id")
 
 
-        # If session active, parse recognized names and record them
-        try:
-            if result_json.get("status") == "success" and result_json.get("faces_detected", 0) > 0:
-                names = []
-                for r in result_json.get("results", []):
-                    # result entries are {"name": name, ...} or {"error": ...
-                    if "name" in r:
-                        names.append(r["name"])
-                if names:
-                    if not class_id:
-                        return jsonify({"status": "error", "message": "classId is required while a session is active"}), 400
-                    # Route counts to the specific class session
-                    scheduler_module.record_recognition_results_for_class(names, class_id)
-        except Exception as e:
-            # Do not fail recognition if recording fails; log and continue
-            app.logger.error("Failed to record recognition results: %s", str(e))
+        frame_results = []
+        for img_bytes in frames:
+            # Call the recognition function from main.py (inline or in a worker process)
+            try:
+                result_json = recognize_frame(img_bytes, class_id)
+            except QueueFullError as e:
+                return jsonify({"status": "error", "message": str(e)}), 503
+            if result_json.get("status") == "error" and not is_frame_stream:
+                return jsonify(result_json), 400
+            frame_results.append(result_json)
 
+        # One sighting per request: the frames of a stream body carry no capture times
+        error_response = record_frame_results(frame_results, class_id)
+        if error_response is not None:
+            return error_response
 
-        return jsonify(result_json)
+
+        if is_frame_stream:
+            return jsonify({
+                "status": "success",
+                "frames_processed": len(frame_results),
+                "frames": frame_results
+            })
+        return jsonify(frame_results[0])
 
 
     except Exception as e:
         app.logger.error("Error in /recognize_image: %s\n%s", str(e), traceback.format_exc())
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        # cleanup temp file if exists
+
+
+def record_frame_results(frame_results, class_id):
+    """
+    If a session is active, record the names recognized in one request's frames.
+    The frames are recorded as a single sighting: they arrived together, so
+    stamping each one as it finishes recognition would only measure inference
+    time and shrink the session's frame cadence (and with it the gap tolerance).
+    Returns an error response when a classId is needed but missing, else None.
+    """
+    try:
+        successful = [r for r in frame_results if r.get("status") == "success"]
+        if successful:
+            names = []
+            for result_json in successful:
+                for r in result_json.get("results", []):
+                    # result entries are {"name": name, ...} or {"error": ...
+                    if "name" in r:
+                        names.append(r["name"])
+            if names and not class_id:
+                return jsonify({"status": "error", "message": "classId is required while a session is active"}), 400
+            if class_id:
+                # Route sightings to the specific class session (frames without names keep the cadence)
+                scheduler_module.add_recognized_names(class_id, names)
+    except Exception as e:
+        # Do not fail recognition if recording fails; log and continue
+        app.logger.error("Failed to record recognition results: %s", str(e))
+    return None
+
+
+# ------------------------------
+# Route - Live frame stream (WebSocket)
+# ------------------------------
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route("/stream/<class_id>")
+    def stream_recognition_route(ws, class_id):
+        """
+        Persistent frame stream for an active class session.
+        The client sends frames as binary JPEG messages (or base64 data URLs as
+        text); the server pushes one JSON "recognition" message per processed
+        frame, including students recognized for the first time on this stream.
+        When recognition lags, stale frames are dropped and only the newest one
+        is processed. A "session_ended" message is sent once /stop_session runs.
+        """
+        if not scheduler_module.is_session_active(class_id):
+            ws.send(json.dumps({"type": "error", "message": "No active session.", "class_id": class_id}))
+            return
+
+        stream = live_stream.RecognitionStream(
+            class_id,
+            recognize=lambda img_bytes: recognize_frame(img_bytes, class_id),
+            record=scheduler_module.add_recognized_names,
+            is_active=lambda: scheduler_module.is_session_active(class_id),
+            send=ws.send,
+        )
+        stream.start()
         try:
-            if 'tmp_path' in locals() and os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except Exception:
-            pass
+            while stream.is_running:
+                message = ws.receive(timeout=1)
+                if message is None:
+                    continue
+                if isinstance(message, str):
+                    message = decode_base64_image(message)
+                stream.push(message)
+        finally:
+            stream.stop()
+else:
+    print("⚠️ flask-sock not installed: WebSocket /stream/<class_id> disabled")
 
 
 # ------------------------------
 # Student management endpoints
 # ------------------------------
+def enroll_uploaded_student(person, photos):
+    """
+    /add_student fast path: embed the uploaded photos in memory and add them
+    to the store and the resident gallery in one step. While an embeddings
+    update holds the store (its folder scan may predate these photos), the
+    student is left to a queued update instead.
+    Returns the fields added to the response.
+    """
+    if ENROLLMENT_LOCK.acquire(blocking=False):
+        try:
+            from enrollment import enroll_student
+
+            previous_digest = main.GALLERY_CACHE.digest()
+            vectors = enroll_student(STUDENTS_DIR, person, photos, emb_path=EMBEDDINGS_PATH,
+                                     n_aug=main.ENROLLMENT_N_AUG, model_name=main.MODEL_NAME,
+                                     embedder=main.EMBEDDER)
+            main.add_to_gallery(person, vectors, previous_digest)
+            return {"enrollment": "done", "embeddings": len(vectors)}
+        except Exception as e:
+            app.logger.error("Fast enrollment of %s failed, queueing an update: %s", person, e)
+        finally:
+            ENROLLMENT_LOCK.release()
+    job, _ = JOBS.submit("update_embeddings", default_update_params())
+    return {"enrollment": "queued", "job_id": job["job_id"]}
+
+
+def unenroll_removed_student(person):
+    """Stop matching a removed student at once and drop their vectors from the store."""
+    if not ENROLLMENT_LOCK.acquire(blocking=False):
+        # A running update may still write this student; the queued one drops it
+        main.remove_from_gallery(person)
+        JOBS.submit("update_embeddings", default_update_params())
+        return
+    try:
+        from enrollment import unenroll_student
+
+        previous_digest = main.GALLERY_CACHE.digest()
+        unenroll_student(person, emb_path=EMBEDDINGS_PATH, model_name=main.MODEL_NAME)
+        main.remove_from_gallery(person, previous_digest)
+    finally:
+        ENROLLMENT_LOCK.release()
+
+
 @app.route("/add_student", methods=["POST"])
 def add_student_route():
     """
@@ -424,11 +644,17 @@ def add_student_route():
 
 
         # Add student using existing function
-        result = student_manage.add_student_from_api(student_name, images_b64)
-
-
-        # Return original result to preserve response shape
-        return result
+        saved_images = {}
+        result = student_manage.add_student_from_api(student_name, images_b64, saved_images)
+        main.CLASS_SHARDS.invalidate(class_id)
+        if not main.FAST_ENROLLMENT or isinstance(result, tuple):
+            # Return original result to preserve response shape
+            return result
+
+        # Same response plus the enrollment outcome
+        body = result.get_json()
+        body.update(enroll_uploaded_student(body["student"], saved_images))
+        return jsonify(body)
         
     except Exception as e:
         app.logger.error("add_student error: %s", traceback.format_exc())
@@ -439,9 +665,13 @@ def add_student_route():
 def remove_student_route(student_name):
     try:
         result = student_manage.remove_student(student_name)
+        removed = not isinstance(result, tuple)
+        if removed:
+            unenroll_removed_student(student_name.strip().replace(" ", "_"))
+        main.CLASS_SHARDS.invalidate()
         
         # Also remove from Firebase if available
-        if firebase_manager and result.get("status") == "success":
+        if removed and get_firebase():
             try:
                 # Note: Firebase doesn't have a direct delete method in our current setup
                 # You might want to add a delete method to firebase_config.py
@@ -468,31 +698,117 @@ def list_students_route():
 # ------------------------------
 # Embeddings management
 # ------------------------------
+def run_embeddings_update(params, report):
+    """
+    Job runner: bring the embeddings store in line with the photo folders.
+    The store switches versions atomically and the live gallery is swapped
+    once the new one is fully built, so recognition keeps using the old one.
+    """
+    from EncodeGenerator import manage_embeddings
+
+    with ENROLLMENT_LOCK:
+        manage_embeddings(db_path=params["db_path"], N_AUG=params["n_aug"], emb_path=params["emb_path"],
+                          backend=main.EMBEDDER.backend, model_path=main.EMBEDDER.model_path, progress=report)
+    if os.path.abspath(params["emb_path"]) == os.path.abspath(main.GALLERY_CACHE.path):
+        main.GALLERY_CACHE.reload()
+
+
+def default_update_params():
+    return {"n_aug": main.ENROLLMENT_N_AUG, "db_path": STUDENTS_DIR, "emb_path": EMBEDDINGS_PATH}
+
+
+# Embeddings rebuilds run here, one at a time, never on a request thread
+JOBS = JobQueue({"update_embeddings": run_embeddings_update})
+# Held while the store is rewritten: by an update job, or by a single-student (un)enrollment
+ENROLLMENT_LOCK = threading.Lock()
+
+
 @app.route("/update_embeddings", methods=["POST"])
 def update_embeddings_route():
     """
-    Trigger recreation/update of embeddings.
+    Queue an update of the embeddings and return at once (202) with its job id.
     JSON optional body: {"n_aug": 3, "db_path": "...", "emb_path": "..."}
+    An identical request that is still queued is joined instead of repeated.
+    Poll GET /update_embeddings/<job_id> for progress.
     """
-    if manage_embeddings is None:
-        return jsonify({"status": "error", "message": "manage_embeddings is unavailable"}), 500
-
-
     try:
         data = request.get_json(silent=True) or {}
-        n_aug = int(data.get("n_aug", 1))
-        db_path = data.get("db_path", STUDENTS_DIR)
-        emb_path = data.get("emb_path", EMBEDDINGS_PATH)
+        params = default_update_params()
+        params.update({
+            "n_aug": int(data.get("n_aug", params["n_aug"])),
+            "db_path": data.get("db_path", params["db_path"]),
+            "emb_path": data.get("emb_path", params["emb_path"]),
+        })
+        job, coalesced = JOBS.submit("update_embeddings", params)
+        return jsonify({
+            "status": "ok",
+            "message": "Embeddings update already queued" if coalesced else "Embeddings update queued",
+            "job_id": job["job_id"],
+            "job_status": job["status"],
+            "coalesced": coalesced,
+        }), 202
+    except Exception as e:
+        app.logger.error("update_embeddings error: %s", traceback.format_exc())
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/update_embeddings/<job_id>", methods=["GET"])
+def update_embeddings_status_route(job_id):
+    """Status and progress (students/images done of total) of an embeddings update job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
+
+
+@app.route("/update_embeddings", methods=["GET"])
+def update_embeddings_jobs_route():
+    """Running, queued and recently finished embeddings update jobs."""
+    return jsonify(JOBS.stats())
+
+
+@app.route("/ready", methods=["GET"])
+def ready_route():
+    """Readiness probe: 200 once the warm-up steps needed for recognition have finished, 503 before."""
+    stats = WARMUP.stats()
+    stats["firebase_status"] = firebase_status()
+    return jsonify(stats), 200 if stats["ready"] else 503
+
 
+@app.route("/recognition_stats", methods=["GET"])
+def recognition_stats_route():
+    """Queue depth, worker usage and per-class latency of the recognition scheduler."""
+    if recognition_scheduler is None:
+        return jsonify({"workers": 0, "mode": "inline"})
+    return jsonify(recognition_scheduler.stats())
 
-        # Call the function (this may take time)
-        manage_embeddings(db_path=db_path, N_AUG=n_aug, emb_path=emb_path)
-        return jsonify({"status": "ok", "message": "Embeddings updated"})
+
+@app.route("/gallery_stats", methods=["GET"])
+def gallery_stats_route():
+    """Report the resident embeddings gallery, its cache counters and detector pool usage."""
+    try:
+        stats = main.GALLERY_CACHE.stats()
+        stats["detector_pool"] = main.DETECTOR_POOL.stats()
+        stats["class_shards"] = main.CLASS_SHARDS.stats()
+        return jsonify(stats)
     except Exception as e:
-        app.logger.error("update_embeddings error: %s", traceback.format_exc())
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/refresh_class_gallery", methods=["POST"])
+def refresh_class_gallery_route():
+    """
+    Drop cached class rosters so the next recognition re-reads them from Firestore.
+    JSON optional body: {"classId": "abc123"} (all classes if omitted).
+    Only this process's shards are dropped: recognition worker processes keep
+    theirs and can lag by up to main.CLASS_ROSTER_TTL before re-reading the roster.
+    """
+    data = request.get_json(silent=True) or {}
+    class_id = data.get("classId") or request.args.get("classId")
+    main.CLASS_SHARDS.invalidate(class_id)
+    return jsonify({"status": "ok", "classId": class_id})
+
+
 @app.route("/session_status", methods=["GET"])
 def session_status_route():
     try:
@@ -543,9 +859,24 @@ def record_recognition_route():
 @app.route("/download_embeddings", methods=["GET"])
 def download_embeddings():
     try:
-        if not os.path.exists(EMBEDDINGS_PATH):
+        if is_pickle_path(EMBEDDINGS_PATH):
+            if not os.path.exists(EMBEDDINGS_PATH):
+                return jsonify({"status": "error", "message": "Embeddings file not found"}), 404
+            return send_file(EMBEDDINGS_PATH, as_attachment=True)
+
+        # Store directory: send the current version as a zip
+        store = EmbeddingStore(EMBEDDINGS_PATH)
+        version = store.current_version()
+        if version is None:
             return jsonify({"status": "error", "message": "Embeddings file not found"}), 404
-        return send_file(EMBEDDINGS_PATH, as_attachment=True)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            version_dir = os.path.join(EMBEDDINGS_PATH, version)
+            for name in sorted(os.listdir(version_dir)):
+                archive.write(os.path.join(version_dir, name), arcname=name)
+        buffer.seek(0)
+        return send_file(buffer, mimetype="application/zip", as_attachment=True,
+                         download_name=f"embeddings_{version}.zip")
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -556,5 +887,5 @@ def download_embeddings():
 if __name__ == "__main__":
     # Run the Flask app
     print("Starting Smart Attendance System API with Firebase...")
-    print(f"Firebase status: {'✅ Connected' if firebase_manager else '⚠️ Disabled (using CSV fallback)'}")
+    print(f"Startup: {'lazy (warming up in the background, see /ready)' if main.LAZY_STARTUP else 'eager'}")
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,577 @@
+"""
+Micro-benchmarks for the Smart Attendance System recognition pipeline.
+
+Usage:
+    python benchmarks.py match [--students 50 500 5000] [--per-student 6] [--faces 30]
+    python benchmarks.py embed [--faces 1 10 30] [--batch-size 32]
+    python benchmarks.py transport [--image frame.jpg] [--width 640 --height 480]
+    python benchmarks.py enroll [--students 200] [--photos 5] [--n-aug 1] [--workers 0 4]
+    python benchmarks.py store [--students 500 5000] [--per-student 6]
+    python benchmarks.py index [--students 2000 20000] [--per-student 6] [--n-probe 4 8 16]
+    python benchmarks.py prototypes [--embeddings embeddings --held-out held_out_photos/] [--cap 1 3 5]
+    python benchmarks.py onnx [--models arcface.onnx arcface_fp16.onnx arcface_int8.onnx] [--images photos/]
+    python benchmarks.py startup [--image face.jpg] [--modes lazy eager]
+"""
+
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from gallery import EmbeddingGallery
+
+
+EMBEDDING_DIM = 512  # ArcFace
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+
+
+def _timeit(fn, repeat=5):
+    """Return the best wall time (seconds) of `repeat` runs of fn()."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _synthetic_db(n_students, per_student, dim=EMBEDDING_DIM, seed=0):
+    """Random {name: [embedding, ...]} database shaped like embeddings.pkl."""
+    rng = np.random.default_rng(seed)
+    return {
+        f"student_{i:05d}": rng.standard_normal((per_student, dim)).tolist()
+        for i in range(n_students)
+    }
+
+
+def _legacy_find_match(face_embedding, embeddings_db, threshold=0.6):
+    """The original per-pair sklearn loop, kept here only for comparison."""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    best_match, best_score = "Unknown", 0
+    for person, person_embeddings in embeddings_db.items():
+        for stored_embedding in person_embeddings:
+            similarity = cosine_similarity([face_embedding], [stored_embedding])[0][0]
+            if similarity > best_score:
+                best_score, best_match = similarity, person
+    return (best_match, best_score) if best_score >= threshold else ("Unknown", best_score)
+
+
+def _clustered_db(n_students, per_student, queries, noise=0.6, dim=EMBEDDING_DIM, seed=4):
+    """
+    Face-like synthetic data: each student is a random direction plus noise.
+    Returns ({name: [embedding, ...]}, query vectors, true name per query).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_students, dim)).astype(np.float32)
+    names = [f"student_{i:05d}" for i in range(n_students)]
+    db = {
+        name: centers[i] + noise * rng.standard_normal((per_student, dim)).astype(np.float32)
+        for i, name in enumerate(names)
+    }
+    truth = rng.integers(0, n_students, queries)
+    query_vectors = centers[truth] + noise * rng.standard_normal((queries, dim)).astype(np.float32)
+    return db, query_vectors, [names[i] for i in truth]
+
+
+def _synthetic_enrollment(n_students, photos, n_aug, held_out, dim=EMBEDDING_DIM, seed=6):
+    """
+    Enrollment-shaped synthetic data: per student a few photo vectors around an
+    identity, each with augmented copies close to the photo, plus held-out photos.
+    Returns ({name: [embedding, ...]}, held-out vectors, true name per held-out vector).
+    """
+    rng = np.random.default_rng(seed)
+    db, queries, truth = {}, [], []
+    for i in range(n_students):
+        name = f"student_{i:05d}"
+        identity = rng.standard_normal(dim)
+        shots = identity + 0.8 * rng.standard_normal((photos + held_out, dim))
+        enrolled = shots[:photos]
+        augmented = np.repeat(enrolled, n_aug, axis=0) + 0.3 * rng.standard_normal((photos * n_aug, dim))
+        db[name] = np.concatenate([enrolled, augmented]).astype(np.float32)
+        queries.extend(shots[photos:])
+        truth.extend([name] * held_out)
+    return db, np.asarray(queries, dtype=np.float32), truth
+
+
+def _embed_held_out(folder):
+    """Embed every photo of a held-out folder (one sub-folder per student) like enrollment does."""
+    from enrollment import list_student_images, prepare_image
+    from face_embedding import FaceEmbedder
+
+    crops, truth = [], []
+    for person in sorted(os.listdir(folder)):
+        if not os.path.isdir(os.path.join(folder, person)):
+            continue
+        for img in list_student_images(folder, person):
+            try:
+                crops.extend(prepare_image(os.path.join(folder, person, img), 0, 0))
+                truth.append(person)
+            except ValueError:
+                print(f"⚠️ Skipping unreadable held-out photo {person}/{img}")
+    return FaceEmbedder("ArcFace").embed(crops), truth
+
+
+def _sample_jpeg(image_path, width, height):
+    """JPEG bytes of `image_path`, or of a synthetic camera-like frame."""
+    import cv2
+
+    if image_path:
+        with open(image_path, "rb") as f:
+            return f.read()
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    frame = np.clip(gradient + rng.normal(0, 20, (height, width, 3)), 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+
+
+def _synthetic_photo_folder(root, n_students, photos, size=(360, 480)):
+    """Write an Images/ style folder of random JPEG photos, one sub-folder per student."""
+    import cv2
+
+    rng = np.random.default_rng(3)
+    for i in range(n_students):
+        person_dir = os.path.join(root, f"student_{i:05d}")
+        os.makedirs(person_dir)
+        for j in range(photos):
+            photo = rng.integers(0, 255, (*size, 3), dtype=np.uint8)
+            cv2.imwrite(os.path.join(person_dir, f"{j}.jpg"), photo)
+
+
+# Probes run in a fresh interpreter so load time and RSS are not skewed by this process
+_RSS_HELPER = """
+import json, sys, time
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+"""
+
+_LOAD_PROBE = _RSS_HELPER + """
+import numpy as np
+from gallery import EmbeddingGallery
+from embeddings_store import EmbeddingStore, read_embeddings
+before = rss_mb()
+start = time.perf_counter()
+path = sys.argv[1]
+if path.endswith(".pkl"):
+    gallery = EmbeddingGallery.from_dict(read_embeddings(path))
+else:
+    gallery = EmbeddingGallery.from_store(EmbeddingStore(path).load())
+load_s = time.perf_counter() - start
+gallery.match(np.ones(gallery.dim, dtype=np.float32), 0.6)  # touch every row once
+print(json.dumps({"load_s": load_s, "rss_mb": rss_mb() - before}))
+"""
+
+
+_EMBED_PROBE = _RSS_HELPER + """
+import numpy as np
+from face_embedding import FaceEmbedder
+backend, model_path, crops_path, out_path = sys.argv[1:5]
+crops = list(np.load(crops_path))
+before = rss_mb()
+start = time.perf_counter()
+embedder = FaceEmbedder("ArcFace", backend=backend, model_path=model_path or None)
+embedder.embed(crops[:1])
+load_s = time.perf_counter() - start
+best = float("inf")
+for _ in range(3):
+    start = time.perf_counter()
+    out = embedder.embed(crops)
+    best = min(best, time.perf_counter() - start)
+np.save(out_path, out)
+print(json.dumps({"load_s": load_s, "rss_mb": rss_mb() - before, "faces_per_s": len(crops) / best}))
+"""
+
+
+# Serves app.py without the debug reloader, like a production worker
+_SERVE_APP = """
+import sys
+import app
+app.app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True, use_reloader=False)
+"""
+
+
+def _run_probe(script, *args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, "-c", script, *args], cwd=here,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _probe_load(path):
+    return _run_probe(_LOAD_PROBE, path)
+
+
+# ---------------------------
+# Benchmarks
+# ---------------------------
+
+
+def bench_match(students, per_student, faces, legacy_limit):
+    """Match latency of the legacy loop vs. the matrix gallery."""
+    rng = np.random.default_rng(1)
+    print(f"{'students':>9} {'vectors':>8} {'legacy/face':>12} {'gallery/face':>13} {'batch/frame':>12} ({faces} faces)")
+    for n in students:
+        db = _synthetic_db(n, per_student)
+        gallery = EmbeddingGallery.from_dict(db)
+        queries = rng.standard_normal((faces, EMBEDDING_DIM)).astype(np.float32)
+
+        single = _timeit(lambda: gallery.match(queries[0], 0.6))
+        batch = _timeit(lambda: gallery.match_batch(queries, 0.6))
+        if n <= legacy_limit:
+            legacy = f"{_timeit(lambda: _legacy_find_match(queries[0], db), repeat=2) * 1e3:10.2f}ms"
+        else:
+            legacy = f"{'skipped':>12}"
+        print(f"{n:>9} {len(gallery):>8} {legacy} {single * 1e3:11.3f}ms {batch * 1e3:10.3f}ms")
+
+
+def bench_embed(face_counts, batch_size):
+    """Faces/sec of per-crop DeepFace.represent vs. the batched FaceEmbedder."""
+    from face_embedding import FaceEmbedder, import_deepface
+
+    DeepFace = import_deepface()
+    rng = np.random.default_rng(2)
+    embedder = FaceEmbedder("ArcFace", batch_size=batch_size)
+    embedder.embed([rng.integers(0, 255, (120, 100, 3), dtype=np.uint8)])  # load + warm up
+
+    print(f"{'faces':>6} {'per-crop faces/s':>17} {'batched faces/s':>16} {'speedup':>8}")
+    for n in face_counts:
+        crops = [rng.integers(0, 255, (int(rng.integers(60, 200)), int(rng.integers(50, 180)), 3), dtype=np.uint8)
+                 for _ in range(n)]
+
+        def per_crop():
+            for crop in crops:
+                DeepFace.represent(crop, model_name="ArcFace", enforce_detection=False)
+
+        legacy = _timeit(per_crop, repeat=2)
+        batched = _timeit(lambda: embedder.embed(crops), repeat=3)
+        print(f"{n:>6} {n / legacy:>17.1f} {n / batched:>16.1f} {legacy / batched:>7.1f}x")
+
+
+def bench_transport(image_path, width, height):
+    """Per-frame payload size and server-side decode time: JSON/base64 vs. raw JPEG."""
+    import cv2
+
+    jpeg = _sample_jpeg(image_path, width, height)
+    json_body = json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode(), "classId": "abc123"})
+
+    def decode_json():
+        data = json.loads(json_body)
+        img = base64.b64decode(data["image"].split(",")[1])
+        cv2.imdecode(np.frombuffer(img, np.uint8), cv2.IMREAD_COLOR)
+
+    def decode_raw():
+        cv2.imdecode(np.frombuffer(memoryview(jpeg), np.uint8), cv2.IMREAD_COLOR)
+
+    json_s, raw_s = _timeit(decode_json, repeat=20), _timeit(decode_raw, repeat=20)
+    print(f"{'path':>14} {'bytes/frame':>12} {'decode ms':>10}")
+    print(f"{'json+base64':>14} {len(json_body):>12} {json_s * 1e3:>10.2f}")
+    print(f"{'raw image/jpeg':>14} {len(jpeg):>12} {raw_s * 1e3:>10.2f}")
+    print(f"payload -{(1 - len(jpeg) / len(json_body)) * 100:.0f}%, decode -{(1 - raw_s / json_s) * 100:.0f}%")
+
+
+def bench_enroll(students, photos, n_aug, worker_counts):
+    """Enrollment throughput (photos/sec) of a full rebuild for each worker count."""
+    from enrollment import build_embeddings
+    from face_embedding import FaceEmbedder
+
+    embedder = FaceEmbedder("ArcFace")
+    embedder.embed([np.zeros((112, 112, 3), dtype=np.uint8)])  # load + warm up
+
+    with tempfile.TemporaryDirectory() as root:
+        db_path = os.path.join(root, "Images")
+        _synthetic_photo_folder(db_path, students, photos)
+        total = students * photos
+
+        results = []
+        for workers in worker_counts:
+            emb_path = os.path.join(root, f"embeddings_{workers}.pkl")
+            start = time.perf_counter()
+            build_embeddings(db_path, n_aug=n_aug, emb_path=emb_path, workers=workers, embedder=embedder)
+            results.append((workers, time.perf_counter() - start))
+
+    print(f"\n{students} students x {photos} photos, N_AUG={n_aug} ({total * (1 + n_aug)} crops embedded)")
+    print(f"{'workers':>8} {'seconds':>8} {'photos/s':>9} {'crops/s':>8}")
+    for workers, elapsed in results:
+        print(f"{workers:>8} {elapsed:>8.1f} {total / elapsed:>9.1f} {total * (1 + n_aug) / elapsed:>8.1f}")
+
+
+def bench_store(students, per_student):
+    """Gallery load time and RSS growth: embeddings.pkl vs. the memory-mapped store."""
+    from embeddings_store import EmbeddingStore, write_embeddings
+
+    print(f"{'students':>9} {'vectors':>8} {'pkl MB':>7} {'pkl load':>9} {'pkl RSS':>8} "
+          f"{'store MB':>9} {'store load':>11} {'store RSS':>10}")
+    with tempfile.TemporaryDirectory() as root:
+        for n in students:
+            db = _synthetic_db(n, per_student)
+            pkl_path = os.path.join(root, f"embeddings_{n}.pkl")
+            store_path = os.path.join(root, f"embeddings_{n}")
+            write_embeddings(pkl_path, db, "ArcFace")
+            version = EmbeddingStore(store_path).write(db, "ArcFace")
+            del db
+
+            store_bytes = sum(os.path.getsize(os.path.join(store_path, version, f))
+                              for f in os.listdir(os.path.join(store_path, version)))
+            pkl, store = _probe_load(pkl_path), _probe_load(store_path)
+            print(f"{n:>9} {n * per_student:>8} {os.path.getsize(pkl_path) / 2**20:>7.1f} "
+                  f"{pkl['load_s'] * 1e3:>7.0f}ms {pkl['rss_mb']:>6.0f}MB "
+                  f"{store_bytes / 2**20:>9.1f} {store['load_s'] * 1e3:>9.1f}ms {store['rss_mb']:>8.0f}MB")
+    print("store RSS is file-backed page cache, shared by every process mapping the same version")
+
+
+def bench_index(students, per_student, n_probes, queries):
+    """Recall@1 (vs. exact search) and per-face latency of the IVF index."""
+    from face_index import IVFIndex
+
+    print(f"{'students':>9} {'vectors':>8} {'index':>10} {'build s':>8} {'ms/face':>8} {'recall@1':>9}")
+    for n in students:
+        db, query_vectors, _ = _clustered_db(n, per_student, queries)
+        exact = EmbeddingGallery.from_dict(db)
+        del db
+        exact_names = [name for name, _ in exact.match_batch(query_vectors, 0.0)]
+        exact_s = _timeit(lambda: exact.match_batch(query_vectors, 0.0), repeat=2)
+        print(f"{n:>9} {len(exact):>8} {'exact':>10} {'-':>8} {exact_s / queries * 1e3:>8.3f} {1.0:>9.3f}")
+
+        for n_probe in n_probes:
+            start = time.perf_counter()
+            gallery = exact.with_index(IVFIndex(n_probe=n_probe))
+            build_s = time.perf_counter() - start
+            ivf_names = [name for name, _ in gallery.match_batch(query_vectors, 0.0)]
+            ivf_s = _timeit(lambda: gallery.match_batch(query_vectors, 0.0), repeat=2)
+            recall = np.mean([a == b for a, b in zip(ivf_names, exact_names)])
+            print(f"{'':>9} {'':>8} {'ivf/' + str(n_probe):>10} {build_s:>8.1f} {ivf_s / queries * 1e3:>8.3f} {recall:>9.3f}")
+
+        # Incremental enrollment/removal on the last built index
+        new_vectors = np.random.default_rng(5).standard_normal((per_student, EMBEDDING_DIM))
+        add_s = _timeit(lambda: gallery.add_person("new_student", new_vectors).remove_person("new_student"), repeat=3)
+        print(f"{'':>9} add+remove one student: {add_s * 1e3:.1f} ms (no re-training)")
+
+
+def bench_prototypes(embeddings_path, held_out, caps, faces):
+    """Gallery size, match time and held-out accuracy margin before/after prototype compaction."""
+    from prototypes import PROTOTYPE_METHODS, compact_gallery, evaluate_margin
+
+    if embeddings_path and held_out:
+        from embeddings_store import read_embeddings
+        gallery = EmbeddingGallery.from_dict(read_embeddings(embeddings_path))
+        queries, truth = _embed_held_out(held_out)
+        source = f"{embeddings_path} vs. held-out photos in {held_out}"
+    else:
+        db, queries, truth = _synthetic_enrollment(300, photos=5, n_aug=5, held_out=2)
+        gallery = EmbeddingGallery.from_dict(db)
+        source = "synthetic: 300 students x 5 photos x (1 + 5 augmentations), 2 held-out photos each"
+
+    frame = queries[:faces]
+    print(source)
+    print(f"{'gallery':>14} {'vectors':>8} {'ms/frame':>9} {'accuracy':>9} {'mean margin':>12} {'p10 margin':>11}")
+
+    def report(label, g):
+        result = evaluate_margin(g, queries, truth)
+        match_s = _timeit(lambda: g.match_batch(frame, 0.6), repeat=5)
+        print(f"{label:>14} {len(g):>8} {match_s * 1e3:>9.3f} {result['accuracy']:>9.3f} "
+              f"{result['mean_margin']:>12.4f} {result['p10_margin']:>11.4f}")
+
+    report("all vectors", gallery)
+    for method in PROTOTYPE_METHODS:
+        for cap in ([1] if method == "mean" else caps):
+            start = time.perf_counter()
+            compacted = compact_gallery(gallery, method, cap)
+            label = method if method == "mean" else f"{method}/{cap}"
+            report(label, compacted)
+            print(f"{'':>14} compaction took {time.perf_counter() - start:.2f}s")
+
+
+def bench_onnx(models, images, faces):
+    """Parity with DeepFace embeddings, faces/sec, load time and RSS of each embedding backend."""
+    import cv2
+    from gallery import normalize_rows
+
+    if images:
+        from enrollment import list_student_images, prepare_image
+        crops = []
+        for person in sorted(os.listdir(images)):
+            if os.path.isdir(os.path.join(images, person)):
+                for img in list_student_images(images, person):
+                    crops.extend(prepare_image(os.path.join(images, person, img), 0, 0))
+        crops = crops[:faces]
+        source = f"{len(crops)} face crops from {images}"
+    else:
+        rng = np.random.default_rng(7)
+        base = rng.integers(0, 255, (8, 8, 3), dtype=np.uint8)
+        crops = [cv2.resize(np.clip(base + rng.integers(-30, 30, base.shape), 0, 255).astype(np.uint8), (112, 112))
+                 for _ in range(faces)]
+        source = f"{faces} synthetic crops (pass --images for real faces)"
+    crops = [cv2.resize(c, (112, 112)) for c in crops]  # one shape, so they stack into one .npy
+
+    runs = [("deepface", "")]
+    for model in models:
+        backend, model_path = ("opencv", model[len("opencv:"):]) if model.startswith("opencv:") else ("onnx", model)
+        if not os.path.exists(model_path):
+            print(f"⚠️ {model_path} not found, skipping (create it with export_onnx.py)")
+            continue
+        runs.append((backend, model_path))
+    with tempfile.TemporaryDirectory() as root:
+        crops_path = os.path.join(root, "crops.npy")
+        np.save(crops_path, np.stack(crops))
+        results = []
+        for backend, model_path in runs:
+            out_path = os.path.join(root, f"out_{len(results)}.npy")
+            stats = _run_probe(_EMBED_PROBE, backend, model_path, crops_path, out_path)
+            results.append((backend, model_path, stats, normalize_rows(np.load(out_path))))
+
+    reference = results[0][3]
+    gallery = EmbeddingGallery(reference, np.arange(len(reference)), [str(i) for i in range(len(reference))])
+    print(source)
+    print(f"{'backend':>28} {'faces/s':>8} {'load s':>7} {'RSS MB':>7} {'cos mean':>9} {'cos min':>8} {'same top-1':>11}")
+    for backend, model_path, stats, vectors in results:
+        cosines = np.sum(vectors * reference, axis=1)
+        # Does each face still match its own DeepFace embedding first?
+        top1 = np.mean([name == str(i) for i, (name, _) in enumerate(gallery.match_batch(vectors, -1.0))])
+        label = backend if not model_path else f"{backend}:{os.path.basename(model_path)}"
+        print(f"{label:>28} {stats['faces_per_s']:>8.1f} {stats['load_s']:>7.1f} {stats['rss_mb']:>7.0f} "
+              f"{cosines.mean():>9.5f} {cosines.min():>8.5f} {top1:>11.3f}")
+
+
+def _seconds_until(request_fn, start, timeout):
+    """Repeat `request_fn` until it succeeds; seconds since `start`, or None after `timeout`."""
+    from urllib.error import URLError
+
+    while time.perf_counter() - start < timeout:
+        try:
+            if request_fn():
+                return time.perf_counter() - start
+        except (URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def bench_startup(image_path, modes, timeout):
+    """Time from process start to the first health response, first recognition and /ready."""
+    import socket
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.request import Request, urlopen
+
+    body = _sample_jpeg(image_path, 640, 480)
+    here = os.path.dirname(os.path.abspath(__file__))
+    if not image_path:
+        print("No --image given: the synthetic frame has no faces, so the first recognition skips the model.")
+
+    def recognized(base):
+        request = Request(base + "/recognize_image?classId=default", data=body, headers={"Content-Type": "image/jpeg"})
+        with urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read()).get("status") == "success"
+
+    print(f"{'mode':>6} {'healthy s':>10} {'1st recognition s':>18} {'ready s':>8}")
+    for mode in modes:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        base = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, LAZY_STARTUP="1" if mode == "lazy" else "0")
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "-c", _SERVE_APP, str(port)], cwd=here, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            healthy = _seconds_until(lambda: urlopen(base + "/", timeout=timeout).status == 200, start, timeout)
+            # The first frame is sent as soon as the server answers, while /ready is polled alongside
+            with ThreadPoolExecutor(1) as pool:
+                first = pool.submit(_seconds_until, lambda: recognized(base), start, timeout)
+                ready = _seconds_until(lambda: urlopen(base + "/ready", timeout=timeout).status == 200, start, timeout)
+                first = first.result()
+        finally:
+            server.terminate()
+            server.wait()
+        cells = [f"{t:.2f}" if t is not None else "timeout" for t in (healthy, first, ready)]
+        print(f"{mode:>6} {cells[0]:>10} {cells[1]:>18} {cells[2]:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("match", help="gallery match latency vs. number of enrolled students")
+    p.add_argument("--students", type=int, nargs="+", default=[50, 500, 5000])
+    p.add_argument("--per-student", type=int, default=6, help="embeddings per student (photos x (1 + N_AUG))")
+    p.add_argument("--faces", type=int, default=30, help="faces per frame for the batched match")
+    p.add_argument("--legacy-limit", type=int, default=500, help="skip the slow legacy loop above this many students")
+
+    p = sub.add_parser("embed", help="faces/sec of per-crop vs. batched ArcFace embedding")
+    p.add_argument("--faces", type=int, nargs="+", default=[1, 10, 30])
+    p.add_argument("--batch-size", type=int, default=32)
+
+    p = sub.add_parser("transport", help="bytes and decode time per frame, JSON/base64 vs. raw JPEG")
+    p.add_argument("--image", help="JPEG to use instead of a synthetic frame")
+    p.add_argument("--width", type=int, default=640)
+    p.add_argument("--height", type=int, default=480)
+
+    p = sub.add_parser("enroll", help="enrollment photos/sec for a synthetic student folder")
+    p.add_argument("--students", type=int, default=200)
+    p.add_argument("--photos", type=int, default=5, help="photos per student")
+    p.add_argument("--n-aug", type=int, default=1)
+    p.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1],
+                   help="decode/augmentation processes to compare (0 = in-process)")
+
+    p = sub.add_parser("store", help="load time and RSS of embeddings.pkl vs. the memory-mapped store")
+    p.add_argument("--students", type=int, nargs="+", default=[500, 5000])
+    p.add_argument("--per-student", type=int, default=6)
+
+    p = sub.add_parser("index", help="recall@1 and latency of the IVF index vs. exact search")
+    p.add_argument("--students", type=int, nargs="+", default=[2000, 20000])
+    p.add_argument("--per-student", type=int, default=6)
+    p.add_argument("--n-probe", type=int, nargs="+", default=[4, 8, 16])
+    p.add_argument("--queries", type=int, default=300)
+
+    p = sub.add_parser("prototypes", help="held-out accuracy margin and match time after prototype compaction")
+    p.add_argument("--embeddings", help="embeddings store (or .pkl) to compact; synthetic data if omitted")
+    p.add_argument("--held-out", help="folder of held-out photos, one sub-folder per enrolled student")
+    p.add_argument("--cap", type=int, nargs="+", default=[1, 3, 5], help="prototypes per student")
+    p.add_argument("--faces", type=int, default=30, help="faces per frame for the match time")
+
+    p = sub.add_parser("onnx", help="parity, speed and memory of ONNX backends vs. DeepFace")
+    p.add_argument("--models", nargs="+", default=["arcface.onnx", "arcface_fp16.onnx", "arcface_int8.onnx"],
+                   help="ONNX files for the onnx backend; prefix with 'opencv:' for OpenCV DNN")
+    p.add_argument("--images", help="photo folder (one sub-folder per student) to crop faces from")
+    p.add_argument("--faces", type=int, default=64)
+
+    p = sub.add_parser("startup", help="time to first health response, first recognition and readiness")
+    p.add_argument("--image", help="JPEG with a face (default: synthetic frame without faces)")
+    p.add_argument("--modes", nargs="+", default=["lazy", "eager"], choices=["lazy", "eager"])
+    p.add_argument("--timeout", type=float, default=300.0)
+
+    args = parser.parse_args()
+    if args.benchmark == "match":
+        bench_match(args.students, args.per_student, args.faces, args.legacy_limit)
+    elif args.benchmark == "embed":
+        bench_embed(args.faces, args.batch_size)
+    elif args.benchmark == "transport":
+        bench_transport(args.image, args.width, args.height)
+    elif args.benchmark == "enroll":
+        bench_enroll(args.students, args.photos, args.n_aug, args.workers)
+    elif args.benchmark == "store":
+        bench_store(args.students, args.per_student)
+    elif args.benchmark == "index":
+        bench_index(args.students, args.per_student, args.n_probe, args.queries)
+    elif args.benchmark == "prototypes":
+        bench_prototypes(args.embeddings, args.held_out, args.cap, args.faces)
+    elif args.benchmark == "onnx":
+        bench_onnx(args.models, args.images, args.faces)
+    elif args.benchmark == "startup":
+        bench_startup(args.image, args.modes, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Per-class gallery shards for the Smart Attendance System.
+
+A class session only needs to recognize the students enrolled in that class,
+so each class gets a small gallery cut out of the resident global gallery.
+Class rosters come from Firestore and are cached for a TTL; a shard is
+re-cut when its roster is refreshed or the global gallery is reloaded.
+Only a class's first request waits for Firestore: an expired roster is
+re-read on a background thread while requests keep the cached one.
+
+invalidate() only reaches the process it runs in. Recognition worker
+processes keep their own shards, so after an enrollment change they can
+match against the old roster for up to one TTL (plus one Firestore read).
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+
+_Shard = namedtuple("_Shard", ["gallery", "roster", "source", "fetched_at"])
+
+
+class ClassGalleryShards:
+    """
+    Cache of per-class galleries derived from one GalleryCache.
+
+    Args:
+        gallery_cache: GalleryCache holding the global gallery
+        roster_loader: callable(class_id) -> list of enrolled student names, or None if unknown
+        ttl: seconds a class roster is trusted before it is fetched again
+        fallback_to_global: use the global gallery for classes without a roster
+            (unknown class, Firestore unavailable); otherwise they match nobody
+
+    Expired rosters are refreshed in the background; a failed refresh keeps
+    serving the cached roster.
+    """
+
+    def __init__(self, gallery_cache, roster_loader, ttl=300, fallback_to_global=True):
+        self.gallery_cache = gallery_cache
+        self.ttl = ttl
+        self.fallback_to_global = fallback_to_global
+        self._roster_loader = roster_loader
+        self._shards = {}
+        self._refreshing = set()  # class ids with a background roster fetch in flight
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "roster_fetches": 0, "roster_errors": 0, "rebuilds": 0, "fallbacks": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, class_id):
+        """Return the gallery to match faces of `class_id` against."""
+        source = self.gallery_cache.get()
+        if not class_id:
+            return source
+
+        shard = self._shards.get(class_id)
+        if shard is None:
+            # Nothing to serve yet: this request fetches the roster
+            roster, _ = self._fetch_roster(class_id)
+            shard = self._cut(source, roster, time.monotonic())
+            self._shards[class_id] = shard
+            return shard.gallery
+
+        if time.monotonic() - shard.fetched_at >= self.ttl:
+            # Roster expired: a background thread re-reads it, requests keep the cached roster meanwhile
+            self._start_refresh(class_id)
+        if shard.source is source:
+            self._count("hits")
+            return shard.gallery
+        # Global gallery reloaded: re-cut with the cached roster
+        recut = self._cut(source, shard.roster, shard.fetched_at)
+        self._replace(class_id, shard.fetched_at, recut)
+        return recut.gallery
+
+    def _fetch_roster(self, class_id):
+        """Load the roster of `class_id`. Returns (roster or None, whether the load succeeded)."""
+        self._count("roster_fetches")
+        try:
+            return self._roster_loader(class_id), True
+        except Exception as e:
+            self._count("roster_errors")
+            print(f"⚠️ Could not load roster for class {class_id}: {e}")
+            return None, False
+
+    def _cut(self, source, roster, fetched_at):
+        """Build the shard of `roster` from the global gallery `source`."""
+        if roster is None:
+            self._count("fallbacks")
+            gallery = source if self.fallback_to_global else source.subset([])
+        else:
+            gallery = source.subset(roster)
+        self._count("rebuilds")
+        return _Shard(gallery, roster, source, fetched_at)
+
+    def _replace(self, class_id, fetched_at, shard):
+        """Store `shard` unless the cached roster changed since `fetched_at` (refreshed or invalidated)."""
+        with self._lock:
+            current = self._shards.get(class_id)
+            if current is not None and current.fetched_at == fetched_at:
+                self._shards[class_id] = shard
+
+    def _start_refresh(self, class_id):
+        with self._lock:
+            if class_id in self._refreshing:
+                return
+            self._refreshing.add(class_id)
+        threading.Thread(target=self._refresh_roster, args=(class_id,),
+                         name="class-roster-refresh", daemon=True).start()
+
+    def _refresh_roster(self, class_id):
+        try:
+            shard = self._shards.get(class_id)
+            if shard is None:
+                return  # invalidated meanwhile: the next request loads it
+            roster, ok = self._fetch_roster(class_id)
+            if not ok:
+                # Keep the cached roster rather than widening the class to everyone; retried after another TTL
+                roster = shard.roster
+            self._replace(class_id, shard.fetched_at, self._cut(self.gallery_cache.get(), roster, time.monotonic()))
+        except Exception as e:
+            print(f"⚠️ Roster refresh failed for class {class_id}, keeping cached roster: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(class_id)
+
+    def invalidate(self, class_id=None):
+        """Forget the roster of `class_id` (or of every class) after an enrollment change."""
+        with self._lock:
+            if class_id is None:
+                self._shards.clear()
+            else:
+                self._shards.pop(class_id, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["classes"] = {
+            class_id: {
+                "people": shard.gallery.num_people,
+                "embeddings": len(shard.gallery),
+                "roster": len(shard.roster) if shard.roster is not None else None,
+            }
+            for class_id, shard in list(self._shards.items())
+        }
+        return stats
@@ -0,0 +1,255 @@
+"""
+Memory-mapped embeddings store for the Smart Attendance System.
+
+Layout of a store directory:
+    embeddings/
+        CURRENT          name of the active version directory
+        v000001/
+            vectors.npy  (n, dim) float32, L2-normalized rows grouped by person
+            labels.json  {"names": [...], "person": [name index per row], "image": [photo per row]}
+            meta.json    {"format", "model", "dim", "count", "normalized", "created_at"}
+
+Readers np.load the vectors with mmap_mode="r", so every process maps the
+same page-cache pages read-only instead of unpickling its own copy of Python
+floats. Writers build a complete new version directory and then atomically
+replace CURRENT, so readers see either the old or the new version.
+"""
+
+import json
+import os
+import pickle
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from gallery import normalize_rows
+
+
+STORE_FORMAT = 1
+KEEP_VERSIONS = 2  # the previous version stays readable for processes still mapping it
+
+StoreSnapshot = namedtuple("StoreSnapshot", ["vectors", "names", "labels", "images", "meta", "version"])
+
+
+def is_pickle_path(path):
+    """Legacy embeddings.pkl files are recognised by their extension."""
+    return path.endswith(".pkl")
+
+
+class EmbeddingStore:
+    """
+    Versioned on-disk embeddings store rooted at `root`.
+
+    Args:
+        root: store directory (created on first write)
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @property
+    def current_file(self):
+        return os.path.join(self.root, "CURRENT")
+
+    def current_version(self):
+        """Name of the active version directory, or None if nothing was written yet."""
+        try:
+            with open(self.current_file, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def exists(self):
+        return self.current_version() is not None
+
+    def load(self, mmap=True):
+        """
+        Open the active version.
+        With `mmap`, `vectors` is a read-only np.memmap; nothing is copied.
+        """
+        version = self.current_version()
+        if version is None:
+            raise FileNotFoundError(f"No embeddings store at {self.root}")
+        version_dir = os.path.join(self.root, version)
+
+        with open(os.path.join(version_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported embeddings store format: {meta.get('format')}")
+        with open(os.path.join(version_dir, "labels.json"), "r", encoding="utf-8") as f:
+            labels = json.load(f)
+
+        vectors = np.load(os.path.join(version_dir, "vectors.npy"), mmap_mode="r" if mmap else None)
+        if vectors.shape != (meta["count"], meta["dim"]):
+            raise ValueError(f"Embeddings store {version} is inconsistent: {vectors.shape} vs meta {meta}")
+        return StoreSnapshot(
+            vectors=vectors,
+            names=labels["names"],
+            labels=np.asarray(labels["person"], dtype=np.int64),
+            images=labels["image"],
+            meta=meta,
+            version=version,
+        )
+
+    def to_dict(self):
+        """Return the active version as {person: [embedding, ...]} (rows are float32 arrays)."""
+        snapshot = self.load(mmap=False)
+        embeddings = {name: [] for name in snapshot.names}
+        for row, label in zip(snapshot.vectors, snapshot.labels):
+            embeddings[snapshot.names[label]].append(row)
+        return embeddings
+
+    def write(self, embeddings, model_name, images=None):
+        """
+        Write {person: [embedding, ...]} as a new version and make it current.
+
+        Args:
+            embeddings: embeddings per person; people without embeddings are left out
+            model_name: model that produced the embeddings (recorded in meta.json)
+            images: optional {person: [photo per embedding]} recorded per row
+
+        Returns:
+            the new version name
+        """
+        names = sorted(p for p, vectors in embeddings.items() if len(vectors))
+        rows, person, image = [], [], []
+        for label, name in enumerate(names):
+            rows.extend(embeddings[name])
+            person.extend([label] * len(embeddings[name]))
+            row_images = (images or {}).get(name)
+            image.extend(row_images if row_images and len(row_images) == len(embeddings[name])
+                         else [""] * len(embeddings[name]))
+        vectors = normalize_rows(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+        return self._write_version(vectors, names, person, image, model_name)
+
+    def replace_person(self, name, vectors, model_name, images=None):
+        """
+        Write a new version in which `name` has exactly `vectors` (none: removed).
+        The other people's rows are copied as one array, without a round trip
+        through {person: [embedding, ...]}.
+
+        Returns:
+            the new version name
+        """
+        if not self.exists():
+            if not len(vectors):
+                return None
+            return self.write({name: vectors}, model_name, images={name: images} if images else None)
+        snapshot = self.load()
+        if name not in snapshot.names and not len(vectors):
+            return None
+        names = sorted(set(snapshot.names) - {name} | ({name} if len(vectors) else set()))
+        label_of = {n: i for i, n in enumerate(names)}
+        remap = np.array([label_of.get(n, -1) for n in snapshot.names] or [-1], dtype=np.int64)
+
+        labels = remap[snapshot.labels]
+        keep = np.flatnonzero(labels >= 0)
+        matrix = np.asarray(snapshot.vectors[keep], dtype=np.float32)
+        labels = labels[keep]
+        image = [snapshot.images[i] for i in keep.tolist()]
+        if len(vectors):
+            rows = normalize_rows(vectors)
+            matrix = np.concatenate([matrix, rows]) if len(matrix) else rows
+            labels = np.concatenate([labels, np.full(len(rows), label_of[name], dtype=np.int64)])
+            image.extend(images if images and len(images) == len(rows) else [""] * len(rows))
+
+        order = np.argsort(labels, kind="stable")
+        return self._write_version(matrix[order], names, labels[order].tolist(),
+                                   [image[i] for i in order.tolist()], model_name)
+
+    def _write_version(self, vectors, names, person, image, model_name):
+        """Write rows grouped by person as a new version directory and switch CURRENT to it."""
+        meta = {
+            "format": STORE_FORMAT,
+            "model": model_name,
+            "dim": int(vectors.shape[1]),
+            "count": int(vectors.shape[0]),
+            "normalized": True,
+            "created_at": time.time(),
+        }
+
+        os.makedirs(self.root, exist_ok=True)
+        version = self._next_version()
+        tmp_dir = os.path.join(self.root, f".{version}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+        with open(os.path.join(tmp_dir, "labels.json"), "w", encoding="utf-8") as f:
+            json.dump({"names": names, "person": person, "image": image}, f)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp_dir, os.path.join(self.root, version))
+
+        tmp_current = self.current_file + ".tmp"
+        with open(tmp_current, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_current, self.current_file)
+
+        self._prune()
+        return version
+
+    def _versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root)
+                      if d.startswith("v") and os.path.isdir(os.path.join(self.root, d)))
+
+    def _next_version(self):
+        versions = self._versions()
+        return f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+
+    def _prune(self):
+        current = self.current_version()
+        for version in self._versions()[:-KEEP_VERSIONS]:
+            if version != current:
+                # Best effort: a file still mapped by another process cannot be removed on Windows
+                shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+
+
+# ---------------------------
+# Path-based helpers
+# ---------------------------
+
+
+def watch_path(path):
+    """File whose changes signal new embeddings: CURRENT for a store, the file itself for a pickle."""
+    return path if is_pickle_path(path) else EmbeddingStore(path).current_file
+
+
+def read_embeddings(path):
+    """Read {person: [embedding, ...]} from a store directory or a legacy pickle ({} if missing)."""
+    if is_pickle_path(path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    store = EmbeddingStore(path)
+    return store.to_dict() if store.exists() else {}
+
+
+def replace_person(path, name, vectors, model_name, images=None):
+    """Store exactly `vectors` for `name` (none: remove the person) in a store directory or a legacy pickle."""
+    if is_pickle_path(path):
+        embeddings = read_embeddings(path)
+        if name not in embeddings and not len(vectors):
+            return None
+        embeddings.pop(name, None)
+        if len(vectors):
+            embeddings[name] = list(vectors)
+        return write_embeddings(path, embeddings, model_name)
+    return EmbeddingStore(path).replace_person(name, vectors, model_name, images=images)
+
+
+def write_embeddings(path, embeddings, model_name, images=None):
+    """Atomically write {person: [embedding, ...]} to a store directory or a legacy pickle."""
+    if not is_pickle_path(path):
+        return EmbeddingStore(path).write(embeddings, model_name, images=images)
+
+    # Write then rename, so readers never see a partial file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({p: [np.asarray(v).tolist() for v in vectors] for p, vectors in embeddings.items()}, f)
+    os.replace(tmp_path, path)
+    return None
@@ -0,0 +1,507 @@
+"""
+Enrollment pipeline for the Smart Attendance System.
+
+Builds the embeddings (store directory or legacy .pkl) from the student
+photo folders:
+- a per-image manifest (embeddings.manifest.json) records what each stored
+  vector was computed from, so an update only embeds photos that were added
+  or changed and drops the vectors of deleted photos
+- image decoding, face cropping (YuNet) and augmentation run in a process pool
+- crops are embedded in batches by the same FaceEmbedder used for recognition
+- every finished student is appended to a checkpoint file, so an interrupted
+  rebuild resumes where it stopped instead of starting over
+- enroll_student/unenroll_student add or drop a single student from
+  in-memory photos without scanning the other folders
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from embeddings_store import read_embeddings, replace_person, watch_path, write_embeddings
+from face_detection import DetectorPool
+from face_embedding import FaceEmbedder, crop_face
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+YUNET_MODEL_PATH = 'face_detection_yunet_2023mar.onnx'
+PREFETCH_STUDENTS = 2  # students whose images are prepared ahead of the one being embedded
+MANIFEST_VERSION = 1
+SETTING_DEFAULTS = {"backend": "deepface"}  # for manifest entries written before a setting existed
+
+
+# ---------------------------
+# Worker process side
+# ---------------------------
+
+
+_DETECTORS = {}  # model path -> DetectorPool, one per worker process
+
+
+def build_augmenter():
+    """The enrollment augmentation pipeline (imgaug)."""
+    import imgaug.augmenters as iaa
+
+    return iaa.Sequential([
+        iaa.Fliplr(0.5),                     # horizontal flip
+        iaa.GaussianBlur(sigma=(0, 1)),      # blur
+        iaa.Multiply((0.8, 1.2)),            # brightness
+        iaa.LinearContrast((0.8, 1.2)),      # contrast
+        iaa.AdditiveGaussianNoise(scale=(0, 0.02*255)),  # noise
+        iaa.Affine(rotate=(-15, 15), shear=(-10, 10), scale=(0.9, 1.1))  # rotation, shear, zoom
+    ])
+
+
+def _crop_largest_face(frame, detector_path, align):
+    """Crop the largest detected face; fall back to the whole photo."""
+    if not detector_path or not os.path.exists(detector_path):
+        return frame
+    pool = _DETECTORS.get(detector_path)
+    if pool is None:
+        pool = _DETECTORS[detector_path] = DetectorPool(detector_path, score_threshold=0.6, nms_threshold=0.3)
+    faces = pool.detect(frame)
+    if faces is None or len(faces) == 0:
+        return frame
+    largest = max(faces, key=lambda f: f[2] * f[3])
+    crop = crop_face(frame, largest, align=align)
+    return frame if crop is None else crop
+
+
+def prepare_image(img_path, n_aug, seed, detector_path=YUNET_MODEL_PATH, align=True):
+    """
+    Decode one photo, crop its face and create `n_aug` augmented copies.
+    Returns a list of BGR crops, the original first.
+    """
+    frame = cv2.imread(img_path)
+    if frame is None:
+        raise ValueError("Could not read image")
+    return prepare_frame(frame, n_aug, seed, detector_path, align)
+
+
+def prepare_frame(frame, n_aug, seed, detector_path=YUNET_MODEL_PATH, align=True):
+    """prepare_image for an already decoded BGR photo."""
+    face_img = _crop_largest_face(frame, detector_path, align)
+    crops = [face_img]
+    if n_aug > 0:
+        # Seeded per image, so a resumed or repeated build produces the same augmentations
+        augmenter = build_augmenter()
+        augmenter.seed_(seed)
+        face_img_rgb = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+        for aug_img_rgb in augmenter(images=[face_img_rgb] * n_aug):
+            crops.append(cv2.cvtColor(aug_img_rgb, cv2.COLOR_RGB2BGR))
+    return crops
+
+
+# ---------------------------
+# Manifest
+# ---------------------------
+
+
+def manifest_path_for(emb_path):
+    """embeddings.pkl -> embeddings.manifest.json"""
+    return os.path.splitext(emb_path)[0] + ".manifest.json"
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    """
+    Return {"<person>/<image>": entry} from the manifest at `path`, or {}.
+
+    Each entry records person, size, mtime, sha256, seed, model, n_aug, align
+    and the number of vectors the photo contributed to its person's list in
+    embeddings.pkl (vectors are stored in image-name order).
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read manifest {path}: {e}")
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        print(f"⚠️ Ignoring manifest {path} with unsupported version {data.get('version')}")
+        return {}
+    return data.get("images", {})
+
+
+def save_manifest(path, images):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "images": images}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _student_entries(manifest, person):
+    """Manifest entries of one student, in stored vector order."""
+    prefix = person + "/"
+    return [(key, manifest[key]) for key in sorted(manifest) if key.startswith(prefix)]
+
+
+def _stored_vectors(manifest, person, vectors):
+    """
+    Split a student's stored vector list back into {image key: vectors}.
+    Returns None when the list does not line up with the manifest (e.g. it was
+    written without one), in which case every photo of the student is redone.
+    """
+    entries = _student_entries(manifest, person)
+    if not entries or sum(entry["vectors"] for _, entry in entries) != len(vectors):
+        return None
+    per_image, start = {}, 0
+    for key, entry in entries:
+        per_image[key] = vectors[start:start + entry["vectors"]]
+        start += entry["vectors"]
+    return per_image
+
+
+def row_images(manifest, embeddings):
+    """{person: [photo key per stored vector]} for the people the manifest fully describes."""
+    images = {}
+    for person, vectors in embeddings.items():
+        keys = [key for key, entry in _student_entries(manifest, person) for _ in range(entry["vectors"])]
+        if len(keys) == len(vectors):
+            images[person] = keys
+    return images
+
+
+def _plan_student(db_path, person, manifest, settings):
+    """
+    Compare one student's photos with the manifest.
+    Returns (entries, stale): a fresh entry per current photo, and the images
+    whose vectors must be (re)computed. Photos are only hashed when their size
+    or mtime changed; a photo touched without a content change is kept.
+    """
+    entries, stale = {}, []
+    for img in list_student_images(db_path, person):
+        key = f"{person}/{img}"
+        path = os.path.join(db_path, person, img)
+        st = os.stat(path)
+        old = manifest.get(key)
+
+        if old is not None and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+            sha256 = old["sha256"]
+        else:
+            sha256 = _file_sha256(path)
+        entry = {"person": person, "size": st.st_size, "mtime": st.st_mtime, "sha256": sha256,
+                 "seed": int(sha256[:8], 16), **settings}
+
+        if old is None or any(old.get(k, SETTING_DEFAULTS.get(k)) != entry[k] for k in ("sha256", *settings)):
+            stale.append(img)
+        else:
+            entry["vectors"] = old["vectors"]
+        entries[key] = entry
+    return entries, stale
+
+
+# ---------------------------
+# Checkpointing
+# ---------------------------
+
+
+class EnrollmentCheckpoint:
+    """
+    Append-only log of finished students next to the embeddings file.
+
+    The first record holds the build settings; every following record is one
+    (person, embeddings, manifest entries) tuple. A record cut short by a
+    crash is ignored.
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+
+    def load(self):
+        """Return {person: (embeddings, entries)} saved by an interrupted build with the same settings."""
+        if not os.path.exists(self.path):
+            return {}
+        done = {}
+        with open(self.path, "rb") as f:
+            try:
+                if pickle.load(f) != self.settings:
+                    print("⚠️ Ignoring checkpoint written with different enrollment settings.")
+                    return {}
+                while True:
+                    person, vectors, entries = pickle.load(f)
+                    done[person] = (vectors, entries)
+            except EOFError:
+                pass
+            except Exception as e:
+                print(f"⚠️ Checkpoint ends with an incomplete record ({e}); resuming from the last complete one.")
+        return done
+
+    def start(self, done):
+        """Rewrite the log with the students already finished."""
+        with open(self.path, "wb") as f:
+            pickle.dump(self.settings, f)
+            for person, (vectors, entries) in done.items():
+                pickle.dump((person, vectors, entries), f)
+
+    def append(self, person, vectors, entries):
+        with open(self.path, "ab") as f:
+            pickle.dump((person, vectors, entries), f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+
+
+class _InlineExecutor:
+    """Runs submitted work immediately (workers=0), for debugging and benchmarks."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def list_student_images(db_path, person):
+    person_path = os.path.join(db_path, person)
+    return [img for img in sorted(os.listdir(person_path)) if img.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def build_embeddings(db_path, n_aug=5, emb_path="embeddings.pkl", workers=None, model_name="ArcFace",
+                     batch_size=32, detector_path=YUNET_MODEL_PATH, align=True, embedder=None,
+                     backend="deepface", model_path=None, progress=None):
+    """
+    Bring `emb_path` in line with the photo folders: embed photos that were
+    added or changed since the last build, drop vectors of deleted photos and
+    students, and keep everything else as stored.
+
+    Args:
+        db_path: folder with one sub-folder of photos per student
+        n_aug: augmented copies embedded per photo
+        emb_path: embeddings store directory, or a legacy .pkl ({person: [embedding, ...]})
+        workers: processes for decoding/augmentation (None = CPU count, 0 = in-process)
+        detector_path: YuNet model used to crop the face of each photo
+        embedder: FaceEmbedder to reuse (one is created otherwise)
+        backend, model_path: embedding backend of the created FaceEmbedder (see face_embedding.py);
+            photos embedded with another backend are re-encoded
+        progress: optional callable(**counts) told students/images to update and done so far
+
+    Returns:
+        the updated {person: [embedding, ...]} dict
+    """
+    # Load existing embeddings if available
+    embeddings = read_embeddings(emb_path)
+    if embeddings:
+        print("📂 Loaded existing embeddings.")
+    else:
+        print("🆕 Starting fresh embeddings database.")
+
+    if embedder is not None:
+        backend = embedder.backend
+    settings = {"model": model_name, "n_aug": n_aug, "align": align, "backend": backend}
+    manifest_path = manifest_path_for(emb_path)
+    manifest = load_manifest(manifest_path)
+    if embeddings and not manifest:
+        print("⚠️ No manifest found: existing students are re-encoded once to record their photos.")
+
+    checkpoint = EnrollmentCheckpoint(emb_path + ".partial", settings)
+    resumed = checkpoint.load()
+    if resumed:
+        print(f"↩️ Resuming interrupted build: {len(resumed)} students already encoded.")
+    checkpoint.start(resumed)
+
+    # Work out which photos changed before starting any model work
+    students = sorted(p for p in os.listdir(db_path) if os.path.isdir(os.path.join(db_path, p)))
+    new_manifest, todo = {}, []
+    changed_photos = removed_photos = 0
+    for person in students:
+        if person in resumed:
+            embeddings[person], entries = resumed[person]
+            new_manifest.update(entries)
+            continue
+        entries, stale = _plan_student(db_path, person, manifest, settings)
+        stored = _stored_vectors(manifest, person, embeddings.get(person, []))
+        if stored is None and person in embeddings:
+            stale = [key.split("/", 1)[1] for key in entries]  # vectors without a usable manifest
+        removed = [key for key, _ in _student_entries(manifest, person) if key not in entries]
+        if stale or removed or person not in embeddings:
+            todo.append((person, entries, stale, stored or {}))
+            changed_photos += len(stale)
+            removed_photos += len(removed)
+        else:
+            new_manifest.update(entries)
+    print(f"⏩ {len(students) - len(todo)} students unchanged, {len(todo)} to update "
+          f"({changed_photos} new/changed photos, {removed_photos} removed photos).")
+    report = progress or (lambda **counts: None)
+    report(students_total=len(todo), students_done=0, images_total=changed_photos, images_done=0)
+
+    embedder = embedder or FaceEmbedder(model_name, batch_size=batch_size, backend=backend, model_path=model_path)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 0 and changed_photos:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = _InlineExecutor()
+
+    try:
+        queue = deque()
+        remaining = iter(todo)
+
+        def submit_next():
+            job = next(remaining, None)
+            if job is None:
+                return
+            person, entries, stale, stored = job
+            futures = {
+                img: executor.submit(prepare_image, os.path.join(db_path, person, img), n_aug,
+                                     entries[f"{person}/{img}"]["seed"], detector_path, align)
+                for img in stale
+            }
+            queue.append((person, entries, futures, stored))
+
+        for _ in range(PREFETCH_STUDENTS):
+            submit_next()
+        students_done = images_done = 0
+
+        while queue:
+            person, entries, futures, stored = queue.popleft()
+            submit_next()
+            print(f"\n🔄 Updating {person}: {len(futures)} photos to encode")
+
+            crops, counts = [], {}
+            for img, future in futures.items():
+                try:
+                    image_crops = future.result()
+                except Exception as e:
+                    print(f"  ❌ Skipping {os.path.join(db_path, person, img)}: {e}")
+                    continue
+                crops.extend(image_crops)
+                counts[f"{person}/{img}"] = len(image_crops)
+            new_vectors = embedder.embed(crops).tolist() if crops else []
+
+            # Reassemble the student's list in image order: kept vectors + new ones
+            vectors, done_entries, start = [], {}, 0
+            for key in sorted(entries):
+                entry = entries[key]
+                if key in counts:
+                    entry["vectors"] = counts[key]
+                    vectors.extend(new_vectors[start:start + counts[key]])
+                    start += counts[key]
+                elif key in stored and "vectors" in entry:
+                    vectors.extend(stored[key])
+                else:
+                    continue  # unreadable photo: left out of the manifest, retried next update
+                done_entries[key] = entry
+
+            embeddings[person] = vectors
+            new_manifest.update(done_entries)
+            checkpoint.append(person, vectors, done_entries)
+            print(f"📊 Total embeddings for {person}: {len(vectors)} ({len(done_entries)} photos)")
+            students_done += 1
+            images_done += len(futures)
+            report(students_done=students_done, images_done=images_done)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # Remove embeddings of students no longer in folder
+    current_students = set(students)
+    removed_students = [name for name in embeddings if name not in current_students]
+    for name in removed_students:
+        del embeddings[name]
+        print(f"🗑️ Removed old student embeddings: {name}")
+
+    if todo or removed_students or resumed or not os.path.exists(watch_path(emb_path)):
+        write_embeddings(emb_path, embeddings, model_name, images=row_images(new_manifest, embeddings))
+    if new_manifest != manifest:
+        save_manifest(manifest_path, new_manifest)
+    checkpoint.remove()
+
+    print("\n✅ Embeddings updated & saved.")
+    total_embeddings = sum(len(v) for v in embeddings.values())
+    print(f"📈 Final Summary: {len(embeddings)} people, {total_embeddings} embeddings total.")
+    return embeddings
+
+
+# ---------------------------
+# Single-student fast path
+# ---------------------------
+
+
+def enroll_student(db_path, person, photos, emb_path="embeddings.pkl", n_aug=5, model_name="ArcFace",
+                   detector_path=YUNET_MODEL_PATH, align=True, embedder=None, backend="deepface",
+                   model_path=None):
+    """
+    Embed one student's photos straight from memory and store them in one
+    step, without scanning the other students' folders. The vectors and
+    manifest entries are exactly what build_embeddings would produce for the
+    same files (same per-photo augmentation seeds), so a later full update
+    keeps them as they are.
+
+    Args:
+        db_path: folder with one sub-folder of photos per student
+        person: the student's folder name
+        photos: {file name: encoded image bytes}, all of the student's photos,
+            already saved under db_path/person (their size and mtime go into the manifest)
+        embedder: FaceEmbedder to reuse (one is created otherwise)
+
+    Returns:
+        the student's embeddings, as an (n, dim) array
+    """
+    embedder = embedder or FaceEmbedder(model_name, backend=backend, model_path=model_path)
+    settings = {"model": model_name, "n_aug": n_aug, "align": align, "backend": embedder.backend}
+
+    crops, entries = [], {}
+    for img in sorted(photos):
+        data = photos[img]
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            print(f"  ❌ Skipping {os.path.join(db_path, person, img)}: Could not read image")
+            continue
+        sha256 = hashlib.sha256(data).hexdigest()
+        image_crops = prepare_frame(frame, n_aug, int(sha256[:8], 16), detector_path, align)
+        st = os.stat(os.path.join(db_path, person, img))
+        entries[f"{person}/{img}"] = {"person": person, "size": st.st_size, "mtime": st.st_mtime,
+                                      "sha256": sha256, "seed": int(sha256[:8], 16), **settings,
+                                      "vectors": len(image_crops)}
+        crops.extend(image_crops)
+    vectors = embedder.embed(crops) if crops else np.zeros((0, 0), dtype=np.float32)
+
+    manifest_path = manifest_path_for(emb_path)
+    manifest = {k: v for k, v in load_manifest(manifest_path).items() if v.get("person") != person}
+    manifest.update(entries)
+    images = [key for key in sorted(entries) for _ in range(entries[key]["vectors"])]
+    replace_person(emb_path, person, vectors, model_name, images=images)
+    save_manifest(manifest_path, manifest)
+    print(f"✅ Enrolled {person}: {len(vectors)} embeddings from {len(entries)} photos.")
+    return vectors
+
+
+def unenroll_student(person, emb_path="embeddings.pkl", model_name="ArcFace"):
+    """Drop one student's embeddings and manifest entries in one step."""
+    manifest_path = manifest_path_for(emb_path)
+    manifest = load_manifest(manifest_path)
+    replace_person(emb_path, person, [], model_name)
+    kept = {k: v for k, v in manifest.items() if v.get("person") != person}
+    if kept != manifest:
+        save_manifest(manifest_path, kept)
+    print(f"🗑️ Removed student embeddings: {person}")
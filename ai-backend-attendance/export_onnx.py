@@ -0,0 +1,69 @@
+"""
+Export DeepFace's ArcFace model to ONNX for the "onnx" / "opencv" embedding backends.
+
+Usage:
+    python export_onnx.py [--output arcface.onnx] [--quantize int8 fp16]
+
+Writes the FP32 model plus one file per requested quantization:
+    arcface.onnx        FP32 (onnx and opencv backends)
+    arcface_fp16.onnx   FP16 weights, FP32 inputs/outputs (onnx and opencv backends)
+    arcface_int8.onnx   dynamic INT8 weight quantization (onnx backend only)
+
+Requires: pip install tf2onnx onnxruntime onnxconverter-common
+Check accuracy and speed afterwards with: python benchmarks.py onnx
+"""
+
+import argparse
+import os
+
+from face_embedding import TARGET_SIZES, import_deepface
+
+
+def export_fp32(model_name, output_path, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = import_deepface().build_model(model_name)
+    height, width = TARGET_SIZES[model_name]
+    spec = [tf.TensorSpec((None, height, width, 3), tf.float32, name="input")]
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+    print(f"✅ Exported {model_name} to {output_path}")
+    return output_path
+
+
+def quantize_int8(fp32_path, output_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QInt8)
+    print(f"✅ INT8 (dynamic) model written to {output_path}")
+    return output_path
+
+
+def convert_fp16(fp32_path, output_path):
+    import onnx
+    from onnxconverter_common import float16
+
+    model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+    onnx.save(model, output_path)
+    print(f"✅ FP16 model written to {output_path}")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="ArcFace", choices=sorted(TARGET_SIZES))
+    parser.add_argument("--output", default="arcface.onnx", help="FP32 output path")
+    parser.add_argument("--quantize", nargs="*", default=["int8", "fp16"], choices=["int8", "fp16"])
+    parser.add_argument("--opset", type=int, default=13)
+    args = parser.parse_args()
+
+    fp32_path = export_fp32(args.model, args.output, args.opset)
+    stem, ext = os.path.splitext(fp32_path)
+    if "int8" in args.quantize:
+        quantize_int8(fp32_path, f"{stem}_int8{ext}")
+    if "fp16" in args.quantize:
+        convert_fp16(fp32_path, f"{stem}_fp16{ext}")
+
+
+if __name__ == "__main__":
+    main()
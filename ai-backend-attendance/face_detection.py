@@ -0,0 +1,101 @@
+"""
+YuNet face detector pool for the Smart Attendance System.
+
+cv2.FaceDetectorYN instances are not thread-safe and creating one re-parses
+the ONNX model, so detectors are kept per thread and re-used across frames.
+A detector is only re-sized (setInputSize) when the frame size changes.
+"""
+
+import threading
+from collections import OrderedDict
+
+import cv2
+
+
+class DetectorPool:
+    """
+    Per-thread cache of YuNet detectors keyed by input size (width, height).
+
+    Args:
+        model_path: path to the YuNet ONNX model
+        score_threshold, nms_threshold, top_k: passed to FaceDetectorYN.create
+        max_detectors_per_thread: sizes kept per thread before the least recently
+            used detector is re-sized instead of creating a new one
+    """
+
+    def __init__(self, model_path, score_threshold=0.6, nms_threshold=0.3, top_k=5000,
+                 max_detectors_per_thread=4):
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self.max_detectors_per_thread = max(1, max_detectors_per_thread)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"created": 0, "resized": 0, "reused": 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _create(self, size):
+        self._count("created")
+        return cv2.FaceDetectorYN.create(
+            self.model_path,
+            "",
+            size,
+            score_threshold=self.score_threshold,
+            nms_threshold=self.nms_threshold,
+            top_k=self.top_k
+        )
+
+    def get(self, width, height):
+        """Return this thread's detector for a (width, height) input."""
+        detectors = getattr(self._local, "detectors", None)
+        if detectors is None:
+            detectors = self._local.detectors = OrderedDict()
+
+        size = (int(width), int(height))
+        detector = detectors.get(size)
+        if detector is not None:
+            detectors.move_to_end(size)
+            self._count("reused")
+            return detector
+
+        if len(detectors) >= self.max_detectors_per_thread:
+            # Re-use the least recently used detector for the new size
+            _, detector = detectors.popitem(last=False)
+            detector.setInputSize(size)
+            self._count("resized")
+        else:
+            detector = self._create(size)
+        detectors[size] = detector
+        return detector
+
+    def detect(self, frame, max_side=None):
+        """
+        Detect faces in a BGR frame.
+
+        If `max_side` is set and the frame is larger, detection runs on a copy
+        downscaled so its longest side equals `max_side`; boxes and landmarks
+        are mapped back to the original frame coordinates.
+
+        Returns:
+            (N, 15) float32 YuNet rows [x, y, w, h, 5 landmarks (x, y), score], or None
+        """
+        h, w = frame.shape[:2]
+        scale = 1.0
+        if max_side and max(h, w) > max_side:
+            scale = max_side / float(max(h, w))
+            w, h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+            frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+
+        _, faces = self.get(w, h).detect(frame)
+        if faces is not None and scale != 1.0:
+            faces = faces.copy()
+            faces[:, :14] /= scale
+        return faces
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
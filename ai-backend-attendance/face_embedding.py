@@ -0,0 +1,202 @@
+"""
+Batched ArcFace embedding for the Smart Attendance System.
+
+DeepFace.represent runs detection, preprocessing and one forward pass per
+call. Faces already located by YuNet are instead aligned, resized and
+stacked here so the ArcFace model runs once per frame (or per micro-batch).
+
+The forward pass runs on one of these backends:
+- "deepface": the DeepFace/TensorFlow model (reference)
+- "onnx":     an exported ONNX model (FP32, FP16 or INT8, see export_onnx.py) on ONNX Runtime
+- "opencv":   an exported FP32/FP16 ONNX model on OpenCV DNN (no extra dependency)
+"""
+
+import math
+import threading
+
+import cv2
+import numpy as np
+
+
+# DeepFace's ArcFace input size (height, width)
+TARGET_SIZES = {"ArcFace": (112, 112)}
+EMBEDDING_BACKENDS = ("deepface", "onnx", "opencv")
+
+
+# ---------------------------
+# Preprocessing
+# ---------------------------
+
+
+def crop_face(frame, face, align=True, margin=0.25):
+    """
+    Crop one YuNet detection from a BGR frame.
+
+    With `align`, the region around the face is first rotated about the eye
+    centre so both eyes are level (YuNet landmarks 0 and 1 are the eyes).
+    Returns the crop, or None if the box falls outside the frame.
+    """
+    frame_h, frame_w = frame.shape[:2]
+    x, y, w, h = (float(v) for v in face[:4])
+    if not align or len(face) < 8:
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        crop = frame[y0:y0 + min(int(h), frame_h - y0), x0:x0 + min(int(w), frame_w - x0)]
+        return crop if crop.size else None
+
+    pad = margin * max(w, h)
+    x0, y0 = max(0, int(x - pad)), max(0, int(y - pad))
+    x1, y1 = min(frame_w, int(x + w + pad)), min(frame_h, int(y + h + pad))
+    region = frame[y0:y1, x0:x1]
+    if region.size == 0:
+        return None
+
+    (rx, ry), (lx, ly) = face[4:6], face[6:8]
+    angle = math.degrees(math.atan2(ly - ry, lx - rx))
+    center = ((rx + lx) / 2.0 - x0, (ry + ly) / 2.0 - y0)
+    rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+    region = cv2.warpAffine(region, rotation, (region.shape[1], region.shape[0]),
+                            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    bx, by = max(0, int(x) - x0), max(0, int(y) - y0)
+    crop = region[by:by + int(h), bx:bx + int(w)]
+    return crop if crop.size else None
+
+
+def preprocess_face(face_img, target_size):
+    """
+    Resize with preserved aspect ratio, zero-pad to `target_size` and scale
+    to [0, 1], the same way DeepFace prepares a face for ArcFace.
+    """
+    target_h, target_w = target_size
+    factor = min(target_h / face_img.shape[0], target_w / face_img.shape[1])
+    dsize = (max(1, int(face_img.shape[1] * factor)), max(1, int(face_img.shape[0] * factor)))
+    resized = cv2.resize(face_img, dsize)
+
+    diff_h = target_h - resized.shape[0]
+    diff_w = target_w - resized.shape[1]
+    padded = np.pad(
+        resized,
+        ((diff_h // 2, diff_h - diff_h // 2), (diff_w // 2, diff_w - diff_w // 2), (0, 0)),
+        "constant"
+    )
+    if padded.shape[:2] != (target_h, target_w):
+        padded = cv2.resize(padded, (target_w, target_h))
+    return padded.astype(np.float32) / 255.0
+
+
+# ---------------------------
+# Inference backends
+# ---------------------------
+
+
+def import_deepface():
+    """
+    Import DeepFace (and TensorFlow) on first use, so processes that only crop
+    faces or serve health checks never load them.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    # deepface 0.0.79 references a layer that newer Keras versions no longer ship
+    keras.layers.LocallyConnected2D = tf.keras.layers.experimental.preprocessing.Resizing
+    from deepface import DeepFace
+    return DeepFace
+
+
+class OnnxRuntimeModel:
+    """ONNX Runtime session with the predict_on_batch interface of a Keras model."""
+
+    def __init__(self, model_path, threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # FP16 models exported without keep_io_types take float16 input
+        self.input_dtype = np.float16 if model_input.type == "tensor(float16)" else np.float32
+
+    def predict_on_batch(self, batch):
+        outputs = self.session.run(None, {self.input_name: batch.astype(self.input_dtype, copy=False)})
+        return outputs[0].astype(np.float32, copy=False)
+
+
+class OpenCVDnnModel:
+    """OpenCV DNN network with the predict_on_batch interface (INT8 dynamic quantization is not supported)."""
+
+    def __init__(self, model_path):
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def predict_on_batch(self, batch):
+        self.net.setInput(np.ascontiguousarray(batch, dtype=np.float32))
+        return self.net.forward().reshape(len(batch), -1)
+
+
+# ---------------------------
+# Batched embedder
+# ---------------------------
+
+
+class FaceEmbedder:
+    """
+    Runs the face recognition model on stacked batches of face crops.
+
+    Args:
+        model_name: DeepFace model name (currently "ArcFace")
+        batch_size: maximum faces per forward pass
+        backend: "deepface", "onnx" or "opencv"
+        model_path: exported ONNX model, required for the "onnx" and "opencv" backends
+    """
+
+    def __init__(self, model_name="ArcFace", batch_size=32, backend="deepface", model_path=None):
+        if model_name not in TARGET_SIZES:
+            raise ValueError(f"Unsupported model for batched embedding: {model_name}")
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"backend must be one of {EMBEDDING_BACKENDS}, got {backend!r}")
+        if backend != "deepface" and not model_path:
+            raise ValueError(f"The {backend} backend needs the path of an exported ONNX model")
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.backend = backend
+        self.model_path = model_path
+        self.target_size = TARGET_SIZES[model_name]
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def _load_model(self):
+        if self.backend == "onnx":
+            return OnnxRuntimeModel(self.model_path)
+        if self.backend == "opencv":
+            return OpenCVDnnModel(self.model_path)
+        return import_deepface().build_model(self.model_name)
+
+    def warm_up(self):
+        """Load the model and run one forward pass so the first real frame is not slowed by it."""
+        height, width = self.target_size
+        self.embed([np.zeros((height, width, 3), dtype=np.uint8)])
+
+    def embed(self, face_images):
+        """
+        Embed a list of BGR face crops.
+        Returns a (len(face_images), dim) float32 array in input order.
+        """
+        if len(face_images) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        batch = np.stack([preprocess_face(img, self.target_size) for img in face_images])
+        outputs = [
+            np.asarray(self.model.predict_on_batch(batch[start:start + self.batch_size]), dtype=np.float32)
+            for start in range(0, len(batch), self.batch_size)
+        ]
+        return np.concatenate(outputs, axis=0)
@@ -0,0 +1,286 @@
+"""
+Nearest-neighbour indexes over enrolled face embeddings.
+
+EmbeddingGallery scores every stored embedding for every face, which is the
+right choice for a class or a small school. For school-wide galleries an
+inverted-file (IVF) index only scores the embeddings in the few clusters
+closest to the face. Both indexes share one interface:
+
+    build(vectors, names)        rows L2-normalized, one person name per row
+    add(name, vectors)           enroll (or extend) one person
+    remove(name)                 drop every row of one person
+    search(queries, k)           k best people per query, by max cosine similarity
+    copy()                       an index that can be updated without affecting this one
+
+An index's rows live in one immutable state tuple. Updates build a new state
+and publish it with a single assignment, and a search reads the state once,
+so a concurrent search sees either the whole old or the whole new index.
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+
+INDEX_KINDS = ("brute", "ivf", "auto")
+
+
+def _top_people(sims, person_ids, k):
+    """Best `k` (person id, score) pairs from row similarities, one entry per person."""
+    if sims.size == 0:
+        return []
+    order = np.argsort(-sims, kind="stable")
+    ranked_ids = person_ids[order]
+    _, first = np.unique(ranked_ids, return_index=True)
+    first.sort()
+    best = first[:k]
+    return list(zip(ranked_ids[best].tolist(), sims[order][best].tolist()))
+
+
+def _group_rows(assign, n_groups):
+    """Row numbers per group for an (n,) array of group numbers."""
+    order = np.argsort(assign, kind="stable")
+    bounds = np.searchsorted(assign[order], np.arange(n_groups + 1))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(n_groups)]
+
+
+_BruteState = namedtuple("_BruteState", "vectors person_ids")
+
+# lists: tuple of (vectors, person ids) per cluster; person_lists: person id -> frozenset of list numbers
+_IVFState = namedtuple("_IVFState", "centroids lists person_lists")
+_EMPTY_IVF = _IVFState(np.zeros((0, 0), dtype=np.float32), (), {})
+
+
+class _PersonIds:
+    """Stable int id per person name; ids of removed people are not reused."""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def get(self, name):
+        person_id = self.ids.get(name)
+        if person_id is None:
+            person_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return person_id
+
+
+class BruteForceIndex:
+    """Exact search: every stored row is scored for every query."""
+
+    kind = "brute"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._people = _PersonIds()
+        self._state = _BruteState(np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64))
+
+    @property
+    def vectors(self):
+        return self._state.vectors
+
+    @property
+    def person_ids(self):
+        return self._state.person_ids
+
+    def __len__(self):
+        return int(self._state.vectors.shape[0])
+
+    def copy(self):
+        """An index over the same rows; updating either one leaves the other unchanged."""
+        other = BruteForceIndex()
+        other._lock, other._people, other._state = self._lock, self._people, self._state
+        return other
+
+    def build(self, vectors, names):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            person_ids = np.array([self._people.get(n) for n in names], dtype=np.int64)
+            self._state = _BruteState(vectors, person_ids)
+
+    def add(self, name, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            person_id = self._people.get(name)
+            state = self._state
+            base = state.vectors if len(state.vectors) else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            self._state = _BruteState(
+                np.concatenate([base, vectors]),
+                np.concatenate([state.person_ids, np.full(len(vectors), person_id, dtype=np.int64)]),
+            )
+
+    def remove(self, name):
+        with self._lock:
+            person_id = self._people.ids.get(name)
+            if person_id is None:
+                return
+            state = self._state
+            keep = state.person_ids != person_id
+            self._state = _BruteState(state.vectors[keep], state.person_ids[keep])
+
+    def search(self, queries, k=1):
+        """Return, per query, up to `k` (name, score) pairs sorted by score."""
+        vectors, person_ids = self._state
+        if len(vectors) == 0:
+            return [[] for _ in queries]
+        sims = np.asarray(queries, dtype=np.float32) @ vectors.T
+        names = self._people.names
+        return [[(names[p], s) for p, s in _top_people(row, person_ids, k)] for row in sims]
+
+    def stats(self):
+        return {"kind": self.kind, "embeddings": len(self)}
+
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are clustered with spherical k-means and a
+    query only scores the rows of its `n_probe` closest clusters.
+
+    Args:
+        n_lists: number of clusters (default: 4 * sqrt(rows))
+        n_probe: clusters scored per query; higher is slower and more exact
+        train_iterations: k-means iterations at build time
+        seed: k-means initialisation seed
+    """
+
+    kind = "ivf"
+
+    def __init__(self, n_lists=None, n_probe=8, train_iterations=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._people = _PersonIds()
+        self._state = _EMPTY_IVF
+
+    @property
+    def centroids(self):
+        return self._state.centroids
+
+    def __len__(self):
+        return int(sum(len(ids) for _, ids in self._state.lists))
+
+    def copy(self):
+        """An index over the same rows; updating either one leaves the other unchanged."""
+        other = IVFIndex(self.n_lists, self.n_probe, self.train_iterations, self.seed)
+        other._lock, other._people, other._state = self._lock, self._people, self._state
+        return other
+
+    def _train(self, vectors):
+        """Spherical k-means on (a sample of) the rows; returns unit-length centroids."""
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        sample = vectors
+        if len(vectors) > 32 * n_lists:
+            sample = vectors[rng.choice(len(vectors), 32 * n_lists, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            groups = _group_rows(np.argmax(sample @ centroids.T, axis=1), n_lists)
+            for list_no, rows in enumerate(groups):
+                # An empty cluster keeps its previous centroid
+                if len(rows):
+                    total = sample[rows].sum(axis=0)
+                    centroids[list_no] = total / max(np.linalg.norm(total), 1e-12)
+        return centroids
+
+    def build(self, vectors, names):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            person_ids = np.array([self._people.get(n) for n in names], dtype=np.int64)
+            if len(vectors) == 0:
+                self._state = _EMPTY_IVF
+                return
+            centroids = self._train(vectors)
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            groups = _group_rows(assign, len(centroids))
+            person_lists = {}
+            for person_id, list_no in set(zip(person_ids.tolist(), assign.tolist())):
+                person_lists.setdefault(person_id, set()).add(list_no)
+            self._state = _IVFState(
+                centroids,
+                tuple((vectors[rows], person_ids[rows]) for rows in groups),
+                {person_id: frozenset(lists) for person_id, lists in person_lists.items()},
+            )
+
+    def add(self, name, vectors):
+        """Assign new rows to their closest existing clusters (no re-training)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(self._state.centroids) == 0:
+            self.build(vectors, [name] * len(vectors))
+            return
+        with self._lock:
+            person_id = self._people.get(name)
+            state = self._state
+            assign = np.argmax(vectors @ state.centroids.T, axis=1)
+            lists = list(state.lists)
+            touched = np.unique(assign).tolist()
+            for list_no in touched:
+                rows = vectors[assign == list_no]
+                list_vectors, list_ids = lists[list_no]
+                lists[list_no] = (
+                    np.concatenate([list_vectors, rows]),
+                    np.concatenate([list_ids, np.full(len(rows), person_id, dtype=np.int64)]),
+                )
+            person_lists = dict(state.person_lists)
+            person_lists[person_id] = person_lists.get(person_id, frozenset()) | frozenset(touched)
+            self._state = _IVFState(state.centroids, tuple(lists), person_lists)
+
+    def remove(self, name):
+        with self._lock:
+            person_id = self._people.ids.get(name)
+            state = self._state
+            if person_id not in state.person_lists:
+                return
+            lists = list(state.lists)
+            for list_no in state.person_lists[person_id]:
+                list_vectors, list_ids = lists[list_no]
+                keep = list_ids != person_id
+                lists[list_no] = (list_vectors[keep], list_ids[keep])
+            person_lists = dict(state.person_lists)
+            del person_lists[person_id]
+            self._state = _IVFState(state.centroids, tuple(lists), person_lists)
+
+    def search(self, queries, k=1):
+        """Return, per query, up to `k` (name, score) pairs sorted by score."""
+        queries = np.asarray(queries, dtype=np.float32)
+        state = self._state
+        if len(state.centroids) == 0:
+            return [[] for _ in queries]
+        n_probe = min(self.n_probe, len(state.centroids))
+        probes = np.argpartition(-(queries @ state.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+
+        names = self._people.names
+        results = []
+        for query, probe in zip(queries, probes):
+            sims = [state.lists[l][0] @ query for l in probe]
+            ids = [state.lists[l][1] for l in probe]
+            top = _top_people(np.concatenate(sims), np.concatenate(ids), k)
+            results.append([(names[p], s) for p, s in top])
+        return results
+
+    def stats(self):
+        sizes = [len(ids) for _, ids in self._state.lists]
+        return {
+            "kind": self.kind,
+            "embeddings": int(sum(sizes)),
+            "lists": len(sizes),
+            "n_probe": self.n_probe,
+            "largest_list": max(sizes) if sizes else 0,
+        }
+
+
+def make_index(kind="auto", size=0, ann_min_embeddings=20000, **ivf_params):
+    """
+    Create an empty index.
+    "auto" picks brute force below `ann_min_embeddings` rows and IVF above.
+    """
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"index kind must be one of {INDEX_KINDS}, got {kind!r}")
+    if kind == "auto":
+        kind = "ivf" if size >= ann_min_embeddings else "brute"
+    return IVFIndex(**ivf_params) if kind == "ivf" else BruteForceIndex()
@@ -0,0 +1,154 @@
+"""
+Temporal face tracking for classroom sessions.
+
+Students barely move between frames, so detections are associated with the
+tracks of the previous frame (IoU, then centroid distance) and a confidently
+identified track keeps its identity without re-running ArcFace. Faces are
+only embedded for new tracks, low-confidence tracks, or on periodic refresh.
+
+The tracker holds plain data only, so it can be pickled to a recognition
+worker process and back.
+"""
+
+import numpy as np
+
+
+class Track:
+    __slots__ = ("track_id", "box", "name", "confidence", "last_embedded", "misses")
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.name = None
+        self.confidence = 0.0
+        self.last_embedded = -1
+        self.misses = 0
+
+
+def iou(box_a, box_b):
+    """Intersection over union of two [x, y, w, h] boxes."""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def _centroid_distance(box_a, box_b):
+    return float(np.hypot(box_a[0] + box_a[2] / 2 - box_b[0] - box_b[2] / 2,
+                          box_a[1] + box_a[3] / 2 - box_b[1] - box_b[3] / 2))
+
+
+class FaceTracker:
+    """
+    Per-class tracker of faces across consecutive frames.
+
+    Args:
+        iou_threshold: minimum IoU to continue a track
+        refresh_interval: re-embed a confident track every N frames
+        confident_score: tracks matched at or above this score reuse their identity
+        max_misses: frames a track may go undetected before it is dropped
+    """
+
+    def __init__(self, iou_threshold=0.3, refresh_interval=10, confident_score=0.7, max_misses=3):
+        self.iou_threshold = iou_threshold
+        self.refresh_interval = refresh_interval
+        self.confident_score = confident_score
+        self.max_misses = max_misses
+        self.tracks = []
+        self.frame_index = 0
+        self.next_id = 1
+        self.embeddings_computed = 0
+        self.embeddings_reused = 0
+
+    def associate(self, boxes):
+        """
+        Match this frame's [x, y, w, h] boxes to existing tracks.
+        Returns a list with the matched Track (or None for a new face) per box.
+        """
+        assigned = [None] * len(boxes)
+        free_tracks = set(range(len(self.tracks)))
+
+        # Greedy IoU assignment, best overlaps first
+        pairs = []
+        for i, box in enumerate(boxes):
+            for j, track in enumerate(self.tracks):
+                overlap = iou(box, track.box)
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, i, j))
+        for _, i, j in sorted(pairs, reverse=True):
+            if assigned[i] is None and j in free_tracks:
+                assigned[i] = self.tracks[j]
+                free_tracks.discard(j)
+
+        # Fallback for faster motion: nearest centroid within half a face size
+        for i, box in enumerate(boxes):
+            if assigned[i] is not None:
+                continue
+            best_j, best_dist = None, 0.5 * max(box[2], box[3])
+            for j in free_tracks:
+                dist = _centroid_distance(box, self.tracks[j].box)
+                if dist <= best_dist:
+                    best_j, best_dist = j, dist
+            if best_j is not None:
+                assigned[i] = self.tracks[best_j]
+                free_tracks.discard(best_j)
+        return assigned
+
+    def needs_embedding(self, track):
+        """True if the face of `track` must be embedded in the current frame."""
+        if track is None or track.name is None or track.name == "Unknown":
+            return True
+        if track.confidence < self.confident_score:
+            return True
+        return self.frame_index - track.last_embedded >= self.refresh_interval
+
+    def update(self, boxes, assigned, matches):
+        """
+        Advance the tracker by one frame.
+
+        Args:
+            boxes: this frame's boxes
+            assigned: output of associate(boxes)
+            matches: {box index: (name, confidence)} for the faces embedded this frame
+
+        Returns:
+            list of (name, confidence) per box, reusing track identities where not embedded
+        """
+        identities = []
+        seen = set()
+        for i, box in enumerate(boxes):
+            track = assigned[i]
+            if track is None:
+                track = Track(self.next_id, box)
+                self.next_id += 1
+                self.tracks.append(track)
+            track.box = box
+            track.misses = 0
+            seen.add(track.track_id)
+
+            if i in matches:
+                track.name, track.confidence = matches[i]
+                track.last_embedded = self.frame_index
+                self.embeddings_computed += 1
+            else:
+                self.embeddings_reused += 1
+            identities.append((track.name or "Unknown", track.confidence))
+
+        for track in self.tracks:
+            if track.track_id not in seen:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        self.frame_index += 1
+        return identities
+
+    def stats(self):
+        return {
+            "frames": self.frame_index,
+            "active_tracks": len(self.tracks),
+            "embeddings_computed": self.embeddings_computed,
+            "embeddings_reused": self.embeddings_reused,
+        }
@@ -4,13 +4,24 @@ This module handles all Firebase operations including attendance records,
 session management, and student data storage.
 """
 
-import firebase_admin
-from firebase_admin import credentials, firestore
 from datetime import datetime
 import json
 import os
 from typing import Dict, List, Optional, Any
 
+# firebase_admin pulls in gRPC and the Google Cloud clients; it is imported on first connection
+firebase_admin = credentials = firestore = None
+
+
+def _import_firebase_admin():
+    """Import the Firebase Admin SDK into this module's globals (once)."""
+    global firebase_admin, credentials, firestore
+    if firebase_admin is None:
+        import firebase_admin as admin
+        from firebase_admin import credentials as admin_credentials, firestore as admin_firestore
+        firebase_admin, credentials, firestore = admin, admin_credentials, admin_firestore
+
+
 class FirebaseManager:
     def __init__(self, service_account_path: str = "serviceAccountKey.json"):
         """
@@ -25,6 +36,7 @@ class FirebaseManager:
     def initialize_firebase(self, service_account_path: str):
         """Initialize Firebase Admin SDK with service account credentials."""
         try:
+            _import_firebase_admin()
             if not firebase_admin._apps:
                 if os.path.exists(service_account_path):
                     cred = credentials.Certificate(service_account_path)
@@ -230,6 +242,36 @@ class FirebaseManager:
             print(f"❌ Error getting students: {e}")
             return []
     
+    def get_class_roster(self, class_id: str) -> Optional[List[str]]:
+        """
+        Get the IDs of the students enrolled in a class.
+        
+        Combines the class document's `studentIds` with the `students`
+        records of the class.
+        
+        Args:
+            class_id: ID of the class
+            
+        Returns:
+            List of student IDs, or None if the class is unknown or Firestore is unavailable
+        """
+        try:
+            roster = set()
+            class_doc = self.db.collection('classes').document(class_id).get()
+            if class_doc.exists:
+                roster.update((class_doc.to_dict() or {}).get('studentIds', []))
+            
+            for doc in self.db.collection('students').where('classId', '==', class_id).stream():
+                roster.add((doc.to_dict() or {}).get('studentId', doc.id))
+            
+            if not class_doc.exists and not roster:
+                return None
+            return sorted(roster)
+            
+        except Exception as e:
+            print(f"❌ Error getting class roster: {e}")
+            return None
+    
     def update_attendance_batch(self, class_id: str, attendance_records: Dict[str, Any]) -> bool:
         """
         Update attendance records in batch.
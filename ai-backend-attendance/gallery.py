@@ -0,0 +1,394 @@
+"""
+Matrix-backed face embedding gallery for the Smart Attendance System.
+
+All stored ArcFace embeddings are kept in one L2-normalized float32 matrix
+with an integer label per row, so matching a face (or every face of a frame)
+is a single matrix product followed by a per-person reduction.
+
+A gallery may also carry a nearest-neighbour index (face_index.py); matching
+then only scores the candidates the index returns.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+REDUCTIONS = ("max", "mean")
+
+
+def normalize_rows(vectors):
+    """Return float32 copy of `vectors` with every row scaled to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingGallery:
+    """
+    Immutable gallery of enrolled face embeddings.
+
+    Args:
+        matrix: (n_embeddings, dim) array, rows L2-normalized float32
+        labels: (n_embeddings,) int array indexing into `names`
+        names: list of person names
+        reduction: how per-embedding similarities are combined per person ("max" or "mean")
+        index: optional face_index index over the same rows, used by match_batch
+    """
+
+    MEAN_CANDIDATES = 5  # people re-scored exactly per query when an index is used with "mean"
+
+    def __init__(self, matrix, labels, names, reduction="max", index=None):
+        if reduction not in REDUCTIONS:
+            raise ValueError(f"reduction must be one of {REDUCTIONS}, got {reduction!r}")
+
+        labels = np.asarray(labels, dtype=np.int64)
+        # Rows must be grouped per person for the reduceat-based reduction
+        if labels.size and np.any(np.diff(labels) < 0):
+            order = np.argsort(labels, kind="stable")
+            matrix = matrix[order]
+            labels = labels[order]
+
+        # Only people with at least one embedding can ever be matched
+        present = np.unique(labels)
+        if present.size != len(names):
+            remap = np.full(len(names), -1, dtype=np.int64)
+            remap[present] = np.arange(present.size)
+            labels = remap[labels]
+            names = [names[i] for i in present]
+
+        self.matrix = matrix
+        self.labels = labels
+        self.names = list(names)
+        self.reduction = reduction
+        self.index = index
+        self.dim = int(matrix.shape[1]) if matrix.ndim == 2 else 0
+        self._label_of = {name: i for i, name in enumerate(self.names)}
+
+        counts = np.bincount(labels, minlength=len(self.names)) if labels.size else np.zeros(0, dtype=np.int64)
+        self.counts = counts
+        self.offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64) if counts.size else counts
+
+    @classmethod
+    def from_dict(cls, embeddings_db, reduction="max"):
+        """Build a gallery from the legacy {name: [embedding, ...]} mapping."""
+        names = []
+        labels = []
+        vectors = []
+        for person, person_embeddings in embeddings_db.items():
+            if len(person_embeddings) == 0:
+                continue
+            label = len(names)
+            names.append(person)
+            vectors.extend(person_embeddings)
+            labels.extend([label] * len(person_embeddings))
+
+        if not vectors:
+            return cls.empty(reduction=reduction)
+        return cls(normalize_rows(vectors), labels, names, reduction=reduction)
+
+    @classmethod
+    def from_store(cls, snapshot, reduction="max"):
+        """
+        Build a gallery on an EmbeddingStore snapshot without copying.
+        The store keeps rows normalized and grouped by person, so a memory-mapped
+        matrix is used as-is and stays shared with other processes.
+        """
+        if snapshot.vectors.shape[0] == 0:
+            return cls.empty(reduction=reduction)
+        matrix = snapshot.vectors if snapshot.meta.get("normalized") else normalize_rows(snapshot.vectors)
+        return cls(matrix, snapshot.labels, snapshot.names, reduction=reduction)
+
+    @classmethod
+    def empty(cls, dim=0, reduction="max"):
+        return cls(np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=np.int64), [], reduction=reduction)
+
+    def __len__(self):
+        return int(self.matrix.shape[0])
+
+    def _row_names(self):
+        return [self.names[label] for label in self.labels.tolist()]
+
+    def with_index(self, index):
+        """Return this gallery with `index` (a face_index index) built over its rows."""
+        index.build(self.matrix, self._row_names())
+        return EmbeddingGallery(self.matrix, self.labels, self.names, reduction=self.reduction, index=index)
+
+    def subset(self, names):
+        """Return a gallery holding only the people in `names` (names not enrolled are ignored)."""
+        labels = [self._label_of[name] for name in names if name in self._label_of]
+        keep = np.isin(self.labels, labels)
+        return EmbeddingGallery(self.matrix[keep], self.labels[keep], self.names, reduction=self.reduction)
+
+    def add_person(self, name, vectors):
+        """
+        Return a new gallery with `vectors` added for `name` (new or already enrolled).
+        The index, if any, is copied and updated incrementally; this gallery keeps its own.
+        """
+        vectors = normalize_rows(vectors)
+        label = self._label_of.get(name)
+        names = self.names if label is not None else self.names + [name]
+        if label is None:
+            label = len(self.names)
+        base = self.matrix if len(self) else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        matrix = np.concatenate([base, vectors])
+        labels = np.concatenate([self.labels, np.full(len(vectors), label, dtype=np.int64)])
+        index = None
+        if self.index is not None:
+            index = self.index.copy()
+            index.add(name, vectors)
+        return EmbeddingGallery(matrix, labels, names, reduction=self.reduction, index=index)
+
+    def remove_person(self, name):
+        """Return a new gallery without `name`; the index, if any, is copied and updated incrementally."""
+        label = self._label_of.get(name)
+        if label is None:
+            return self
+        keep = self.labels != label
+        index = None
+        if self.index is not None:
+            index = self.index.copy()
+            index.remove(name)
+        return EmbeddingGallery(self.matrix[keep], self.labels[keep], self.names,
+                                reduction=self.reduction, index=index)
+
+    @property
+    def num_people(self):
+        return len(self.names)
+
+    def person_scores(self, query_embeddings):
+        """
+        Return (n_queries, n_people) similarity scores, one matmul for all queries.
+        Each score is the cosine similarity reduced over that person's embeddings.
+        """
+        queries = normalize_rows(query_embeddings)
+        sims = queries @ self.matrix.T
+        if self.reduction == "max":
+            return np.maximum.reduceat(sims, self.offsets, axis=1)
+        return np.add.reduceat(sims, self.offsets, axis=1) / self.counts
+
+    def match_batch(self, query_embeddings, threshold):
+        """
+        Match every query embedding against the gallery.
+        Returns a list of (name, score) tuples in query order; names below
+        `threshold` are reported as "Unknown" with their best score.
+        """
+        n_queries = len(query_embeddings)
+        if n_queries == 0:
+            return []
+        if self.num_people == 0:
+            return [("Unknown", 0.0)] * n_queries
+
+        if self.index is not None:
+            return self._match_indexed(query_embeddings, threshold)
+
+        scores = self.person_scores(query_embeddings)
+        best_idx = np.argmax(scores, axis=1)
+        best_scores = np.maximum(scores[np.arange(n_queries), best_idx], 0.0)
+
+        matches = []
+        for idx, score in zip(best_idx, best_scores):
+            score = float(score)
+            matches.append((self.names[idx], score) if score >= threshold else ("Unknown", score))
+        return matches
+
+    def _match_indexed(self, query_embeddings, threshold):
+        """match_batch through the index; "mean" re-scores the index's candidates exactly."""
+        queries = normalize_rows(query_embeddings)
+        k = 1 if self.reduction == "max" else self.MEAN_CANDIDATES
+        matches = []
+        for query, candidates in zip(queries, self.index.search(queries, k)):
+            best_name, best_score = "Unknown", 0.0
+            for name, score in candidates:
+                if self.reduction == "mean":
+                    label = self._label_of.get(name)
+                    if label is None:
+                        continue
+                    start = self.offsets[label]
+                    score = float(np.mean(self.matrix[start:start + self.counts[label]] @ query))
+                if score > best_score:
+                    best_name, best_score = name, float(score)
+            matches.append((best_name, best_score) if best_score >= threshold else ("Unknown", best_score))
+        return matches
+
+    def match(self, query_embedding, threshold):
+        """Match a single embedding; returns (name, score)."""
+        return self.match_batch([query_embedding], threshold)[0]
+
+
+# ---------------------------
+# Process-level gallery cache
+# ---------------------------
+
+_CacheEntry = namedtuple("_CacheEntry", ["gallery", "signature", "digest", "loaded_at"])
+
+
+def _file_signature(path):
+    """Cheap change detector: (mtime_ns, size), or None if the file is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class GalleryCache:
+    """
+    Keeps one EmbeddingGallery resident for the whole process.
+
+    The backing file (or `watch_path`, e.g. the CURRENT pointer of an
+    embeddings store) is re-stat'ed at most every `check_interval` seconds and
+    only re-loaded when its mtime/size changed *and* its content hash differs.
+    A reload builds the new gallery completely before swapping the reference,
+    so concurrent readers always see either the old or the new gallery.
+    Readers never wait on a refresh once a first gallery is loaded.
+    While the watched file does not exist yet the cache serves an empty gallery.
+
+    Args:
+        path: file the gallery is loaded from
+        loader: callable(path) -> EmbeddingGallery
+        check_interval: minimum seconds between stat() calls
+        watch_path: file checked for changes instead of `path`
+    """
+
+    def __init__(self, path, loader, check_interval=1.0, watch_path=None):
+        self.path = path
+        self.watch_path = watch_path or path
+        self.check_interval = check_interval
+        self._loader = loader
+        self._entry = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "reloads": 0, "unchanged_content": 0, "errors": 0, "applied": 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _refresh(self, signature, force=False):
+        """Load the file if its content changed. Caller holds _reload_lock."""
+        entry = self._entry
+        if not os.path.exists(self.watch_path):
+            # Nothing written yet (fresh deploy): match nobody; the first write shows up as a change
+            self._entry = _CacheEntry(EmbeddingGallery.empty(), None, None, time.time())
+            return
+        digest = _file_digest(self.watch_path)
+        if entry is not None and not force and digest == entry.digest:
+            # Touched but identical (e.g. rewritten with the same data)
+            self._entry = entry._replace(signature=signature)
+            self._count("unchanged_content")
+            return
+        gallery = self._loader(self.path)
+        self._entry = _CacheEntry(gallery, signature, digest, time.time())
+        self._count("reloads")
+
+    def load(self):
+        """Load (or re-load) the gallery now, blocking until it is swapped in."""
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            self._refresh(_file_signature(self.watch_path), force=True)
+        return self._entry.gallery
+
+    def reload(self):
+        """Force a reload, e.g. after /update_embeddings rewrote the file."""
+        return self.load()
+
+    def digest(self):
+        """Content hash of the watched file, or None if it does not exist."""
+        return _file_digest(self.watch_path) if os.path.exists(self.watch_path) else None
+
+    def apply(self, change, previous_digest=None):
+        """
+        Swap in change(gallery) without reloading the file.
+
+        Args:
+            change: callable(EmbeddingGallery) -> EmbeddingGallery
+            previous_digest: digest() taken before the same change was written to
+                the file; the entry then tracks the new file, and nothing is done
+                if the gallery was already reloaded from it. None: the change
+                only concerns the resident gallery.
+        """
+        with self._reload_lock:
+            entry = self._entry
+            if entry is None:
+                return  # the next get() loads the file, change included
+            if previous_digest is None:
+                self._entry = entry._replace(gallery=change(entry.gallery))
+            elif entry.digest == previous_digest:
+                self._entry = _CacheEntry(change(entry.gallery), _file_signature(self.watch_path),
+                                          self.digest(), time.time())
+            else:
+                return
+            self._count("applied")
+
+    def invalidate(self):
+        """Make the next get() re-check the file regardless of check_interval."""
+        self._last_check = 0.0
+
+    def get(self):
+        """Return the current gallery, refreshing it first if the file changed."""
+        entry = self._entry
+        now = time.monotonic()
+        if entry is not None and now - self._last_check < self.check_interval:
+            self._count("hits")
+            return entry.gallery
+
+        self._last_check = now
+        signature = _file_signature(self.watch_path)
+        if entry is not None and (signature is None or signature == entry.signature):
+            self._count("hits")
+            return entry.gallery
+
+        if entry is None:
+            # Nothing to serve yet: the first caller loads, the others wait for it
+            with self._reload_lock:
+                if self._entry is None:
+                    self._refresh(signature, force=True)
+            return self._entry.gallery
+
+        # Changed on disk: a background thread refreshes, every caller keeps the old gallery meanwhile
+        if self._reload_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_and_release, args=(signature,),
+                             name="gallery-refresh", daemon=True).start()
+        self._count("hits")
+        return entry.gallery
+
+    def _refresh_and_release(self, signature):
+        try:
+            self._refresh(signature)
+        except Exception as e:
+            self._count("errors")
+            print(f"⚠️ Gallery reload failed, keeping previous gallery: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def stats(self):
+        """Counters plus a description of the resident gallery."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        entry = self._entry
+        stats.update({
+            "path": self.path,
+            "loaded": entry is not None,
+            "loaded_at": entry.loaded_at if entry else None,
+            "people": entry.gallery.num_people if entry else 0,
+            "embeddings": len(entry.gallery) if entry else 0,
+            "index": entry.gallery.index.stats() if entry and entry.gallery.index is not None else {"kind": "brute"},
+        })
+        return stats
@@ -0,0 +1,134 @@
+"""
+Background job queue for long-running work such as embeddings rebuilds.
+
+Jobs run one at a time on a single daemon thread, so two rebuilds never
+write the embeddings store concurrently and no HTTP request waits for one.
+
+Coalescing: a request identical to a job that is still queued joins that
+job instead of adding another. A job that is already running may have read
+the photo folders before the new request's change, so at most one identical
+follow-up job is queued behind it.
+"""
+
+import json
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+
+class Job:
+    """One queued, running or finished job and its progress counters."""
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.key = json.dumps([kind, params], sort_keys=True, default=str)
+        self.status = "queued"
+        self.progress = {}
+        self.requests = 1
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "progress": dict(self.progress),
+            "requests": self.requests,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Serial background job runner.
+
+    Args:
+        runners: {kind: callable(params, report)}; report(**counts) updates the job's progress
+        history: finished jobs kept for status queries
+    """
+
+    def __init__(self, runners, history=50):
+        self.runners = dict(runners)
+        self.history = history
+        self._cond = threading.Condition()
+        self._queue = []
+        self._jobs = OrderedDict()  # job id -> Job, oldest first
+        self._running = None
+        self._thread = None
+
+    def submit(self, kind, params):
+        """
+        Queue a job, or join an identical queued one.
+        Returns (job dict, coalesced).
+        """
+        if kind not in self.runners:
+            raise ValueError(f"Unknown job kind: {kind!r}")
+        job = Job(kind, params)
+        with self._cond:
+            for queued in self._queue:
+                if queued.key == job.key:
+                    queued.requests += 1
+                    return queued.to_dict(), True
+            self._queue.append(job)
+            self._jobs[job.id] = job
+            self._trim()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_loop, name="job-queue", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return job.to_dict(), False
+
+    def get(self, job_id):
+        """Job dict, or None if the id is unknown (or already dropped from the history)."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "running": self._running.id if self._running else None,
+                "queued": [job.id for job in self._queue],
+                "jobs": [job.to_dict() for job in reversed(self._jobs.values())],
+            }
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond `history`. Caller holds _cond."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _report(self, job, **counts):
+        with self._cond:
+            job.progress.update(counts)
+
+    def _run_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.pop(0)
+                job.status, job.started_at = "running", time.time()
+                self._running = job
+            try:
+                self.runners[job.kind](job.params, lambda **counts: self._report(job, **counts))
+                status, error = "done", None
+            except Exception as e:
+                print(f"❌ Job {job.id} ({job.kind}) failed: {e}")
+                print(traceback.format_exc())
+                status, error = "failed", str(e)
+            with self._cond:
+                job.status, job.error, job.finished_at = status, error, time.time()
+                self._running = None
+                self._trim()
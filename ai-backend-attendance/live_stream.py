@@ -0,0 +1,124 @@
+"""
+Live frame streaming for classroom attendance sessions.
+
+A client keeps one WebSocket open per class session and pushes JPEG frames.
+Recognition runs on a dedicated thread that always takes the newest frame:
+a frame arriving while recognition is still busy replaces the pending one,
+so a slow room drops stale frames instead of building up a backlog.
+"""
+
+import json
+import threading
+import time
+
+
+class LatestFrameSlot:
+    """Single-slot mailbox; put() replaces any frame that was not taken yet."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = (frame, time.time())
+            self.received += 1
+            self._cond.notify()
+
+    def take(self, timeout=None):
+        """Return (frame, received_at epoch seconds), or None on timeout/close."""
+        with self._cond:
+            if self._item is None and not self.closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class RecognitionStream:
+    """
+    Recognition loop for one streaming connection bound to a class session.
+
+    Args:
+        class_id: class whose active session receives the sightings
+        recognize: callable(image_bytes) -> recognition dict (main.recognize_faces)
+        record: callable(class_id, names, timestamp) -> records dict, or None if the session is inactive
+        is_active: callable() -> bool, whether the class session is still running
+        send: callable(str) pushing one JSON message to the client
+    """
+
+    def __init__(self, class_id, recognize, record, is_active, send):
+        self.class_id = class_id
+        self._recognize = recognize
+        self._record = record
+        self._is_active = is_active
+        self._send = send
+        self.slot = LatestFrameSlot()
+        self.recognized = set()
+        self.processed = 0
+        self._thread = threading.Thread(target=self._run, name=f"stream-{class_id}", daemon=True)
+
+    @property
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+
+    def push(self, frame):
+        """Queue a frame for recognition, replacing any frame still pending."""
+        self.slot.put(frame)
+
+    def stop(self):
+        self.slot.close()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def _emit(self, message):
+        self._send(json.dumps(message))
+
+    def _run(self):
+        try:
+            while not self.slot.closed:
+                item = self.slot.take(timeout=1.0)
+                if not self._is_active():
+                    self._emit({"type": "session_ended", "class_id": self.class_id,
+                                "recognized_students": sorted(self.recognized)})
+                    break
+                if item is not None:
+                    self._process(*item)
+        except Exception as e:
+            # Connection closed by the client or recognition failure: end this stream only
+            print(f"⚠️ Stream for {self.class_id} stopped: {e}")
+        finally:
+            self.slot.close()
+
+    def _process(self, frame, received_at):
+        result = self._recognize(frame)
+        names = [r["name"] for r in result.get("results", []) if "name" in r]
+        if result.get("status") == "success" and self._record(self.class_id, names, received_at) is None:
+            return  # session stopped meanwhile; the next loop iteration reports it
+
+        new_students = sorted({n for n in names if n != "Unknown"} - self.recognized)
+        self.recognized.update(new_students)
+        self.processed += 1
+        self._emit({
+            "type": "recognition",
+            "status": result.get("status"),
+            "frame": self.processed,
+            "results": result.get("results", []),
+            "new_students": new_students,
+            "recognized_students": sorted(self.recognized),
+            "frames_received": self.slot.received,
+            "frames_dropped": self.slot.dropped,
+            "latency_ms": round((time.time() - received_at) * 1000, 1),
+        })
@@ -1,25 +1,60 @@
 import cv2
-import pickle
 import numpy as np
-from deepface import DeepFace
-from sklearn.metrics.pairwise import cosine_similarity
 import os
 import csv
 from datetime import datetime
 from flask import jsonify
 from firebase_config import get_firebase_manager
+from gallery import EmbeddingGallery, GalleryCache
+from embeddings_store import EmbeddingStore, is_pickle_path, read_embeddings, watch_path
+from face_detection import DetectorPool
+from face_embedding import FaceEmbedder, crop_face
+from face_tracking import FaceTracker
+from face_index import make_index
+from class_galleries import ClassGalleryShards
+from prototypes import compact_gallery, compact_vectors
 
 
 # Configuration
-EMBEDDINGS_PATH = "embeddings.pkl"
+EMBEDDINGS_PATH = "embeddings"  # memory-mapped embeddings store directory (see embeddings_store.py)
+LEGACY_EMBEDDINGS_PATH = "embeddings.pkl"  # migrated into EMBEDDINGS_PATH on startup if the store is missing
 SIMILARITY_THRESHOLD = 0.6
+SIMILARITY_REDUCTION = "max"  # how a person's embeddings are combined: "max" or "mean"
 MODEL_NAME = "ArcFace"
+EMBEDDING_BACKEND = "deepface"  # "deepface" (TensorFlow), "onnx" (ONNX Runtime) or "opencv" (OpenCV DNN)
+ONNX_MODEL_PATH = "arcface_int8.onnx"  # exported by export_onnx.py; used by the "onnx"/"opencv" backends
+ENROLLMENT_N_AUG = 1  # augmented copies embedded per enrolled photo
+FAST_ENROLLMENT = True  # /add_student embeds the new student at once instead of waiting for a full update
+PROTOTYPE_METHOD = None  # compact each student's vectors: "mean", "kmeans", "medoids" (None keeps all)
+PROTOTYPES_PER_STUDENT = 3  # cap per student for "kmeans"/"medoids"
+MATCH_INDEX = "auto"  # "brute" (exact scan), "ivf" (approximate) or "auto" (ivf from ANN_MIN_EMBEDDINGS up)
+ANN_MIN_EMBEDDINGS = 20000  # gallery size at which "auto" switches to the IVF index
+IVF_N_PROBE = 8  # IVF clusters scored per face; higher = better recall, slower
+CLASS_GALLERIES = True  # match faces of a class only against the students enrolled in it
+CLASS_ROSTER_TTL = 300  # seconds a class roster from Firestore is cached; also how far worker processes can lag /refresh_class_gallery
+CLASS_GALLERY_FALLBACK = True  # classes without a roster use the global gallery (False: match nobody)
 ATTENDANCE_THRESHOLD = 0.25  # 25%
+PRESENCE_GAP_TOLERANCE = 10  # seconds; sightings closer than this merge into one presence interval
 MODEL_PATH_YUNET = 'face_detection_yunet_2023mar.onnx'  
+DETECTION_MAX_SIDE = None  # e.g. 640: detect on downscaled frames, boxes mapped back
+ALIGN_FACES = True  # level the eyes (YuNet landmarks) before embedding
+EMBEDDING_BATCH_SIZE = 32  # faces per ArcFace forward pass
+RECOGNITION_WORKERS = int(os.environ.get("RECOGNITION_WORKERS", "0"))  # 0 = recognize on the request thread
+RECOGNITION_TIMEOUT = 30  # seconds a request waits for a worker result
+LAZY_STARTUP = os.environ.get("LAZY_STARTUP", "1") != "0"  # serve at once, warm up in the background (0: warm up first)
+TRACKING_ENABLED = True  # reuse identities of tracked faces between frames of a session
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_REFRESH_FRAMES = 10  # re-embed a confidently tracked face every N frames
+TRACK_CONFIDENT_SCORE = 0.7  # tracks matched below this are re-embedded every frame
+TRACK_MAX_MISSES = 3  # frames a face may go undetected before its track is dropped
 
 
-# Load face detector (will be recreated per image)
-DETECTOR = cv2.FaceDetectorYN.create(MODEL_PATH_YUNET, "", (320, 320))
+# Face detectors, reused per thread and per frame size
+DETECTOR_POOL = DetectorPool(MODEL_PATH_YUNET, score_threshold=0.6, nms_threshold=0.3, top_k=5000)
+
+# Batched face embedding model (loaded on first use)
+EMBEDDER = FaceEmbedder(MODEL_NAME, batch_size=EMBEDDING_BATCH_SIZE, backend=EMBEDDING_BACKEND,
+                        model_path=ONNX_MODEL_PATH if EMBEDDING_BACKEND != "deepface" else None)
 
 
 # ---------------------------
@@ -27,25 +62,90 @@ DETECTOR = cv2.FaceDetectorYN.create(MODEL_PATH_YUNET, "", (320, 320))
 # ---------------------------
 
 
-def load_embeddings():
-    """Load stored face embeddings from file."""
-    with open(EMBEDDINGS_PATH, "rb") as f:
-        return pickle.load(f)
+def load_embeddings(path=EMBEDDINGS_PATH):
+    """Load stored face embeddings as {name: [embedding, ...]}."""
+    return read_embeddings(path)
+
+
+def _with_match_index(gallery):
+    """Attach the configured ANN index; brute force is the gallery's own matrix scan."""
+    index = make_index(MATCH_INDEX, size=len(gallery), ann_min_embeddings=ANN_MIN_EMBEDDINGS, n_probe=IVF_N_PROBE)
+    return gallery.with_index(index) if index.kind != "brute" else gallery
+
+
+def _build_gallery(path):
+    if is_pickle_path(path):
+        gallery = EmbeddingGallery.from_dict(load_embeddings(path), reduction=SIMILARITY_REDUCTION)
+    else:
+        store = EmbeddingStore(path)
+        if not store.exists():
+            # Nothing enrolled yet: match nobody instead of failing every recognition
+            return EmbeddingGallery.empty(reduction=SIMILARITY_REDUCTION)
+        # Memory-mapped read-only: worker processes share the same pages
+        gallery = EmbeddingGallery.from_store(store.load(), reduction=SIMILARITY_REDUCTION)
+    if PROTOTYPE_METHOD:
+        gallery = compact_gallery(gallery, PROTOTYPE_METHOD, PROTOTYPES_PER_STUDENT)
+    return _with_match_index(gallery)
+
+
+# Resident gallery, reloaded only when the store's CURRENT pointer changes
+GALLERY_CACHE = GalleryCache(EMBEDDINGS_PATH, _build_gallery, watch_path=watch_path(EMBEDDINGS_PATH))
+
+
+def add_to_gallery(name, vectors, previous_digest=None):
+    """
+    Put a just-enrolled student's vectors into the resident gallery without
+    reloading it (`previous_digest`: GALLERY_CACHE.digest() before the store write).
+    """
+    if len(vectors) == 0:
+        return remove_from_gallery(name, previous_digest)
+    if PROTOTYPE_METHOD:
+        vectors = compact_vectors(vectors, PROTOTYPE_METHOD, PROTOTYPES_PER_STUDENT)
+    GALLERY_CACHE.apply(lambda gallery: gallery.remove_person(name).add_person(name, vectors), previous_digest)
+
+
+def remove_from_gallery(name, previous_digest=None):
+    """Stop matching `name` at once, without reloading the gallery."""
+    GALLERY_CACHE.apply(lambda gallery: gallery.remove_person(name), previous_digest)
+
+
+def load_class_roster(class_id):
+    """Gallery names of the students enrolled in `class_id` (Firestore), or None if unknown."""
+    roster = get_firebase_manager().get_class_roster(class_id)
+    if roster is None:
+        return None
+    return [str(student).strip().replace(" ", "_") for student in roster]
+
+
+# Per-class views of the resident gallery, re-cut when a roster or the gallery changes
+CLASS_SHARDS = ClassGalleryShards(GALLERY_CACHE, load_class_roster, ttl=CLASS_ROSTER_TTL,
+                                  fallback_to_global=CLASS_GALLERY_FALLBACK)
+
+
+def load_gallery(class_id=None):
+    """
+    Return the resident EmbeddingGallery (loaded once, refreshed on change),
+    or the shard of `class_id` holding only its enrolled students.
+    """
+    if CLASS_GALLERIES and class_id and class_id != "default":
+        return CLASS_SHARDS.get(class_id)
+    return GALLERY_CACHE.get()
+
+
+def _as_gallery(embeddings_db):
+    if isinstance(embeddings_db, EmbeddingGallery):
+        return embeddings_db
+    return EmbeddingGallery.from_dict(embeddings_db, reduction=SIMILARITY_REDUCTION)
 
 
 def find_match(face_embedding, embeddings_db):
     """Find the best match for a given face embedding."""
-    best_match = "Unknown"
-    best_score = 0
-    
-    for person, person_embeddings in embeddings_db.items():
-        for stored_embedding in person_embeddings:
-            similarity = cosine_similarity([face_embedding], [stored_embedding])[0][0]
-            if similarity > best_score:
-                best_score = similarity
-                best_match = person
-    
-    return (best_match, best_score) if best_score >= SIMILARITY_THRESHOLD else ("Unknown", best_score)
+    return _as_gallery(embeddings_db).match(face_embedding, SIMILARITY_THRESHOLD)
+
+
+def find_matches(face_embeddings, embeddings_db):
+    """Find the best match for every embedding of a frame with one batched matmul."""
+    return _as_gallery(embeddings_db).match_batch(face_embeddings, SIMILARITY_THRESHOLD)
 
 
 def save_attendance(attendance, session_name, session_start, session_end, session_length, class_id="default"):
@@ -105,33 +205,50 @@ def save_attendance(attendance, session_name, session_start, session_end, sessio
 # ---------------------------
 
 
+def decode_image(data):
+    """Decode encoded image bytes (bytes, bytearray or memoryview) to a BGR frame, or None."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return None
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
 def recognize_faces_from_image(image_path):
     """
-    Detect and recognize faces from an uploaded image.
+    Detect and recognize faces from an image file on disk.
     Returns JSON with recognized faces and confidence scores.
     """
-    global DETECTOR  # Important: allows modifying the global detector
-    embeddings_db = load_embeddings()
+    result = recognize_faces(cv2.imread(image_path))
+    if result["status"] == "error":
+        return jsonify(result), 400
+    return jsonify(result)
+
+
+def recognize_faces(image, tracker=None, class_id=None):
+    """
+    In-memory recognition entry point.
+
+    Args:
+        image: encoded image bytes / memoryview, or an already decoded BGR frame
+        tracker: optional FaceTracker of the class session; faces continuing a
+            confidently identified track reuse its identity instead of being embedded
+        class_id: optional class; faces are then only matched against its enrolled students
+
+    Returns:
+        dict with recognized faces and confidence scores (serialized by the caller)
+    """
+    gallery = load_gallery(class_id)
     
-    frame = cv2.imread(image_path)
+    frame = image if isinstance(image, np.ndarray) and image.ndim >= 2 else None
+    if frame is None and image is not None:
+        frame = decode_image(image)
     if frame is None:
-        return jsonify({"status": "error", "message": "Invalid image file"}), 400
+        return {"status": "error", "message": "Invalid image file"}
 
-    h, w = frame.shape[:2]
-    
-    # Recreate detector with actual image dimensions
-    DETECTOR = cv2.FaceDetectorYN.create(
-        MODEL_PATH_YUNET,
-        "",
-        (w, h),  # Use actual image size
-        score_threshold=0.6,
-        nms_threshold=0.3,
-        top_k=5000
-    )
-    
-    _, faces = DETECTOR.detect(frame)
+    faces = DETECTOR_POOL.detect(frame, max_side=DETECTION_MAX_SIDE)
 
-    results = []
+    boxes = []
+    detections = []
     
     if faces is not None:
         for face in faces:
@@ -143,36 +260,59 @@ def recognize_faces_from_image(image_path):
             w = min(w, frame.shape[1] - x)
             h = min(h, frame.shape[0] - y)
             
-            face_img = frame[y:y+h, x:x+w]
-            
-            if face_img.size == 0:  # Skip empty crops
+            if w <= 0 or h <= 0:  # Skip empty crops
                 continue
 
-            try:
-                embedding = DeepFace.represent(
-                    face_img, 
-                    model_name=MODEL_NAME, 
-                    enforce_detection=False
-                )[0]["embedding"]
-                
-                name, confidence = find_match(embedding, embeddings_db)
-                
+            boxes.append([x, y, w, h])
+            detections.append(face)
+
+    # Only faces without a confident track identity go through ArcFace
+    assigned = tracker.associate(boxes) if tracker is not None else [None] * len(boxes)
+    to_embed = []
+    crops = []
+    for i, face in enumerate(detections):
+        if tracker is None or tracker.needs_embedding(assigned[i]):
+            face_img = crop_face(frame, face, align=ALIGN_FACES)
+            if face_img is not None:
+                to_embed.append(i)
+                crops.append(face_img)
+
+    results = []
+    if boxes:
+        try:
+            # One forward pass and one gallery matmul for every embedded face of the frame
+            matches = {}
+            if crops:
+                embeddings = EMBEDDER.embed(crops)
+                matches = dict(zip(to_embed, find_matches(embeddings, gallery)))
+            if tracker is not None:
+                identities = tracker.update(boxes, assigned, matches)
+            else:
+                identities = [matches.get(i, ("Unknown", 0.0)) for i in range(len(boxes))]
+            for box, (name, confidence) in zip(boxes, identities):
                 results.append({
                     "name": name,
                     "confidence": round(float(confidence), 3),
-                    "bounding_box": [x, y, w, h]
-                })
-            except Exception as e:
-                results.append({
-                    "error": str(e),
-                    "bounding_box": [x, y, w, h]
+                    "bounding_box": box
                 })
+        except Exception as e:
+            results = [{"error": str(e), "bounding_box": box} for box in boxes]
 
-    return jsonify({
+    return {
         "status": "success",
         "faces_detected": len(results),
         "results": results
-    })
+    }
+
+
+def new_tracker():
+    """Create a FaceTracker with the configured thresholds for a new session."""
+    return FaceTracker(
+        iou_threshold=TRACK_IOU_THRESHOLD,
+        refresh_interval=TRACK_REFRESH_FRAMES,
+        confident_score=TRACK_CONFIDENT_SCORE,
+        max_misses=TRACK_MAX_MISSES
+    )
 
 
 def mark_attendance(session_name, attendance_data, session_duration, class_id="default"):
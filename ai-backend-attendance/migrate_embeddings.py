@@ -0,0 +1,41 @@
+"""
+Convert a legacy embeddings.pkl into the memory-mapped embeddings store.
+
+Usage:
+    python migrate_embeddings.py [--src embeddings.pkl] [--dst embeddings] [--model ArcFace]
+
+The pickle is left in place. If an enrollment manifest exists next to it,
+the photo each vector came from is recorded in the store's label table.
+"""
+
+import argparse
+import os
+
+from embeddings_store import EmbeddingStore, read_embeddings
+from enrollment import load_manifest, manifest_path_for, row_images
+
+
+def migrate_pickle(src, dst, model_name="ArcFace"):
+    """Write the embeddings of pickle `src` as a new version of store `dst`; returns the version."""
+    if not os.path.exists(src):
+        raise FileNotFoundError(f"Embeddings file not found: {src}")
+    embeddings = read_embeddings(src)
+    manifest = load_manifest(manifest_path_for(src))
+    version = EmbeddingStore(dst).write(embeddings, model_name, images=row_images(manifest, embeddings))
+
+    total_embeddings = sum(len(v) for v in embeddings.values())
+    print(f"✅ Migrated {src} -> {dst}/{version}: {len(embeddings)} people, {total_embeddings} embeddings.")
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--src", default="embeddings.pkl", help="legacy embeddings pickle")
+    parser.add_argument("--dst", default="embeddings", help="embeddings store directory")
+    parser.add_argument("--model", default="ArcFace", help="model that produced the embeddings")
+    args = parser.parse_args()
+    migrate_pickle(args.src, args.dst, args.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Prototype compaction of enrolled face embeddings.
+
+Enrollment stores photos x (1 + N_AUG) vectors per student, so the gallery
+and the per-face matching cost grow with every extra photo. Compaction
+replaces each student's vectors with at most `max_per_person` prototypes:
+- "mean":    one L2-normalized mean vector
+- "kmeans":  spherical k-means centroids
+- "medoids": k-medoids, i.e. the stored vectors closest to each cluster centre
+
+The stored embeddings are not changed; compaction is applied when the
+resident gallery is built (see main.PROTOTYPE_METHOD).
+"""
+
+import numpy as np
+
+from gallery import EmbeddingGallery, normalize_rows
+
+
+PROTOTYPE_METHODS = ("mean", "kmeans", "medoids")
+
+
+def _farthest_point_init(vectors, k):
+    """Deterministic seeds: the row closest to the mean, then repeatedly the least similar row."""
+    chosen = [int(np.argmax(vectors @ normalize_rows(vectors.mean(axis=0))[0]))]
+    closest = vectors @ vectors[chosen[0]]
+    for _ in range(1, k):
+        chosen.append(int(np.argmin(closest)))
+        closest = np.maximum(closest, vectors @ vectors[chosen[-1]])
+    return chosen
+
+
+def _kmeans(vectors, k, iterations=20):
+    centroids = vectors[_farthest_point_init(vectors, k)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        updated = centroids.copy()
+        for c in range(k):
+            members = vectors[assign == c]
+            if len(members):
+                updated[c] = normalize_rows(members.sum(axis=0))[0]
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    return centroids
+
+
+def _kmedoids(vectors, k, iterations=20):
+    sims = vectors @ vectors.T
+    medoids = _farthest_point_init(vectors, k)
+    for _ in range(iterations):
+        assign = np.argmax(sims[:, medoids], axis=1)
+        updated = list(medoids)
+        for c in range(k):
+            members = np.flatnonzero(assign == c)
+            if len(members):
+                # The member most similar to the rest of its cluster
+                updated[c] = int(members[np.argmax(sims[np.ix_(members, members)].sum(axis=1))])
+        if updated == medoids:
+            break
+        medoids = updated
+    return vectors[sorted(set(medoids))]
+
+
+def compact_vectors(vectors, method="kmeans", max_per_person=3):
+    """
+    Reduce one student's vectors to at most `max_per_person` unit-length prototypes.
+    Students that already have few enough vectors keep them ("mean" always gives one).
+    """
+    if method not in PROTOTYPE_METHODS:
+        raise ValueError(f"method must be one of {PROTOTYPE_METHODS}, got {method!r}")
+    vectors = normalize_rows(vectors)
+    if method == "mean":
+        return normalize_rows(vectors.mean(axis=0))
+    k = max(1, int(max_per_person))
+    if len(vectors) <= k:
+        return vectors
+    return _kmeans(vectors, k) if method == "kmeans" else _kmedoids(vectors, k)
+
+
+def compact_gallery(gallery, method="kmeans", max_per_person=3):
+    """Return a new EmbeddingGallery with every student's vectors compacted."""
+    if len(gallery) == 0:
+        return gallery
+    rows, labels = [], []
+    for label in range(gallery.num_people):
+        start = gallery.offsets[label]
+        prototypes = compact_vectors(gallery.matrix[start:start + gallery.counts[label]], method, max_per_person)
+        rows.append(prototypes)
+        labels.append(np.full(len(prototypes), label, dtype=np.int64))
+    return EmbeddingGallery(np.concatenate(rows), np.concatenate(labels), gallery.names, reduction=gallery.reduction)
+
+
+# ---------------------------
+# Evaluation
+# ---------------------------
+
+
+def evaluate_margin(gallery, query_embeddings, true_names):
+    """
+    Score held-out embeddings of known students against `gallery`.
+
+    The margin of a query is its similarity to the true student minus the best
+    similarity to anyone else; a positive margin means a correct top-1 match.
+
+    Returns:
+        dict with accuracy, mean_margin and p10_margin (10th percentile)
+    """
+    scores = gallery.person_scores(query_embeddings)
+    label_of = {name: i for i, name in enumerate(gallery.names)}
+    margins = []
+    for row, name in zip(scores, true_names):
+        label = label_of.get(name)
+        if label is None:
+            continue
+        others = np.delete(row, label)
+        margins.append(float(row[label] - (others.max() if others.size else 0.0)))
+    margins = np.asarray(margins)
+    if margins.size == 0:
+        return {"queries": 0, "accuracy": 0.0, "mean_margin": 0.0, "p10_margin": 0.0}
+    return {
+        "queries": int(margins.size),
+        "accuracy": float(np.mean(margins > 0)),
+        "mean_margin": float(margins.mean()),
+        "p10_margin": float(np.percentile(margins, 10)),
+    }
@@ -0,0 +1,215 @@
+"""
+Multi-classroom recognition scheduler for the Smart Attendance System.
+
+Frames are recognized in a pool of worker processes, each holding its own
+YuNet detector, ArcFace model and resident gallery (see main.py), so
+TensorFlow calls from different classrooms no longer contend in one process.
+
+Fairness rules:
+- at most one pending frame per class; a newer frame replaces the older one
+- at most one frame per class in flight, so one busy room cannot occupy
+  every worker
+- classes are served round-robin in the order their pending frame arrived
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+DROPPED_RESULT = {"status": "dropped", "message": "Superseded by a newer frame from the same class"}
+
+
+class QueueFullError(RuntimeError):
+    """Raised when too many classes already have a frame waiting."""
+
+
+# ---------------------------
+# Worker process side
+# ---------------------------
+
+
+def _init_worker():
+    """Load the detector, model and gallery once per worker process."""
+    import main
+    try:
+        main.EMBEDDER.warm_up()
+        main.GALLERY_CACHE.get()
+    except Exception as e:
+        print(f"⚠️ Recognition worker warm-up failed (will retry per frame): {e}")
+
+
+def _worker_pid():
+    return os.getpid()
+
+
+def _recognize_in_worker(image_bytes, tracker, class_id):
+    import main
+    result = main.recognize_faces(image_bytes, tracker=tracker, class_id=class_id)
+    return result, tracker
+
+
+# ---------------------------
+# Scheduler
+# ---------------------------
+
+
+class _Job:
+    __slots__ = ("class_id", "image", "tracker", "future", "submitted_at")
+
+    def __init__(self, class_id, image, tracker):
+        self.class_id = class_id
+        self.image = image
+        self.tracker = tracker
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+
+
+class RecognitionScheduler:
+    """
+    Bounded, per-class fair queue in front of a recognition process pool.
+
+    Args:
+        workers: number of worker processes
+        max_pending: maximum number of classes with a frame waiting
+    """
+
+    def __init__(self, workers=2, max_pending=64):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._executor = self._new_executor()
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # class_id -> _Job
+        self._in_flight = set()
+        self._closed = False
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "dropped": 0, "rejected": 0}
+        self._latency = {}  # class_id -> {"frames", "last_ms", "avg_ms", "max_ms"}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="recognition-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    def _replace_broken_executor(self, broken):
+        """A worker died (e.g. OOM): start a fresh pool once, for every job that saw it."""
+        with self._cond:
+            if self._executor is not broken or self._closed:
+                return
+            self._executor = self._new_executor()
+        print("⚠️ Recognition worker pool was broken and has been restarted")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self, timeout=None):
+        """Spawn every worker process now (each loads its model and gallery); returns their pids."""
+        executor = self._executor
+        futures = [executor.submit(_worker_pid) for _ in range(self.workers)]
+        return sorted({f.result(timeout=timeout) for f in futures})
+
+    def submit(self, class_id, image_bytes, tracker=None):
+        """
+        Queue one encoded frame for `class_id`, optionally with its session tracker.
+        Returns a Future resolving to (main.recognize_faces result dict, tracker);
+        the tracker comes back updated from the worker process. A frame replaced
+        by a newer one of the same class resolves to (DROPPED_RESULT, tracker).
+        """
+        job = _Job(class_id, bytes(image_bytes), tracker)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Recognition scheduler is shut down")
+            previous = self._pending.get(class_id)
+            if previous is None and len(self._pending) >= self.max_pending:
+                self._counters["rejected"] += 1
+                raise QueueFullError("Recognition queue is full")
+            if previous is not None:
+                # Keep the class's place in the round-robin order, swap the frame
+                self._counters["dropped"] += 1
+                previous.future.set_result((dict(DROPPED_RESULT), previous.tracker))
+            self._pending[class_id] = job
+            self._counters["submitted"] += 1
+            self._cond.notify()
+        return job.future
+
+    def _next_job(self):
+        """Pop the oldest pending job whose class has nothing in flight. Caller holds _cond."""
+        for class_id in self._pending:
+            if class_id not in self._in_flight:
+                self._in_flight.add(class_id)
+                return self._pending.pop(class_id)
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._closed:
+                    if len(self._in_flight) < self.workers:
+                        job = self._next_job()
+                        if job is not None:
+                            break
+                    self._cond.wait()
+                if job is None:
+                    return
+            executor = self._executor
+            try:
+                worker_future = executor.submit(_recognize_in_worker, job.image, job.tracker, job.class_id)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_broken_executor(executor)
+                self._finish(job, error=e)
+                continue
+            worker_future.add_done_callback(lambda f, job=job, executor=executor: self._on_done(job, f, executor))
+
+    def _on_done(self, job, worker_future, executor):
+        try:
+            self._finish(job, result=worker_future.result())
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._replace_broken_executor(executor)
+            self._finish(job, error=e)
+
+    def _finish(self, job, result=None, error=None):
+        elapsed_ms = (time.monotonic() - job.submitted_at) * 1000
+        with self._cond:
+            self._in_flight.discard(job.class_id)
+            if error is None:
+                self._counters["completed"] += 1
+                stats = self._latency.setdefault(job.class_id, {"frames": 0, "last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0})
+                stats["frames"] += 1
+                stats["last_ms"] = round(elapsed_ms, 1)
+                stats["avg_ms"] = round(elapsed_ms if stats["frames"] == 1 else 0.8 * stats["avg_ms"] + 0.2 * elapsed_ms, 1)
+                stats["max_ms"] = round(max(stats["max_ms"], elapsed_ms), 1)
+            else:
+                self._counters["failed"] += 1
+            self._cond.notify()
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    def stats(self):
+        """Queue depth, in-flight classes, counters and per-class latency."""
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "queue_depth": len(self._pending),
+                "in_flight": len(self._in_flight),
+                **self._counters,
+                "per_class_latency": {k: dict(v) for k, v in self._latency.items()},
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            for job in self._pending.values():
+                job.future.set_result((dict(DROPPED_RESULT), job.tracker))
+            self._pending.clear()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
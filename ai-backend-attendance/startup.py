@@ -0,0 +1,78 @@
+"""
+Background warm-up and readiness of the attendance API.
+
+With main.LAZY_STARTUP the Flask app answers health checks as soon as it is
+imported; the slow parts of startup (Firebase connection, gallery load,
+ArcFace model load and its first forward pass, recognition worker spawn)
+run as named steps on a background thread. /ready reports 503 until every
+required step has finished. A request arriving earlier is not refused: it
+waits for the shared, load-once model or gallery it needs.
+"""
+
+import threading
+import time
+
+
+class Warmup:
+    """
+    Runs startup steps once, in order, and records their state and duration.
+
+    Args:
+        steps: list of (name, callable); a callable may return a short note
+        required: names of the steps that must succeed before the service is ready
+            (the others, e.g. Firebase with its CSV fallback, are best effort)
+    """
+
+    def __init__(self, steps, required=()):
+        self.steps = list(steps)
+        self.required = set(required)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._created_at = time.monotonic()
+        self._finished_at = None
+        self._status = {name: {"state": "pending"} for name, _ in self.steps}
+
+    def start(self, background=True):
+        """Run the steps on a daemon thread, or on this thread (eager startup)."""
+        if background:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+        else:
+            self.run()
+        return self
+
+    def run(self):
+        for name, step in self.steps:
+            self._set(name, state="running")
+            start = time.monotonic()
+            try:
+                note = step()
+                seconds = round(time.monotonic() - start, 2)
+                self._set(name, state="done", seconds=seconds, note=note)
+                print(f"✅ Warm-up step '{name}' done in {seconds}s" + (f" ({note})" if note else ""))
+            except Exception as e:
+                self._set(name, state="failed", seconds=round(time.monotonic() - start, 2), error=str(e))
+                print(f"⚠️ Warm-up step '{name}' failed: {e}")
+        self._finished_at = time.monotonic()
+        ready = "ready" if self.ready() else "NOT ready"
+        print(f"✅ Warm-up finished in {self._finished_at - self._created_at:.1f}s ({ready})")
+
+    def _set(self, name, **status):
+        status = {k: v for k, v in status.items() if v is not None}
+        with self._lock:
+            self._status[name] = status
+
+    def ready(self):
+        with self._lock:
+            return all(self._status[name]["state"] == "done" for name in self.required if name in self._status)
+
+    def stats(self):
+        with self._lock:
+            steps = {name: dict(status) for name, status in self._status.items()}
+        finished = self._finished_at
+        return {
+            "ready": self.ready(),
+            "finished": finished is not None,
+            "seconds": round((finished or time.monotonic()) - self._created_at, 2),
+            "steps": steps,
+        }
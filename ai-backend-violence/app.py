@@ -1,12 +1,14 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import torch
-import numpy as np
-import cv2
 import os
+import struct
+import tempfile
 
 # Import your model utils
-from model_utils import load_model, ViolencePredictor, val_test_transform, DEVICE, SEQUENCE_LENGTH
+from model_utils import load_model, ViolencePredictor, MotionGate, DEVICE, SEQUENCE_LENGTH
+from streams import StreamRegistry, StreamLimitError
+from batching import BatchScheduler
+from video import analyze_video
 
 # =========================================================
 # -------------------- APP SETUP ---------------------------
@@ -14,11 +16,116 @@ from model_utils import load_model, ViolencePredictor, val_test_transform, DEVIC
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Load model once
+# Load model once; every stream gets its own predictor (frame window) over it
 model = load_model()
-predictor = ViolencePredictor(model, DEVICE, threshold=0.5)
 print("[INFO] Violence detection model loaded successfully.")
 
+STREAM_IDLE_TIMEOUT = 120  # seconds without frames before a stream's window is dropped
+MAX_STREAMS = 32           # concurrent cameras; new ones get 429 beyond this
+DEFAULT_STREAM_ID = "default"  # clients that send no stream/class id share this stream
+MOTION_GATING = False      # skip the model on still frames (thresholds in model_utils.MOTION_*)
+
+STREAMS = StreamRegistry(
+    lambda: ViolencePredictor(model, DEVICE, threshold=0.5, gate=MotionGate() if MOTION_GATING else None),
+    idle_timeout=STREAM_IDLE_TIMEOUT,
+    max_streams=MAX_STREAMS,
+)
+
+# Micro-batching: frames of all streams share one CNN batch (and one LSTM-head batch)
+BATCHED_INFERENCE = True  # False: each request runs the model on its own frames
+BATCH_MAX_SIZE = 16       # frames per CNN batch
+BATCH_MAX_WAIT_MS = 10    # how long a frame may wait for others to join its batch
+
+SCHEDULER = BatchScheduler(model, DEVICE, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS) if BATCHED_INFERENCE else None
+
+# /predict_video/: overlapping 16-frame windows over the whole clip
+VIDEO_SAMPLE_FPS = 4.0      # frames per second fed to the model (query ?fps= overrides)
+VIDEO_WINDOW_STRIDE = 4     # sampled frames between window starts (query ?stride= overrides)
+VIDEO_WINDOW_BATCH = 8      # windows per BiLSTM batch
+VIDEO_READER_THREAD = True  # decode on a separate thread while the model runs
+
+# Several frames in one body: each frame is a 4-byte big-endian length + image bytes
+FRAME_STREAM_MIMETYPE = "application/x-frame-stream"
+
+
+def split_frame_stream(body):
+    """Split an application/x-frame-stream body into per-frame memoryviews."""
+    view = memoryview(body)
+    frames = []
+    offset = 0
+    while offset < len(view):
+        if offset + 4 > len(view):
+            raise ValueError("Truncated frame length prefix")
+        (length,) = struct.unpack_from(">I", view, offset)
+        offset += 4
+        if offset + length > len(view):
+            raise ValueError("Truncated frame body")
+        frames.append(view[offset:offset + length])
+        offset += length
+    return frames
+
+
+def request_frames():
+    """
+    Return the encoded frames of a /detect_frame request: a base64 string from
+    JSON {"image": ...}, a raw image/* body, or every frame of a frame stream.
+    """
+    if request.is_json:
+        data = request.get_json()
+        if not data or "image" not in data:
+            return []
+        return [data["image"]]
+    if request.mimetype.startswith("image/"):
+        body = request.get_data()
+        return [body] if body else []
+    if request.mimetype == FRAME_STREAM_MIMETYPE:
+        return split_frame_stream(request.get_data())
+    return []
+
+
+def request_stream_id():
+    """
+    Stream id of a request: "streamId" or "classId" from a JSON body, the
+    ?streamId= / ?classId= query parameter, or the X-Stream-Id / X-Class-Id header.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    if isinstance(data, dict):
+        stream_id = data.get("streamId") or data.get("classId")
+        if stream_id:
+            return str(stream_id)
+    return (
+        request.args.get("streamId")
+        or request.args.get("classId")
+        or request.headers.get("X-Stream-Id")
+        or request.headers.get("X-Class-Id")
+        or DEFAULT_STREAM_ID
+    )
+
+
+def score_frames(stream, frames):
+    """Add frames to a stream's window and score it. Caller holds stream.lock."""
+    predictor = stream.predictor
+    tensors = [predictor.prepare_frame(frame) for frame in frames]  # None: skipped by the motion gate
+    if SCHEDULER is not None and any(tensor is not None for tensor in tensors):
+        prob = SCHEDULER.submit(predictor, tensors)
+        result = predictor.result(prob) if prob is not None else None
+    else:
+        predictor.add_tensors(tensors)
+        result = predictor.predict() if predictor.is_ready() else None
+    stream.frames += len(frames)
+
+    if result is None:
+        buffer_size = len(predictor.buffer)
+        return {
+            "status": "waiting",
+            "message": f"Collecting frames... ({buffer_size}/{SEQUENCE_LENGTH})",
+            "buffer_size": buffer_size,
+            "stream_id": stream.id,
+        }
+    result["stream_id"] = stream.id
+    stream.last_prediction = result
+    return result
+
 
 # =========================================================
 # -------------------- API ENDPOINTS -----------------------
@@ -32,31 +139,33 @@ def root():
 @app.route("/detect_frame", methods=["POST"])
 def detect_frame():
     """
-    Accepts a base64 encoded frame and performs violence detection incrementally.
+    Accepts a base64 encoded frame (JSON), a raw image/jpeg body, or a
+    length-prefixed application/x-frame-stream of several frames, and performs
+    violence detection incrementally.
     Requires 16 frames before making a prediction.
+    Each stream/class id (see request_stream_id) has its own 16-frame window.
     """
     try:
-        data = request.get_json()
-        if not data or "image" not in data:
+        try:
+            frames = request_frames()
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        if not frames:
             return jsonify({"status": "error", "message": "No image provided"}), 400
 
-        base64_image = data["image"]
-        
-        # Add frame to predictor buffer
-        buffer_size = predictor.add_frame(base64_image)
-        
-        # Check if we have enough frames
-        if not predictor.is_ready():
-            return jsonify({
-                "status": "waiting",
-                "message": f"Collecting frames... ({buffer_size}/{SEQUENCE_LENGTH})",
-                "buffer_size": buffer_size
-            })
-        
-        # Make prediction
-        result = predictor.predict()
-        return jsonify(result)
-        
+        try:
+            stream = STREAMS.get(request_stream_id())
+        except StreamLimitError as e:
+            return jsonify({"status": "error", "message": str(e)}), 429
+
+        # Add frame(s) to the stream's buffer; only the window after the last one is scored
+        try:
+            with stream.lock:
+                return jsonify(score_frames(stream, frames))
+        except ValueError as e:
+            # Undecodable image data
+            return jsonify({"status": "error", "message": str(e)}), 400
+
     except Exception as e:
         print(f"[ERROR] Detection error: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -65,81 +174,120 @@ def detect_frame():
 @app.route("/reset_buffer", methods=["POST"])
 def reset_buffer():
     """
-    Reset the frame buffer to start a new detection session.
+    Reset one stream's frame buffer to start a new detection session.
     """
     try:
-        predictor.buffer.clear()
+        stream_id = request_stream_id()
+        STREAMS.reset(stream_id)
         return jsonify({
             "status": "success",
-            "message": "Buffer reset successfully"
+            "message": "Buffer reset successfully",
+            "stream_id": stream_id
         })
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/streams", methods=["GET"])
+def streams():
+    """Active streams with their buffer size, last prediction and idle time."""
+    return jsonify(STREAMS.stats())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Batching throughput and queueing delay, stream count and motion-gate skip ratio."""
+    streams = STREAMS.stats()
+    gates = [stream["motion_gate"] for stream in streams["streams"] if stream["motion_gate"]]
+    frames = sum(gate["frames"] for gate in gates)
+    skipped = sum(gate["skipped"] for gate in gates)
+    return jsonify({
+        "batching": SCHEDULER.stats() if SCHEDULER is not None else None,
+        "active_streams": streams["active"],
+        "motion_gate": {
+            "enabled": MOTION_GATING,
+            "frames": frames,
+            "skipped": skipped,
+            "skip_ratio": round(skipped / frames, 3) if frames else 0.0,
+        },
+    })
+
+
 @app.route("/predict_video/", methods=["POST"])
 def predict_video():
     """
-    Accepts a video file and returns a violence prediction.
+    Accepts a video file and scores overlapping 16-frame windows over the whole clip.
+    Returns the peak probability (probability/violence, as before), the peak window
+    and a per-window timeline.
     """
     if "file" not in request.files:
         return jsonify({"status": "error", "message": "No file provided"}), 400
 
-    file = request.files["file"]
-    temp_path = f"temp_{file.filename}"
-    file.save(temp_path)
+    try:
+        sample_fps = float(request.args.get("fps", VIDEO_SAMPLE_FPS))
+        stride = int(request.args.get("stride", VIDEO_WINDOW_STRIDE))
+    except ValueError:
+        return jsonify({"status": "error", "message": "fps and stride must be numbers"}), 400
+    if sample_fps <= 0 or stride < 1:
+        return jsonify({"status": "error", "message": "fps must be > 0 and stride >= 1"}), 400
 
-    cap = cv2.VideoCapture(temp_path)
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    indices = np.linspace(0, frame_count - 1, SEQUENCE_LENGTH, dtype=int)
+    file = request.files["file"]
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        file.save(tmp)
+    try:
+        analysis = analyze_video(
+            tmp.name, model, DEVICE,
+            sample_fps=sample_fps,
+            stride=stride,
+            window_batch=VIDEO_WINDOW_BATCH,
+            threshold=0.5,
+            reader_thread=VIDEO_READER_THREAD,
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] Video analysis error: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        os.remove(tmp.name)
 
-    frames = []
-    for i in indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, int(i))
-        ret, frame = cap.read()
-        if not ret:
-            continue
-        frame = predictor.preprocess_frame(frame)
-        frames.append(frame)
-    cap.release()
-    os.remove(temp_path)
-
-    if len(frames) < SEQUENCE_LENGTH:
+    if not analysis["windows"]:
         return jsonify({"status": "error", "message": "Not enough frames in video"}), 400
 
-    frames = torch.stack(frames).unsqueeze(0).to(DEVICE)
-    with torch.no_grad():
-        prob = model(frames).item()
-        pred = 1 if prob > predictor.threshold else 0
-
     return jsonify({
         "status": "success",
-        "probability": round(float(prob), 4),
-        "violence": bool(pred)
+        "probability": analysis["peak"]["probability"],
+        **analysis,
     })
 
 
 @app.route("/predict_frame/", methods=["POST"])
 def predict_frame():
     """
-    Accepts a single frame and performs prediction incrementally.
+    Accepts a single frame and performs prediction incrementally (per stream, as /detect_frame).
     """
     if "file" not in request.files:
         return jsonify({"status": "error", "message": "No file provided"}), 400
 
-    file = request.files["file"]
-    npimg = np.frombuffer(file.read(), np.uint8)
-    frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+    try:
+        stream = STREAMS.get(request_stream_id())
+    except StreamLimitError as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
 
-    prob, pred = predictor.add_frame(frame)
+    try:
+        with stream.lock:
+            result = score_frames(stream, [request.files["file"].read()])
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-    if prob is None:
+    if result["status"] != "success":
         return jsonify({"status": "collecting", "message": "Waiting for enough frames."})
 
     return jsonify({
         "status": "success",
-        "probability": round(float(prob), 4),
-        "violence": bool(pred)
+        "probability": result["probability"],
+        "violence": result["prediction"] == "Violence"
     })
 
 
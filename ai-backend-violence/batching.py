@@ -0,0 +1,166 @@
+"""
+Cross-stream micro-batching for the violence detection model.
+
+Request threads decode and preprocess their frames, then hand the tensors to
+one BatchScheduler thread. It waits up to `max_wait_ms` after the first
+pending frame (or until `max_batch` frames are pending), runs MobileNetV2 on
+all of them as one batch, appends each stream's features to its window, and
+runs the BiLSTM head once for every stream whose window is full and changed.
+Frames the motion gate skipped arrive as None: they take no batch slot and
+only repeat the previous features in the stream's window.
+
+A request holds its stream's lock while it waits, so a batch never contains
+two requests of the same stream and the scheduler may update the stream's
+predictor on its behalf.
+"""
+
+import threading
+import time
+from collections import deque
+
+import torch
+
+
+class _Pending:
+    """Frames of one request waiting for the next batch."""
+
+    def __init__(self, predictor, tensors):
+        self.predictor = predictor
+        self.tensors = tensors
+        self.encoded = [tensor for tensor in tensors if tensor is not None]
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.prob = None
+        self.error = None
+
+
+class BatchScheduler:
+    """
+    Batches CNN and LSTM-head inference across streams on one worker thread.
+
+    Args:
+        model: ViolenceDetectionModel in eval mode
+        device: torch device the model lives on
+        max_batch: frames per CNN batch; a batch runs as soon as this many are pending
+        max_wait_ms: how long the first pending frame may wait for others to join
+    """
+
+    def __init__(self, model, device, max_batch=16, max_wait_ms=10):
+        self.model = model
+        self.device = device
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._thread = None
+        # metrics
+        self._started_at = time.monotonic()
+        self._batches = 0
+        self._frames = 0
+        self._windows = 0
+        self._queue_delays = deque(maxlen=1000)  # seconds from submit to batch start, recent requests
+        self._batch_seconds = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+
+    def submit(self, predictor, tensors):
+        """
+        Add prepared frames (None = skipped by the motion gate) to `predictor`'s window through the next batch.
+        Blocks until done; returns the window probability, or None if the window is not full yet.
+        """
+        item = _Pending(predictor, tensors)
+        with self._cond:
+            self._pending.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_loop, name="violence-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.prob
+
+    def _next_batch(self):
+        """Wait for pending requests and take up to max_batch frames' worth (at least one request)."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0].enqueued_at + self.max_wait
+            while sum(len(item.encoded) for item in self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, frames = [], 0
+            while self._pending and (not batch or frames + len(self._pending[0].encoded) <= self.max_batch):
+                item = self._pending.popleft()
+                batch.append(item)
+                frames += len(item.encoded)
+            return batch
+
+    def _run_loop(self):
+        while True:
+            batch = self._next_batch()
+            start = time.perf_counter()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                print(f"[ERROR] Batched inference failed: {e}")
+                for item in batch:
+                    item.error = e
+            seconds = time.perf_counter() - start
+            frames = sum(len(item.encoded) for item in batch)
+            with self._cond:
+                self._batches += 1
+                self._frames += frames
+                self._batch_sizes.append(frames)
+                self._batch_seconds.append(seconds)
+                self._queue_delays.extend(start - item.enqueued_at for item in batch)
+            for item in batch:
+                item.done.set()
+
+    def _run_batch(self, batch):
+        encoded = [tensor for item in batch for tensor in item.encoded]
+        with torch.no_grad():
+            features = self.model.extract_features(torch.stack(encoded).to(self.device)) if encoded else []
+            offset, ready = 0, []
+            for item in batch:
+                skipped = [tensor is None for tensor in item.tensors]
+                item.predictor.add_features(features[offset:offset + len(item.encoded)], skipped)
+                offset += len(item.encoded)
+                if item.predictor.is_ready():
+                    ready.append(item)
+            changed = [item for item in ready if item.predictor.needs_head()]
+            if changed:
+                windows = torch.stack([item.predictor.window() for item in changed])
+                probs = self.model.classify_features(windows)[:, 0].tolist()
+                for item, prob in zip(changed, probs):
+                    item.predictor.set_prob(prob)
+            for item in ready:
+                item.prob = item.predictor.last_prob
+        with self._cond:
+            self._windows += len(changed)
+
+    def stats(self):
+        with self._cond:
+            delays = sorted(self._queue_delays)
+            batch_seconds = list(self._batch_seconds)
+            batch_sizes = list(self._batch_sizes)
+            elapsed = time.monotonic() - self._started_at
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "pending_requests": len(self._pending),
+                "batches": self._batches,
+                "frames": self._frames,
+                "windows_scored": self._windows,
+                "frames_per_second": round(self._frames / elapsed, 2) if elapsed else 0.0,
+                # frames per second of model time: the ceiling the batches reach when busy
+                "inference_frames_per_second": round(sum(batch_sizes) / sum(batch_seconds), 2) if batch_seconds else 0.0,
+                "mean_batch_size": round(sum(batch_sizes) / len(batch_sizes), 2) if batch_sizes else 0.0,
+                "mean_batch_ms": round(sum(batch_seconds) / len(batch_seconds) * 1000, 2) if batch_seconds else 0.0,
+                "queue_delay_ms": {
+                    "mean": round(sum(delays) / len(delays) * 1000, 2) if delays else 0.0,
+                    "p95": round(delays[int(0.95 * (len(delays) - 1))] * 1000, 2) if delays else 0.0,
+                    "max": round(delays[-1] * 1000, 2) if delays else 0.0,
+                },
+            }
@@ -0,0 +1,418 @@
+"""
+Micro-benchmarks for the Violence Detection service.
+
+Usage:
+    python benchmarks.py transport [--image frame.jpg] [--width 640 --height 480]
+    python benchmarks.py predict [--frames 48] [--weights best_model.pth] [--threads 4]
+    python benchmarks.py batching [--streams 8] [--frames 24] [--max-batch 16] [--max-wait-ms 10]
+    python benchmarks.py gate [--frames 64] [--still 0.75] [--video class.mp4] [--threshold 3 --max-skip 8]
+    python benchmarks.py video [--video class.mp4 | --seconds 60] [--fps 4] [--stride 4]
+"""
+
+import argparse
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+
+
+def _timeit(fn, repeat=20):
+    """Return the best wall time (seconds) of `repeat` runs of fn()."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _sample_jpeg(image_path, width, height):
+    """JPEG bytes of `image_path`, or of a synthetic camera-like frame."""
+    if image_path:
+        with open(image_path, "rb") as f:
+            return f.read()
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    frame = np.clip(gradient + rng.normal(0, 20, (height, width, 3)), 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+
+
+def _sample_clip(count, width=320, height=240):
+    """`count` distinct synthetic JPEG frames (a bright square moving over noise)."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        frame = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+        x = (i * 7) % (width - 40)
+        frame[100:140, x:x + 40] = 230
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes())
+    return frames
+
+
+def _sample_scene(count, still, width=320, height=240):
+    """
+    JPEG frames of a fixed classroom-like scene with sensor noise: the first
+    `still` fraction is static, then a bright square starts moving.
+    """
+    rng = np.random.default_rng(0)
+    background = rng.integers(40, 200, (height // 8, width // 8, 3), dtype=np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+    frames = []
+    for i in range(count):
+        frame = np.clip(background + rng.normal(0, 3, background.shape), 0, 255).astype(np.uint8)
+        moving = i - int(count * still)
+        if moving >= 0:
+            x = (moving * 23) % (width - 60)
+            frame[90:150, x:x + 60] = 240
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes())
+    return frames
+
+
+def _video_frames(path, count):
+    """Up to `count` frames of a video file, as JPEG bytes."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes())
+    cap.release()
+    return frames
+
+
+def _write_video(path, seconds, fps=25, width=640, height=360):
+    """Synthetic MPEG-4 clip (inter-frame coded, like camera recordings): a still scene with a square moving through part of it."""
+    rng = np.random.default_rng(0)
+    background = cv2.resize(rng.integers(40, 200, (height // 8, width // 8, 3), dtype=np.uint8), (width, height))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        if (i // fps) % 20 >= 15:  # 5 s of motion every 20 s
+            x = (i * 17) % (width - 80)
+            frame[120:200, x:x + 80] = 240
+        writer.write(frame)
+    writer.release()
+
+
+def _bench_model(weights):
+    """CPU model in eval mode: trained weights if the file exists, else a seeded random init."""
+    import torch
+    from model_utils import ViolenceDetectionModel, FEATURE_DIM, HIDDEN_DIM, NUM_CLASSES
+
+    torch.manual_seed(0)
+    model = ViolenceDetectionModel(FEATURE_DIM, HIDDEN_DIM, NUM_CLASSES, pretrained_backbone=False)
+    if weights and os.path.exists(weights):
+        model.load_state_dict(torch.load(weights, map_location="cpu"))
+        print(f"[INFO] Using weights from {weights}")
+    else:
+        print("[INFO] No weights file, using a random-init model (timings are the same)")
+    return model.eval()
+
+
+# ---------------------------
+# Benchmarks
+# ---------------------------
+
+
+def bench_transport(image_path, width, height):
+    """Per-frame payload size and server-side decode time: JSON/base64 vs. raw JPEG."""
+    jpeg = _sample_jpeg(image_path, width, height)
+    json_body = json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode(), "classId": "abc123"})
+
+    def decode_json():
+        data = json.loads(json_body)
+        img = base64.b64decode(data["image"].split(",")[1])
+        cv2.cvtColor(cv2.imdecode(np.frombuffer(img, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+    def decode_raw():
+        cv2.cvtColor(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+    json_s, raw_s = _timeit(decode_json), _timeit(decode_raw)
+    print(f"{'path':>14} {'bytes/frame':>12} {'decode ms':>10}")
+    print(f"{'json+base64':>14} {len(json_body):>12} {json_s * 1e3:>10.2f}")
+    print(f"{'raw image/jpeg':>14} {len(jpeg):>12} {raw_s * 1e3:>10.2f}")
+    print(f"payload -{(1 - len(jpeg) / len(json_body)) * 100:.0f}%, decode -{(1 - raw_s / json_s) * 100:.0f}%")
+
+
+def bench_predict(frame_count, weights, threads):
+    """
+    Sliding-window predictions/sec on CPU, one prediction per incoming frame:
+    full forward over the 16 buffered frames vs. cached per-frame features + LSTM head.
+    """
+    import torch
+    from model_utils import ViolencePredictor, SEQUENCE_LENGTH, decode_image_bytes, preprocess_frame
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = _bench_model(weights)
+    clip = _sample_clip(max(frame_count, SEQUENCE_LENGTH + 1))
+    device = torch.device("cpu")
+
+    def run_full():
+        window, probs = deque(maxlen=SEQUENCE_LENGTH), []
+        for jpeg in clip:
+            window.append(preprocess_frame(decode_image_bytes(jpeg)))
+            if len(window) == SEQUENCE_LENGTH:
+                with torch.no_grad():
+                    probs.append(model(torch.stack(list(window)).unsqueeze(0)).item())
+        return probs
+
+    def run_cached():
+        predictor, probs = ViolencePredictor(model, device), []
+        for jpeg in clip:
+            predictor.add_frame(jpeg)
+            if predictor.is_ready():
+                probs.append(predictor.predict()["probability"])
+        return probs
+
+    run_cached()  # warm-up (allocator, oneDNN kernels)
+    results = {}
+    for name, fn in (("full forward", run_full), ("cached head", run_cached)):
+        start = time.perf_counter()
+        probs = fn()
+        results[name] = (probs, time.perf_counter() - start)
+
+    predictions = len(results["full forward"][0])
+    print(f"{len(clip)} frames, {predictions} predictions, {torch.get_num_threads()} threads")
+    print(f"{'path':>14} {'total s':>9} {'ms/pred':>9} {'pred/s':>9}")
+    for name, (_, seconds) in results.items():
+        print(f"{name:>14} {seconds:>9.2f} {seconds / predictions * 1e3:>9.1f} {predictions / seconds:>9.1f}")
+    full_probs, cached_probs = results["full forward"][0], results["cached head"][0]
+    # The predictor rounds to 4 decimals, so anything within 5e-5 is the same answer
+    diff = max(abs(a - b) for a, b in zip(full_probs, cached_probs))
+    print(f"max |probability difference| = {diff:.2e}")
+    print(f"speed-up x{results['full forward'][1] / results['cached head'][1]:.1f}")
+
+
+def bench_batching(streams, frames, max_batch, max_wait_ms, weights, threads):
+    """
+    Frames/sec with `streams` cameras sending frames back to back: every request
+    running the model on its own vs. the cross-stream BatchScheduler.
+    """
+    import torch
+    from model_utils import ViolencePredictor
+    from batching import BatchScheduler
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = _bench_model(weights)
+    clip = _sample_clip(frames)
+    device = torch.device("cpu")
+
+    def run(score):
+        """Run one thread per stream; returns (seconds, per-frame latencies)."""
+        latencies, lock = [], threading.Lock()
+
+        def client():
+            predictor, mine = ViolencePredictor(model, device), []
+            for jpeg in clip:
+                start = time.perf_counter()
+                score(predictor, jpeg)
+                mine.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(mine)
+
+        workers = [threading.Thread(target=client) for _ in range(streams)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start, sorted(latencies)
+
+    def score_alone(predictor, jpeg):
+        predictor.add_frame(jpeg)
+        if predictor.is_ready():
+            predictor.predict()
+
+    scheduler = BatchScheduler(model, device, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    def score_batched(predictor, jpeg):
+        scheduler.submit(predictor, [predictor.prepare_frame(jpeg)])
+
+    run(score_alone)  # warm-up
+    total = streams * len(clip)
+    print(f"{streams} streams x {len(clip)} frames, {torch.get_num_threads()} torch threads, "
+          f"max_batch={max_batch}, max_wait={max_wait_ms}ms")
+    print(f"{'path':>10} {'frames/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, score in (("per-frame", score_alone), ("batched", score_batched)):
+        seconds, latencies = run(score)
+        p50, p95 = latencies[len(latencies) // 2], latencies[int(0.95 * (len(latencies) - 1))]
+        print(f"{name:>10} {total / seconds:>9.1f} {p50 * 1e3:>8.1f} {p95 * 1e3:>8.1f}")
+    stats = scheduler.stats()
+    print(f"batches: {stats['batches']}, mean size {stats['mean_batch_size']}, "
+          f"queue delay mean {stats['queue_delay_ms']['mean']} ms / p95 {stats['queue_delay_ms']['p95']} ms")
+
+
+def bench_gate(frame_count, still, video, threshold, max_skip, weights, threads):
+    """
+    One stream scored on every frame, without and with the motion gate:
+    frames/sec, skip ratio and how far the gated probabilities drift.
+    """
+    import torch
+    from model_utils import ViolencePredictor, MotionGate
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = _bench_model(weights)
+    clip = _video_frames(video, frame_count) if video else _sample_scene(frame_count, still)
+    device = torch.device("cpu")
+
+    def run(gate):
+        predictor, probs = ViolencePredictor(model, device, gate=gate), []
+        start = time.perf_counter()
+        for jpeg in clip:
+            predictor.add_frame(jpeg)
+            if predictor.is_ready():
+                probs.append(predictor.predict()["probability"])
+        return time.perf_counter() - start, probs
+
+    run(None)  # warm-up
+    gate = MotionGate(threshold=threshold, max_skip=max_skip)
+    (plain_s, plain), (gated_s, gated) = run(None), run(gate)
+    stats = gate.stats()
+    print(f"{len(clip)} frames ({'video ' + video if video else f'synthetic, {still:.0%} still'}), "
+          f"threshold={threshold}, max_skip={max_skip}")
+    print(f"{'path':>8} {'frames/s':>9} {'skipped':>8}")
+    print(f"{'always':>8} {len(clip) / plain_s:>9.1f} {0:>8}")
+    print(f"{'gated':>8} {len(clip) / gated_s:>9.1f} {stats['skipped']:>8}  (skip ratio {stats['skip_ratio']:.0%})")
+    if plain:
+        diff = max(abs(a - b) for a, b in zip(plain, gated))
+        print(f"max |probability difference| = {diff:.4f}")
+
+
+def bench_video(video, seconds, sample_fps, stride, weights, threads):
+    """
+    /predict_video/ work on one clip: the old 16 seeks + one window vs. the
+    sequential, windowed analysis (with and without the reader thread).
+    """
+    import torch
+    from model_utils import preprocess_frame, SEQUENCE_LENGTH
+    from video import analyze_video, _sampled_frames
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = _bench_model(weights)
+    device = torch.device("cpu")
+    tmp = None
+    if not video:
+        tmp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+        tmp.close()
+        _write_video(tmp.name, seconds)
+        video = tmp.name
+
+    def seek_16():
+        cap = cv2.VideoCapture(video)
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frames = []
+        for i in np.linspace(0, count - 1, SEQUENCE_LENGTH, dtype=int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(i))
+            ret, frame = cap.read()
+            if ret:
+                frames.append(preprocess_frame(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        cap.release()
+        with torch.no_grad():
+            return model(torch.stack(frames).unsqueeze(0)).item()
+
+    def decode_seeking():
+        cap = cv2.VideoCapture(video)
+        fps, count = cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for i in np.arange(0, count, fps / sample_fps).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(i))
+            cap.read()
+        cap.release()
+
+    def decode_sequential():
+        cap = cv2.VideoCapture(video)
+        for _ in _sampled_frames(cap, cap.get(cv2.CAP_PROP_FPS), sample_fps):
+            pass
+        cap.release()
+
+    try:
+        print(f"decode only, {sample_fps} fps samples:")
+        for name, fn in (("seek per sample", decode_seeking), ("sequential grab", decode_sequential)):
+            start = time.perf_counter()
+            fn()
+            print(f"{name:>26} {time.perf_counter() - start:>7.2f} s")
+        print("full analysis:")
+        start = time.perf_counter()
+        seek_16()
+        print(f"{'seek x16, one window':>26} {time.perf_counter() - start:>7.2f} s   1 window")
+        for threaded in (False, True):
+            start = time.perf_counter()
+            result = analyze_video(video, model, device, sample_fps=sample_fps, stride=stride, reader_thread=threaded)
+            name = f"sequential{' + reader thread' if threaded else ''}"
+            print(f"{name:>26} {time.perf_counter() - start:>7.2f} s   {result['windows']} windows "
+                  f"({result['sampled_frames']} frames at {result['sample_fps']} fps of {result['duration']} s), "
+                  f"peak {result['peak']['probability'] if result['peak'] else None}")
+    finally:
+        if tmp:
+            os.remove(tmp.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("transport", help="bytes and decode time per frame, JSON/base64 vs. raw JPEG")
+    p.add_argument("--image", help="JPEG to use instead of a synthetic frame")
+    p.add_argument("--width", type=int, default=640)
+    p.add_argument("--height", type=int, default=480)
+
+    p = sub.add_parser("predict", help="sliding-window predictions/sec, full forward vs. cached CNN features")
+    p.add_argument("--frames", type=int, default=48, help="frames in the synthetic clip")
+    p.add_argument("--weights", default="best_model.pth", help="state dict to load if present")
+    p.add_argument("--threads", type=int, help="torch CPU threads (default: torch's choice)")
+
+    p = sub.add_parser("batching", help="frames/sec of many streams, per-frame vs. cross-stream batched inference")
+    p.add_argument("--streams", type=int, default=8, help="concurrent cameras")
+    p.add_argument("--frames", type=int, default=24, help="frames per camera")
+    p.add_argument("--max-batch", type=int, default=16)
+    p.add_argument("--max-wait-ms", type=float, default=10)
+    p.add_argument("--weights", default="best_model.pth", help="state dict to load if present")
+    p.add_argument("--threads", type=int, help="torch CPU threads (default: torch's choice)")
+
+    p = sub.add_parser("gate", help="frames/sec and skip ratio with the motion gate on a still-then-moving clip")
+    p.add_argument("--frames", type=int, default=64)
+    p.add_argument("--still", type=float, default=0.75, help="fraction of the synthetic clip that is static")
+    p.add_argument("--video", help="use the first --frames frames of this video instead")
+    p.add_argument("--threshold", type=float, default=3.0, help="MotionGate threshold")
+    p.add_argument("--max-skip", type=int, default=8, help="MotionGate max_skip")
+    p.add_argument("--weights", default="best_model.pth", help="state dict to load if present")
+    p.add_argument("--threads", type=int, help="torch CPU threads (default: torch's choice)")
+
+    p = sub.add_parser("video", help="/predict_video/ time: 16 seeks vs. sequential windowed analysis")
+    p.add_argument("--video", help="video file (default: a synthetic clip of --seconds)")
+    p.add_argument("--seconds", type=float, default=60)
+    p.add_argument("--fps", type=float, default=4.0, help="sample fps")
+    p.add_argument("--stride", type=int, default=4, help="sampled frames between windows")
+    p.add_argument("--weights", default="best_model.pth", help="state dict to load if present")
+    p.add_argument("--threads", type=int, help="torch CPU threads (default: torch's choice)")
+
+    args = parser.parse_args()
+    if args.benchmark == "transport":
+        bench_transport(args.image, args.width, args.height)
+    elif args.benchmark == "predict":
+        bench_predict(args.frames, args.weights, args.threads)
+    elif args.benchmark == "batching":
+        bench_batching(args.streams, args.frames, args.max_batch, args.max_wait_ms, args.weights, args.threads)
+    elif args.benchmark == "gate":
+        bench_gate(args.frames, args.still, args.video, args.threshold, args.max_skip, args.weights, args.threads)
+    elif args.benchmark == "video":
+        bench_video(args.video, args.seconds, args.fps, args.stride, args.weights, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,11 @@ THRESHOLD = 0.5
 MODEL_PATH = "best_model.pth"
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Motion gate (optional): skip the model on frames that barely differ from the last one it saw
+MOTION_THRESHOLD = 3.0     # mean absolute gray-level difference (0-255) on a 64x48 thumbnail
+MOTION_MAX_SKIP = 8        # run the model at least once every this many frames anyway
+MOTION_GATE_SIZE = (64, 48)
+
 # -------------------------------------------------
 # Frame Transform
 # -------------------------------------------------
@@ -34,9 +39,10 @@ val_test_transform = A.Compose([
 # Model Definition
 # -------------------------------------------------
 class ViolenceDetectionModel(nn.Module):
-    def __init__(self, feature_dim, hidden_dim, num_classes):
+    def __init__(self, feature_dim, hidden_dim, num_classes, pretrained_backbone=True):
         super().__init__()
-        self.cnn = mobilenet_v2(weights=MobileNet_V2_Weights.DEFAULT)
+        # pretrained_backbone=False skips the ImageNet download when a full state dict is loaded anyway
+        self.cnn = mobilenet_v2(weights=MobileNet_V2_Weights.DEFAULT if pretrained_backbone else None)
         self.cnn.classifier = nn.Identity()
         self.lstm = nn.LSTM(
             input_size=feature_dim,
@@ -48,42 +54,56 @@ class ViolenceDetectionModel(nn.Module):
         self.fc = nn.Linear(hidden_dim * 2, num_classes)
         self.sigmoid = nn.Sigmoid()
 
-    def forward(self, x):
-        b, s, c, h, w = x.size()
-        x = x.view(b * s, c, h, w)
-        features = self.cnn(x)
-        features = features.view(b, s, -1)
+    def extract_features(self, frames):
+        """MobileNetV2 features of a batch of frames: (n, c, h, w) -> (n, feature_dim)."""
+        return self.cnn(frames)
+
+    def classify_features(self, features):
+        """BiLSTM + FC head over per-frame features: (b, s, feature_dim) -> (b, num_classes) probabilities."""
         lstm_out, _ = self.lstm(features)
         lstm_out = lstm_out[:, -1, :]
         out = self.fc(lstm_out)
         return self.sigmoid(out)
 
+    def forward(self, x):
+        b, s, c, h, w = x.size()
+        x = x.view(b * s, c, h, w)
+        features = self.extract_features(x)
+        features = features.view(b, s, -1)
+        return self.classify_features(features)
+
 
 # -------------------------------------------------
 # Helper: Load Model Once
 # -------------------------------------------------
 def load_model():
-    model = ViolenceDetectionModel(FEATURE_DIM, HIDDEN_DIM, NUM_CLASSES).to(DEVICE)
-    if os.path.exists(MODEL_PATH):
-        model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
-        model.eval()
-        print(f"[INFO] Model loaded successfully from {MODEL_PATH}")
-    else:
+    if not os.path.exists(MODEL_PATH):
         raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
+    # The checkpoint holds the fine-tuned backbone too, so the ImageNet weights are not needed
+    model = ViolenceDetectionModel(FEATURE_DIM, HIDDEN_DIM, NUM_CLASSES, pretrained_backbone=False).to(DEVICE)
+    model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
+    model.eval()
+    print(f"[INFO] Model loaded successfully from {MODEL_PATH}")
     return model
 
 
 # -------------------------------------------------
 # Helper: Frame Conversion
 # -------------------------------------------------
+def decode_image_bytes(img_bytes):
+    """Decode encoded image bytes (bytes or memoryview) to numpy array (RGB)."""
+    img_array = np.frombuffer(img_bytes, np.uint8)
+    frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Invalid image data")
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
 def decode_base64_image(base64_str):
     """Decode base64 image string to numpy array (RGB)."""
     if "," in base64_str:
         base64_str = base64_str.split(",")[1]
-    img_bytes = base64.b64decode(base64_str)
-    img_array = np.frombuffer(img_bytes, np.uint8)
-    frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return decode_image_bytes(base64.b64decode(base64_str))
 
 
 def preprocess_frame(frame):
@@ -91,28 +111,139 @@ def preprocess_frame(frame):
     return val_test_transform(image=frame)['image']
 
 
+# -------------------------------------------------
+# Motion Gate
+# -------------------------------------------------
+class MotionGate:
+    """
+    Cheap frame-difference gate in front of the model.
+
+    Each frame is shrunk to a small grayscale thumbnail and compared with the
+    thumbnail of the last frame that went through the model. Below `threshold`
+    the frame is skipped (the window reuses the previous features and the last
+    probability); above it every frame runs again. At most `max_skip` frames
+    in a row are skipped, so slow changes are still picked up.
+    """
+
+    def __init__(self, threshold=MOTION_THRESHOLD, max_skip=MOTION_MAX_SKIP, size=MOTION_GATE_SIZE):
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.size = size
+        self.reference = None
+        self.skip_run = 0
+        self.frames = 0
+        self.skipped = 0
+        self.last_score = None
+
+    def check(self, frame):
+        """Return True if the RGB frame should go through the model."""
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), self.size, interpolation=cv2.INTER_AREA)
+        self.frames += 1
+        if self.reference is not None:
+            self.last_score = float(cv2.absdiff(thumb, self.reference).mean())
+            if self.last_score < self.threshold and self.skip_run < self.max_skip:
+                self.skip_run += 1
+                self.skipped += 1
+                return False
+        self.reference = thumb
+        self.skip_run = 0
+        return True
+
+    def reset(self):
+        self.reference = None
+        self.skip_run = 0
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+            "last_score": round(self.last_score, 2) if self.last_score is not None else None,
+        }
+
+
 # -------------------------------------------------
 # Violence Detection Logic
 # -------------------------------------------------
 class ViolencePredictor:
-    def __init__(self, model, device, sequence_length=SEQUENCE_LENGTH, threshold=THRESHOLD):
+    """
+    Sliding-window violence predictor.
+
+    The CNN runs once per incoming frame and the window keeps the last
+    `sequence_length` 1280-d feature vectors, so a prediction only runs the
+    BiLSTM + FC head instead of re-encoding every frame of the window.
+
+    With a MotionGate, frames the gate rejects skip preprocessing and the CNN:
+    the window repeats the previous frame's features, and while no new frame
+    has been encoded the last probability is reused.
+    """
+
+    def __init__(self, model, device, sequence_length=SEQUENCE_LENGTH, threshold=THRESHOLD, gate=None):
         self.model = model
         self.device = device
         self.sequence_length = sequence_length
         self.threshold = threshold
-        self.buffer = deque(maxlen=sequence_length)
+        self.gate = gate
+        self.buffer = deque(maxlen=sequence_length)  # per-frame CNN features, oldest first
+        self.last_prob = None
+        self._fresh = False  # new features since last_prob was computed
+
+    def decode_frame(self, image):
+        """Decode one frame (base64 string or raw encoded image bytes) to an RGB array."""
+        if isinstance(image, str):
+            return decode_base64_image(image)
+        return decode_image_bytes(image)
+
+    def prepare_frame(self, image):
+        """Decode and transform one frame to a tensor, or None if the motion gate skips it."""
+        frame = self.decode_frame(image)
+        if self.gate is not None and not self.gate.check(frame):
+            return None
+        return preprocess_frame(frame)
 
-    def add_frame(self, base64_image):
-        """Add one frame (base64) to buffer."""
-        frame = decode_base64_image(base64_image)
-        transformed = preprocess_frame(frame)
-        self.buffer.append(transformed)
+    def add_features(self, features, skipped=None):
+        """
+        Append the frames of one request to the buffer.
+
+        Args:
+            features: CNN features (n, feature_dim) of the frames that were encoded, in order
+            skipped: per-frame flags (encoded frames False); a skipped frame repeats the previous features
+        """
+        rows = iter(features)
+        for skip in (skipped if skipped is not None else [False] * len(features)):
+            if skip:
+                if self.buffer:
+                    self.buffer.append(self.buffer[-1])
+            else:
+                self.buffer.append(next(rows))
+                self._fresh = True
         return len(self.buffer)
 
+    def add_tensors(self, tensors):
+        """Encode prepared frames (None = skipped by the gate) in one CNN batch and buffer them."""
+        encoded = [tensor for tensor in tensors if tensor is not None]
+        features = []
+        if encoded:
+            with torch.no_grad():
+                features = self.model.extract_features(torch.stack(encoded).to(self.device))
+        return self.add_features(features, [tensor is None for tensor in tensors])
+
+    def add_frame(self, image):
+        """Add one frame (base64 string or raw encoded image bytes) to buffer."""
+        return self.add_tensors([self.prepare_frame(image)])
+
     def is_ready(self):
         """Check if enough frames are collected."""
         return len(self.buffer) == self.sequence_length
 
+    def needs_head(self):
+        """True if the window changed since the last probability (or there is none)."""
+        return self._fresh or self.last_prob is None
+
+    def set_prob(self, prob):
+        self.last_prob = prob
+        self._fresh = False
+
     def predict(self):
         """Run prediction if sequence ready."""
         if not self.is_ready():
@@ -121,21 +252,28 @@ class ViolencePredictor:
                 "message": f"Need {self.sequence_length - len(self.buffer)} more frames."
             }
 
-        frames = torch.stack(list(self.buffer)).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            prob = self.model(frames).item()
-            pred = 1 if prob > self.threshold else 0
+        if self.needs_head():
+            with torch.no_grad():
+                self.set_prob(self.model.classify_features(self.window().unsqueeze(0)).item())
+        return self.result(self.last_prob)
+
+    def reset(self):
+        """Start a new session: empty window, no last probability, fresh gate reference."""
+        self.buffer.clear()
+        self.last_prob = None
+        self._fresh = False
+        if self.gate is not None:
+            self.gate.reset()
 
+    def window(self):
+        """Buffered features as one (sequence_length, feature_dim) tensor."""
+        return torch.stack(list(self.buffer))
+
+    def result(self, prob):
+        """Prediction response for a window probability."""
+        pred = 1 if prob > self.threshold else 0
         return {
             "status": "success",
             "prediction": "Violence" if pred else "Non-Violence",
             "probability": round(float(prob), 4)
         }
-
-
-# -------------------------------------------------
-# Initialize Model and Predictor
-# -------------------------------------------------
-model = load_model()
-predictor = ViolencePredictor(model, DEVICE)
-print("[INFO] Violence detection model ready for frame-based inference.")
@@ -0,0 +1,114 @@
+"""
+Per-stream state of the violence detection service.
+
+Every camera (stream/class id) gets its own ViolencePredictor, so frames of
+two classrooms never interleave into the same 16-frame window. Streams that
+have sent nothing for `idle_timeout` seconds are evicted, and at most
+`max_streams` are kept at once.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class StreamLimitError(RuntimeError):
+    """Raised when a new stream would exceed the registry's max_streams."""
+
+
+class Stream:
+    """One camera's predictor, last prediction and activity times."""
+
+    def __init__(self, stream_id, predictor):
+        self.id = stream_id
+        self.predictor = predictor
+        self.lock = threading.Lock()  # serializes requests of the same stream
+        self.last_prediction = None
+        self.frames = 0
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def to_dict(self):
+        return {
+            "stream_id": self.id,
+            "buffer_size": len(self.predictor.buffer),
+            "frames": self.frames,
+            "last_prediction": self.last_prediction,
+            "motion_gate": self.predictor.gate.stats() if self.predictor.gate is not None else None,
+            "idle_seconds": round(time.monotonic() - self.last_seen, 1),
+            "created_at": self.created_at,
+        }
+
+
+class StreamRegistry:
+    """
+    Streams keyed by id, created on first use.
+
+    Args:
+        factory: callable() -> a new ViolencePredictor
+        idle_timeout: seconds without frames after which a stream is evicted
+        max_streams: cap on concurrent streams; a new stream beyond it raises StreamLimitError
+    """
+
+    def __init__(self, factory, idle_timeout=120, max_streams=32):
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._streams = OrderedDict()  # stream id -> Stream, least recently seen first
+        self._evicted = 0
+
+    def get(self, stream_id):
+        """The stream's state, created if new. Marks it as active."""
+        with self._lock:
+            self._evict_idle()
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                if len(self._streams) >= self.max_streams:
+                    raise StreamLimitError(f"Too many active streams (max {self.max_streams})")
+                stream = self._streams[stream_id] = Stream(stream_id, self.factory())
+            self._streams.move_to_end(stream_id)
+            stream.touch()
+            return stream
+
+    def reset(self, stream_id):
+        """Clear one stream's window. Returns False if the stream is unknown."""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+        if stream is None:
+            return False
+        with stream.lock:
+            stream.predictor.reset()
+            stream.last_prediction = None
+        return True
+
+    def remove(self, stream_id):
+        with self._lock:
+            return self._streams.pop(stream_id, None) is not None
+
+    def _evict_idle(self):
+        """Drop streams idle for longer than idle_timeout. Caller holds _lock."""
+        deadline = time.monotonic() - self.idle_timeout
+        while self._streams:
+            stream_id, stream = next(iter(self._streams.items()))
+            if stream.last_seen > deadline:
+                break
+            del self._streams[stream_id]
+            self._evicted += 1
+            print(f"[INFO] Evicted idle stream '{stream_id}'")
+
+    def stats(self):
+        with self._lock:
+            self._evict_idle()
+            streams = [stream.to_dict() for stream in reversed(self._streams.values())]
+            evicted = self._evicted
+        return {
+            "active": len(streams),
+            "max_streams": self.max_streams,
+            "idle_timeout": self.idle_timeout,
+            "evicted": evicted,
+            "streams": streams,
+        }
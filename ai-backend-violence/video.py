@@ -0,0 +1,165 @@
+"""
+Windowed violence scoring of a whole video file.
+
+The video is decoded in one sequential pass (optionally on a reader thread,
+so decoding overlaps inference) and sampled at `sample_fps`. Sampled frames
+go through MobileNetV2 in batches; every `stride` sampled frames the last 16
+feature vectors form a window, and windows are scored by the BiLSTM head in
+batches. Only the current window, one CNN batch and a bounded frame queue
+are held in memory, so long recordings are fine.
+"""
+
+import queue
+import threading
+from collections import deque
+
+import cv2
+import torch
+
+from model_utils import preprocess_frame, SEQUENCE_LENGTH, THRESHOLD
+
+_END = object()
+
+
+def _sampled_frames(cap, fps, sample_fps):
+    """Yield (timestamp seconds, RGB frame) at ~sample_fps; frames in between are grabbed, not decoded to BGR."""
+    step = fps / sample_fps if sample_fps < fps else 1.0
+    next_sample, index = 0.0, 0
+    while cap.grab():
+        if index + 1e-6 >= next_sample:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            yield index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            next_sample += step
+        index += 1
+
+
+def _threaded(frames, max_queue):
+    """Run a frame generator on a reader thread, handing frames over through a bounded queue."""
+    handoff = queue.Queue(maxsize=max_queue)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            for item in frames:
+                if not put(item):
+                    return
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    reader = threading.Thread(target=read, name="video-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = handoff.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+
+def analyze_video(path, model, device, sample_fps=4.0, stride=4, cnn_batch=16, window_batch=8,
+                  threshold=THRESHOLD, reader_thread=True, max_queue=32):
+    """
+    Score overlapping 16-frame windows of a video.
+
+    Args:
+        path: video file readable by OpenCV
+        model: ViolenceDetectionModel in eval mode
+        sample_fps: frames per second fed to the model (raised for clips too short for one window)
+        stride: sampled frames between consecutive windows (stride < 16 means overlapping windows)
+        cnn_batch: frames per MobileNetV2 batch
+        window_batch: windows per BiLSTM batch
+        reader_thread: decode on a separate thread
+        max_queue: decoded frames the reader may run ahead
+
+    Returns:
+        dict with the per-window timeline, the peak window and decode/sampling details
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = frame_count / fps if frame_count > 0 else None
+        if duration:
+            # Short clips: sample densely enough to fill at least one window
+            sample_fps = max(sample_fps, SEQUENCE_LENGTH / duration)
+        sample_fps = min(sample_fps, fps)
+
+        frames = _sampled_frames(cap, fps, sample_fps)
+        if reader_thread:
+            frames = _threaded(frames, max_queue)
+
+        window = deque(maxlen=SEQUENCE_LENGTH)  # (timestamp, features)
+        pending_frames, pending_windows, timeline = [], [], []
+        sampled, last_window_at = 0, None
+
+        def score_windows():
+            with torch.no_grad():
+                probs = model.classify_features(torch.stack([w for _, _, w in pending_windows]))[:, 0].tolist()
+            for (start, end, _), prob in zip(pending_windows, probs):
+                timeline.append({"start": round(start, 2), "end": round(end, 2), "probability": round(prob, 4)})
+            pending_windows.clear()
+
+        def add_window():
+            nonlocal last_window_at
+            pending_windows.append((window[0][0], window[-1][0], torch.stack([f for _, f in window])))
+            last_window_at = sampled
+            if len(pending_windows) >= window_batch:
+                score_windows()
+
+        def encode_frames():
+            nonlocal sampled
+            with torch.no_grad():
+                features = model.extract_features(torch.stack([t for _, t in pending_frames]).to(device))
+            for (timestamp, _), feature in zip(pending_frames, features):
+                window.append((timestamp, feature))
+                sampled += 1
+                if len(window) == SEQUENCE_LENGTH and (sampled - SEQUENCE_LENGTH) % stride == 0:
+                    add_window()
+            pending_frames.clear()
+
+        try:
+            for timestamp, frame in frames:
+                pending_frames.append((timestamp, preprocess_frame(frame)))
+                if len(pending_frames) >= cnn_batch:
+                    encode_frames()
+        finally:
+            frames.close()  # stops the reader thread before the capture is released
+        if pending_frames:
+            encode_frames()
+        if len(window) == SEQUENCE_LENGTH and last_window_at != sampled:
+            add_window()  # cover the tail that did not fall on the stride
+        if pending_windows:
+            score_windows()
+    finally:
+        cap.release()
+
+    peak = max(timeline, key=lambda w: w["probability"]) if timeline else None
+    return {
+        "fps": round(fps, 2),
+        "sample_fps": round(sample_fps, 2),
+        "duration": round(duration, 2) if duration else None,
+        "sampled_frames": sampled,
+        "windows": len(timeline),
+        "peak": peak,
+        "violence": bool(peak and peak["probability"] > threshold),
+        "timeline": timeline,
+    }
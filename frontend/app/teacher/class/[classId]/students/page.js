@@ -124,6 +124,30 @@ export default function ManageStudentsPage() {
     }
   };
 
+  // Poll an /update_embeddings job until it has finished, showing its progress
+  const waitForEmbeddingsJob = async (jobId) => {
+    while (true) {
+      const response = await fetch(
+        `http://127.0.0.1:5000/update_embeddings/${jobId}`
+      );
+      const job = await response.json();
+      if (!response.ok) {
+        throw new Error(job.message || 'Failed to check the embeddings update');
+      }
+      if (job.status === 'done') return;
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Failed to update embeddings');
+      }
+      const { students_done, students_total } = job.progress || {};
+      setUploadStatus(
+        students_total
+          ? `Updating recognition system... (${students_done || 0}/${students_total} students)`
+          : 'Recognition system update queued...'
+      );
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  };
+
   const handleAddPhotos = async () => {
     if (!selectedStudent || capturedPhotos.length === 0) {
       alert('Please capture at least one photo');
@@ -146,26 +170,33 @@ export default function ManageStudentsPage() {
       const data = await response.json();
 
       if (data.status === 'success') {
-        setUploadStatus('Photos uploaded! Updating recognition system...');
-        const embeddingResponse = await fetch(
-          'http://127.0.0.1:5000/update_embeddings',
-          {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+        // "done": the student is already recognizable; "queued": wait for that update job;
+        // no field (fast enrollment disabled on the server): start an update and wait for it
+        if (data.enrollment !== 'done') {
+          let jobId = data.job_id;
+          if (data.enrollment !== 'queued') {
+            setUploadStatus('Photos uploaded! Updating recognition system...');
+            const embeddingResponse = await fetch(
+              'http://127.0.0.1:5000/update_embeddings',
+              {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+              }
+            );
+            const embeddingData = await embeddingResponse.json();
+            if (embeddingData.status !== 'ok') {
+              throw new Error(embeddingData.message || 'Failed to update embeddings');
+            }
+            jobId = embeddingData.job_id;
           }
-        );
-
-        const embeddingData = await embeddingResponse.json();
-
-        if (embeddingData.status === 'ok') {
-          setUploadStatus('Success! Recognition system updated.');
-          setTimeout(() => {
-            alert(`Photos for ${selectedStudent.fullName} added successfully!`);
-            handleCloseCamera();
-          }, 1000);
-        } else {
-          throw new Error('Failed to update embeddings');
+          await waitForEmbeddingsJob(jobId);
         }
+
+        setUploadStatus('Success! Recognition system updated.');
+        setTimeout(() => {
+          alert(`Photos for ${selectedStudent.fullName} added successfully!`);
+          handleCloseCamera();
+        }, 1000);
       } else {
         throw new Error(data.message || 'Failed to add photos');
       }
@@ -58,15 +58,17 @@ export default function ViolenceDetectionPage() {
         canvas
           .getContext('2d')
           .drawImage(video, 0, 0, video.videoWidth, video.videoHeight);
-        const imageData = canvas.toDataURL('image/jpeg');
+        const imageBlob = await new Promise((resolve) =>
+          canvas.toBlob(resolve, 'image/jpeg')
+        );
 
         try {
           const response = await fetch(
-            'http://127.0.0.1:5002/detect_frame',
+            `http://127.0.0.1:5002/detect_frame?classId=${encodeURIComponent(classId)}`,
             {
               method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({ image: imageData, classId }),
+              headers: { 'Content-Type': 'image/jpeg' },
+              body: imageBlob,
             }
           );
           const data = await response.json();